@@ -0,0 +1,606 @@
+"""純白文本編輯器效能基準測試
+
+以 Qt 的 offscreen 平台執行，不需要顯示器，結果以 JSON 輸出，方便比較不同版本：
+
+    python benchmark.py                      # 預設規模，結果輸出到標準輸出
+    python benchmark.py --quick -o bench.json
+    python benchmark.py --only find,replace  # 只執行名稱含有指定字串的項目
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import contextlib
+import platform
+import tempfile
+import statistics
+import importlib.util
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QT_VERSION_STR, PYQT_VERSION_STR, QThreadPool
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtWidgets import QApplication, QMessageBox
+
+EDITOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '純白文本編輯器三框版.py')
+
+# 各編碼都能表示的範例文字
+SAMPLE_TEXTS = {
+    'UTF-8': '純白文本編輯器 plain text editor 測試段落 😀\n',
+    'UTF-16': '純白文本編輯器 plain text editor 測試段落 😀\n',
+    'GBK': '纯白文本编辑器 plain text editor 测试段落\n',
+    'Shift-JIS': 'テキストエディタ plain text editor の試験段落\n',
+    'ISO-8859-1': 'Éditeur de texte brut, café crème, naïve façade\n',
+}
+SAMPLE_TEXT = '這是一段用於效能測試的文字，包含 English words 與標點符號。\n'
+
+
+def load_editor_module():
+    spec = importlib.util.spec_from_file_location('plain_text_editor', EDITOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_text(megabytes, line=SAMPLE_TEXT):
+    """產生約 megabytes MB（UTF-8）的文字"""
+    repeat = max(1, int(megabytes * (1 << 20)) // len(line.encode('utf-8')))
+    return line * repeat
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'min': round(ordered[0], 3),
+        'median': round(statistics.median(ordered), 3),
+        'mean': round(statistics.fmean(ordered), 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+class BenchmarkSuite:
+    """每個項目在獨立的暫存目錄中建立編輯器，避免互相影響"""
+
+    def __init__(self, module, app, config):
+        self.module = module
+        self.app = app
+        self.config = config
+        self.results = []
+        self.messages = []
+        self.original_cwd = os.getcwd()
+        # 對話框在 offscreen 平台會阻塞，改為直接回覆
+        module.QMessageBox.information = staticmethod(lambda *args: self.messages.append(args[-1]))
+        module.QMessageBox.warning = staticmethod(lambda *args: self.messages.append(args[-1]))
+        module.QMessageBox.question = staticmethod(lambda *args: QMessageBox.Yes)
+
+    def record(self, name, samples, unit='ms', **params):
+        result = {'name': name, 'unit': unit, 'params': params, 'stats': summarize(samples)}
+        self.results.append(result)
+        stats = result['stats']
+        print(f"{name:<32} median {stats['median']:>10.3f} {unit}  p95 {stats['p95']:>10.3f} {unit}  "
+              f"{params}", file=sys.stderr)
+
+    def check(self, condition, message):
+        """結果不正確時中止，避免錯誤的結果被當成效能數據記錄"""
+        if not condition:
+            raise AssertionError(message)
+
+    def process_events(self, until=None, timeout=60):
+        deadline = time.perf_counter() + timeout
+        while True:
+            self.app.processEvents()
+            if until is None or until():
+                return
+            if time.perf_counter() > deadline:
+                raise TimeoutError('等待背景工作逾時')
+            time.sleep(0.001)
+
+    def new_editor(self, workdir):
+        os.chdir(workdir)
+        editor = self.module.PlainTextEditor()
+        editor.show()
+        self.process_events()
+        return editor
+
+    def dispose(self, editor):
+        editor.save_tabs()
+        editor.store.close()
+        editor.tray_icon.hide()
+        editor.deleteLater()
+        QThreadPool.globalInstance().waitForDone()
+        self.process_events()
+
+    def run(self, only=None):
+        benchmarks = [
+            ('session', self.bench_session),
+            ('typing', self.bench_typing),
+            ('large_document', self.bench_large_document),
+            ('tab_creation', self.bench_tab_creation),
+            ('find', self.bench_find),
+            ('replace', self.bench_replace_all),
+            ('save_file', self.bench_save_file),
+            ('quick_open', self.bench_quick_open),
+            ('snapshot', self.bench_snapshot),
+            ('export', self.bench_export),
+        ]
+        for name, benchmark in benchmarks:
+            if only and not any(word in name for word in only):
+                continue
+            workdir = tempfile.mkdtemp(prefix='editor-bench-')
+            try:
+                benchmark(workdir)
+            finally:
+                os.chdir(self.original_cwd)
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def bench_session(self, workdir):
+        """save_tabs 與啟動時的 load_tabs"""
+        tabs, size = self.config['tabs'], self.config['tab_size']
+        editor = self.new_editor(workdir)
+        text = make_text(size / 3)
+        for _ in range(tabs - 1):
+            editor.add_new_tab(text, text, text, 'bench')
+        editor.tabs.widget(0).leftTextEdit.setPlainText(text)
+
+        samples = []
+        for _ in range(self.config['repeat']):
+            for tab in editor.iter_tabs():
+                tab.dirty_panes.update(range(3))
+            editor.structure_dirty = True
+            start = time.perf_counter()
+            editor.save_tabs()
+            samples.append(elapsed_ms(start))
+        self.record('save_tabs', samples, tabs=tabs, tab_mb=size)
+        self.dispose(editor)
+
+        for lazy in (True, False):
+            startup, materialize = [], []
+            for _ in range(self.config['repeat']):
+                store = self.module.SessionStore(os.path.join(workdir, 'editor_data.db'))
+                store.write(None, {}, {'lazy_restore': lazy})
+                store.close()
+                start = time.perf_counter()
+                editor = self.module.PlainTextEditor()
+                startup.append(elapsed_ms(start))
+                start = time.perf_counter()
+                for index in range(editor.tabs.count()):
+                    editor.tabs.setCurrentIndex(index)
+                materialize.append(elapsed_ms(start))
+                editor.store.close()
+                editor.tray_icon.hide()
+                editor.deleteLater()
+                self.process_events()
+            self.record('load_tabs', startup, tabs=tabs, tab_mb=size, lazy_restore=lazy)
+            self.record('switch_all_tabs', materialize, tabs=tabs, tab_mb=size, lazy_restore=lazy)
+
+    def bench_typing(self, workdir):
+        """逐字輸入的延遲，包含字數統計與分頁標題更新"""
+        size = self.config['document_size']
+        editor = self.new_editor(workdir)
+        tab = editor.tabs.currentWidget()
+        text_edit = tab.leftTextEdit
+        text_edit.setPlainText(make_text(size))
+        label = tab.pane_container.labels[0]
+        keystrokes = self.config['keystrokes']
+
+        for name, position in (('typing_first_line', 0), ('typing_middle', text_edit.document().characterCount() // 2)):
+            insert, word_count, title = [], [], []
+            cursor = QTextCursor(text_edit.document())
+            cursor.setPosition(position)
+            for index in range(keystrokes):
+                start = time.perf_counter()
+                cursor.insertText('字' if index % 2 else 'a')
+                insert.append(elapsed_ms(start))
+                start = time.perf_counter()
+                editor.update_word_count(text_edit, label)
+                word_count.append(elapsed_ms(start))
+                start = time.perf_counter()
+                editor.update_tab_title(tab, position)
+                title.append(elapsed_ms(start))
+                self.app.processEvents()
+            self.record(f'{name}.insert', insert, document_mb=size)
+            self.record(f'{name}.update_word_count', word_count, document_mb=size)
+            self.record(f'{name}.update_tab_title', title, document_mb=size)
+        self.dispose(editor)
+
+    def bench_large_document(self, workdir):
+        """一般與大型文件模式載入並逐字輸入多行文字與單一長行的延遲（含重繪）"""
+        size = self.config['document_size']
+        editor = self.new_editor(workdir)
+        container = editor.tabs.currentWidget().pane_container
+        documents = (
+            ('lines', make_text(size), self.config['keystrokes']),
+            # 沒有空白的長行（例如 base64 資料），一般模式排版極慢，只輸入少量字元
+            ('long_line', '0123456789abcdef' * int(size / 10 * 1024 * 1024 / 16), 5),
+        )
+        for name, text, keystrokes in documents:
+            for large in (False, True):
+                mode = 'large' if large else 'normal'
+                editor.settings['large_document_size'] = 0
+                editor.settings['long_line_length'] = 1 if large else 0
+                start = time.perf_counter()
+                text_edit = editor.set_pane_text(container, 0, text)
+                self.app.processEvents()
+                self.record(f'large_document.{name}.{mode}.load', [elapsed_ms(start)], document_mb=size / (10 if name == 'long_line' else 1))
+                cursor = QTextCursor(text_edit.document())
+                cursor.setPosition(text_edit.document().characterCount() // 2)
+                samples = []
+                for _ in range(keystrokes):
+                    start = time.perf_counter()
+                    cursor.insertText('a')
+                    text_edit.viewport().repaint()
+                    samples.append(elapsed_ms(start))
+                self.record(f'large_document.{name}.{mode}.insert', samples, document_mb=size / (10 if name == 'long_line' else 1))
+        editor.settings['long_line_length'] = self.module.DEFAULT_SETTINGS['long_line_length']
+        editor.set_pane_text(container, 0, '')
+        self.dispose(editor)
+
+    def bench_tab_creation(self, workdir):
+        """新增空白分頁：新建文字框容器、取自預先建立的池、重新使用關閉的分頁的容器，以及切換過去後的顯示"""
+        count = self.config['tabs'] * 6
+        editor = self.new_editor(workdir)
+
+        def drain_pool():
+            # 清空池並停止閒置時補充，下一個分頁只能新建容器
+            editor.pane_pool_timer.stop()
+            for container in editor.pane_pool:
+                container.deleteLater()
+            editor.pane_pool.clear()
+
+        samples, shown = [], []
+        for _ in range(count):
+            drain_pool()
+            start = time.perf_counter()
+            editor.add_new_tab()
+            samples.append(elapsed_ms(start))
+            start = time.perf_counter()
+            editor.tabs.setCurrentIndex(editor.tabs.count() - 1)
+            self.process_events()
+            shown.append(elapsed_ms(start))
+        self.record('tab_creation.construct', samples, tabs=count)
+        self.record('tab_creation.show', shown, tabs=count)
+
+        samples = []
+        for _ in range(count):
+            self.process_events(lambda: len(editor.pane_pool) >= self.module.PANE_POOL_SIZE)
+            start = time.perf_counter()
+            editor.add_new_tab()
+            samples.append(elapsed_ms(start))
+        self.record('tab_creation.pooled', samples, tabs=count)
+
+        samples = []
+        for _ in range(count):
+            drain_pool()
+            tab = editor.tabs.widget(editor.tabs.count() - 1)
+            container = tab.pane_container
+            editor.close_tab(editor.tabs.count() - 1)
+            start = time.perf_counter()
+            editor.add_new_tab()
+            samples.append(elapsed_ms(start))
+            self.check(editor.tabs.widget(editor.tabs.count() - 1).pane_container is container,
+                       '關閉的分頁的文字框容器沒有被重新使用')
+        self.record('tab_creation.recycled', samples, tabs=count)
+        self.dispose(editor)
+
+    def global_find(self, editor, search_text, index):
+        """從第一個分頁開始全局搜尋，確認選取了第 index 個分頁中的搜尋內容；回傳耗時"""
+        editor.tabs.setCurrentIndex(0)
+        dialog = self.module.FindReplaceDialog(editor, editor.tabs.widget(0).leftTextEdit)
+        dialog.global_checkbox.setChecked(True)
+        dialog.find_input.setText(search_text)
+        start = time.perf_counter()
+        dialog.find_next()
+        elapsed = elapsed_ms(start)
+        self.check(editor.tabs.currentIndex() == index % editor.tabs.count()
+                   and dialog.text_edit.textCursor().selectedText() == search_text,
+                   f'全局搜尋沒有選取第 {index} 個分頁中的 {search_text}')
+        dialog.close()
+        return elapsed
+
+    def count_in_tabs(self, editor, text):
+        return sum(content.count(text) for tab in editor.iter_tabs() for content in editor.get_tab_contents(tab))
+
+    def bench_find(self, workdir):
+        """本地與全局的 find_next；全局搜尋另外涵蓋延遲載入、休眠與建立索引後才新增的分頁"""
+        size, tabs = self.config['document_size'], self.config['tabs']
+        editor = self.new_editor(workdir)
+        text_edit = editor.tabs.currentWidget().middleTextEdit
+        text_edit.setPlainText(make_text(size))
+        dialog = self.module.FindReplaceDialog(editor, text_edit)
+        dialog.find_input.setText('English')
+        samples = []
+        for _ in range(self.config['keystrokes']):
+            start = time.perf_counter()
+            dialog.find_next()
+            samples.append(elapsed_ms(start))
+            self.check(text_edit.textCursor().selectedText() == 'English', '本地搜尋沒有選取搜尋內容')
+        self.record('find_next.local', samples, document_mb=size)
+
+        dialog.whole_word_checkbox.setChecked(True)
+        samples = []
+        for _ in range(self.config['repeat'] * 5):
+            start = time.perf_counter()
+            dialog.find_next()
+            self.process_events(lambda: dialog.search_worker is None)
+            samples.append(elapsed_ms(start))
+            self.check(text_edit.textCursor().selectedText() == 'English', '全字拼寫須相符的搜尋沒有選取搜尋內容')
+        self.record('find_next.local_whole_word', samples, document_mb=size)
+        dialog.close()
+
+        # 全局：只有最後一個分頁含有搜尋內容
+        filler = make_text(self.config['tab_size'] / 3)
+        for _ in range(tabs - 1):
+            editor.add_new_tab(filler, filler, filler, 'bench')
+        editor.tabs.widget(editor.tabs.count() - 1).rightTextEdit.insertPlainText('needle')
+        editor.search_index.ensure_built()
+        self.process_events(lambda: editor.search_index.state == 'ready')
+        samples = [self.global_find(editor, 'needle', -1) for _ in range(self.config['repeat'])]
+        self.record('find_next.global', samples, tabs=tabs, tab_mb=self.config['tab_size'])
+
+        # 索引建立後才新增（例如從快照還原）的分頁
+        editor.add_new_tab(filler, 'straggler', filler, 'bench')
+        samples = [self.global_find(editor, 'straggler', -1) for _ in range(self.config['repeat'])]
+        self.record('find_next.global_new_tab', samples, tabs=tabs + 1, tab_mb=self.config['tab_size'])
+        editor.close_tab(editor.tabs.count() - 1)
+        self.dispose(editor)
+
+        # 重新啟動後分頁延遲載入，全局搜尋須在尚未建立文字框的分頁中找到內容
+        editor = self.new_editor(workdir)
+        self.check(editor.tabs.widget(editor.tabs.count() - 1).pending_contents is not None, '分頁未延遲載入')
+        editor.search_index.ensure_built()
+        self.process_events(lambda: editor.search_index.state == 'ready')
+        samples = [self.global_find(editor, 'needle', -1)]
+        self.record('find_next.global_lazy', samples, tabs=tabs, tab_mb=self.config['tab_size'])
+
+        # 休眠的分頁
+        samples = []
+        for _ in range(self.config['repeat']):
+            tab = editor.tabs.widget(editor.tabs.count() - 1)
+            editor.tabs.setCurrentIndex(0)
+            editor.hibernate_tab(tab)
+            self.check(tab.pending_contents is not None, '分頁未休眠')
+            samples.append(self.global_find(editor, 'needle', -1))
+        self.record('find_next.global_hibernated', samples, tabs=tabs, tab_mb=self.config['tab_size'])
+        self.dispose(editor)
+
+    def bench_replace_all(self, workdir):
+        """大量匹配項目的 replace_all；全局取代另外涵蓋延遲載入與建立索引後才新增的分頁"""
+        size, tabs = self.config['document_size'], self.config['tabs']
+        editor = self.new_editor(workdir)
+        text_edit = editor.tabs.currentWidget().middleTextEdit
+        text = make_text(size)
+        matches = text.count('English')
+        samples = []
+        for _ in range(self.config['repeat']):
+            text_edit.setPlainText(text)
+            dialog = self.module.FindReplaceDialog(editor, text_edit)
+            dialog.find_input.setText('English')
+            dialog.replace_input.setText('英文')
+            start = time.perf_counter()
+            dialog.replace_all()
+            samples.append(elapsed_ms(start))
+            dialog.close()
+            result = text_edit.toPlainText()
+            self.check('English' not in result and result.count('英文') == text.count('英文') + matches,
+                       '本地全部取代的結果不正確')
+        self.record('replace_all.local', samples, document_mb=size, matches=matches)
+
+        # 規則運算式逐行匹配：. 不跨行，^ 在每一行的開頭都能匹配
+        lines = text.count('\n')
+        samples = []
+        for _ in range(self.config['repeat']):
+            text_edit.setPlainText(text)
+            dialog = self.module.FindReplaceDialog(editor, text_edit)
+            dialog.regex_checkbox.setChecked(True)
+            dialog.find_input.setText('^這是.*')
+            dialog.replace_input.setText('E')
+            start = time.perf_counter()
+            dialog.replace_all()
+            samples.append(elapsed_ms(start))
+            dialog.close()
+            self.check(text_edit.toPlainText() == 'E\n' * lines, '規則運算式的全部取代沒有逐行匹配')
+        self.record('replace_all.regex_lines', samples, document_mb=size, matches=lines)
+
+        filler = make_text(self.config['tab_size'] / 3)
+        for _ in range(tabs - 1):
+            editor.add_new_tab(filler, filler, filler, 'bench')
+        total = self.count_in_tabs(editor, 'English') + self.count_in_tabs(editor, '英文')
+
+        def replace_all_tabs(search, replace, regex=False):
+            dialog = self.module.FindReplaceDialog(editor, editor.tabs.widget(0).leftTextEdit)
+            dialog.global_checkbox.setChecked(True)
+            dialog.regex_checkbox.setChecked(regex)
+            dialog.find_input.setText(search)
+            dialog.replace_input.setText(replace)
+            replied = len(self.messages)
+            start = time.perf_counter()
+            dialog.replace_all()
+            self.process_events(lambda: len(self.messages) > replied)
+            elapsed = elapsed_ms(start)
+            dialog.close()
+            return elapsed
+
+        def swap_all_tabs(index):
+            search, replace = ('English', '英文') if index % 2 == 0 else ('英文', 'English')
+            elapsed = replace_all_tabs(search, replace)
+            self.check(self.count_in_tabs(editor, search) == 0 and self.count_in_tabs(editor, replace) == total,
+                       f'全局取代 {search} 的結果不正確')
+            return elapsed
+
+        samples = [swap_all_tabs(index) for index in range(self.config['repeat'])]
+        self.record('replace_all.global', samples, tabs=tabs, tab_mb=self.config['tab_size'])
+        self.dispose(editor)
+
+        # 重新啟動後分頁延遲載入，並在索引建立後新增一個分頁
+        editor = self.new_editor(workdir)
+        self.check(editor.tabs.widget(editor.tabs.count() - 1).pending_contents is not None, '分頁未延遲載入')
+        editor.search_index.ensure_built()
+        self.process_events(lambda: editor.search_index.state == 'ready')
+        editor.add_new_tab(filler, filler, filler, 'bench')
+        total = self.count_in_tabs(editor, 'English') + self.count_in_tabs(editor, '英文')
+        samples = [swap_all_tabs(index) for index in range(self.config['repeat'])]
+        self.record('replace_all.global_lazy', samples, tabs=tabs + 1, tab_mb=self.config['tab_size'])
+
+        # 規則運算式的全局取代在已載入與尚未載入的文字框中都逐行匹配
+        lines = self.count_in_tabs(editor, '\n')
+        samples = [replace_all_tabs('^這是.*', 'E', regex=True)]
+        self.check(self.count_in_tabs(editor, '這是') == 0 and self.count_in_tabs(editor, '\n') == lines,
+                   '規則運算式的全局取代沒有逐行匹配')
+        self.record('replace_all.global_regex_lines', samples, tabs=tabs + 1, tab_mb=self.config['tab_size'])
+        self.dispose(editor)
+
+    def bench_save_file(self, workdir):
+        """以每種可選編碼另存新檔，從按下儲存到寫入完成"""
+        size = self.config['document_size']
+        editor = self.new_editor(workdir)
+        text_edit = editor.tabs.currentWidget().leftTextEdit
+        path = os.path.join(workdir, 'saved.txt')
+        saved = []
+        editor.tray_icon.showMessage = lambda *args: saved.append(args)
+        self.module.QFileDialog.getSaveFileName = staticmethod(lambda *args, **kwargs: (path, ''))
+        for encoding in self.module.ENCODINGS:
+            text_edit.setPlainText(make_text(size, SAMPLE_TEXTS[encoding]))
+            self.module.QInputDialog.getItem = staticmethod(lambda *args, **kwargs: (encoding, True))
+            samples = []
+            for _ in range(self.config['repeat']):
+                count = len(saved)
+                start = time.perf_counter()
+                editor.save_file(text_edit)
+                self.process_events(lambda: len(saved) > count)
+                samples.append(elapsed_ms(start))
+            self.record(f'save_file.{encoding}', samples, document_mb=size)
+        self.dispose(editor)
+
+    def bench_quick_open(self, workdir):
+        """Ctrl+P 分頁切換器逐字輸入時的搜尋延遲"""
+        tabs = self.config['tabs'] * 50
+        editor = self.new_editor(workdir)
+        for index in range(tabs):
+            head = f'第 {index} 份會議紀錄 meeting notes {index}\n'
+            editor.add_new_tab(head + SAMPLE_TEXT * 3, SAMPLE_TEXT, '', f'notes {index}')
+        index = editor.quick_open_index
+        index.refresh()
+        self.process_events(lambda: index.state == 'ready')
+        samples = []
+        for _ in range(self.config['repeat']):
+            query = ''
+            for character in 'meeting 42':
+                query += character
+                start = time.perf_counter()
+                results = index.search(query.lower())
+                for tab_id in results[:self.module.QuickOpenDialog.MAX_LISTED_RESULTS]:
+                    index.display_line(tab_id, query.lower())
+                samples.append(elapsed_ms(start))
+        self.record('quick_open.search', samples, tabs=tabs)
+        self.dispose(editor)
+
+    def bench_snapshot(self, workdir):
+        """建立工作階段快照：第一個快照保存全部內容，之後只處理有變動的文字框"""
+        tabs, size = self.config['tabs'], self.config['tab_size']
+        editor = self.new_editor(workdir)
+        text = make_text(size / 3)
+        for _ in range(tabs - 1):
+            editor.add_new_tab(text, text, text, 'bench')
+        editor.save_tabs()
+        store = editor.store
+        start = time.perf_counter()
+        store.take_snapshot('bench')
+        self.record('snapshot.first', [elapsed_ms(start)], tabs=tabs, tab_mb=size)
+
+        tab = editor.tabs.widget(editor.tabs.count() // 2)
+        editor.tabs.setCurrentWidget(tab)
+        cursor = tab.middleTextEdit.textCursor()
+        samples = []
+        for _ in range(self.config['repeat']):
+            cursor.setPosition(len(text) // 2)
+            cursor.insertText('snapshot ')
+            editor.save_tabs()
+            start = time.perf_counter()
+            store.take_snapshot('bench')
+            samples.append(elapsed_ms(start))
+        self.record('snapshot.one_pane_changed', samples, tabs=tabs, tab_mb=size)
+        self.dispose(editor)
+
+    def bench_export(self, workdir):
+        """匯出所有分頁到資料夾與 ZIP 壓縮檔，從開始到背景寫入完成"""
+        tabs, size = self.config['tabs'], self.config['tab_size']
+        editor = self.new_editor(workdir)
+        text = make_text(size / 3)
+        for _ in range(tabs - 1):
+            editor.add_new_tab(text, text, text, 'bench')
+        editor.tabs.widget(0).leftTextEdit.setPlainText(text)
+        items = []
+        names = self.module.ExportNames()
+        for index, tab in enumerate(editor.iter_tabs()):
+            for pane, name in enumerate(names.tab_names(index + 1, editor.tabs.tabText(index))):
+                items.append((name, (tab.tab_id, pane), editor.get_pane_content(tab, pane)))
+        for kind, target in (('directory', 'export'), ('zip', 'export.zip')):
+            samples = []
+            for run in range(self.config['repeat']):
+                path = os.path.join(workdir, f'{run}_{target}')
+                start = time.perf_counter()
+                editor.start_export(items, path, 'UTF-8')
+                self.process_events(lambda: not self.module.Worker.running)
+                samples.append(elapsed_ms(start))
+            self.record(f'export.{kind}', samples, tabs=tabs, tab_mb=size)
+        self.dispose(editor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='純白文本編輯器效能基準測試')
+    parser.add_argument('--tabs', type=int, default=20, help='分頁數')
+    parser.add_argument('--tab-size', type=float, default=1.0, help='每個分頁的文字量（MB）')
+    parser.add_argument('--document-size', type=float, default=2.0, help='單一文字框測試的文字量（MB）')
+    parser.add_argument('--keystrokes', type=int, default=200, help='模擬輸入與搜尋的次數')
+    parser.add_argument('--repeat', type=int, default=5, help='每個項目重複的次數')
+    parser.add_argument('--quick', action='store_true', help='以小規模快速執行')
+    parser.add_argument('--only', default='', help='以逗號分隔，只執行名稱含有這些字串的項目')
+    parser.add_argument('-o', '--output', help='結果 JSON 檔案，預設輸出到標準輸出')
+    args = parser.parse_args()
+    if args.quick:
+        args.tabs, args.tab_size, args.document_size, args.keystrokes, args.repeat = 5, 0.1, 0.2, 50, 2
+
+    config = {
+        'tabs': args.tabs,
+        'tab_size': args.tab_size,
+        'document_size': args.document_size,
+        'keystrokes': args.keystrokes,
+        'repeat': args.repeat,
+    }
+    app = QApplication.instance() or QApplication(sys.argv)
+    suite = BenchmarkSuite(load_editor_module(), app, config)
+    # 編輯器本身的訊息改印到標準錯誤，標準輸出只留給 JSON 結果
+    with contextlib.redirect_stdout(sys.stderr):
+        suite.run([word for word in args.only.split(',') if word])
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'qt': QT_VERSION_STR,
+            'pyqt': PYQT_VERSION_STR,
+            'platform': platform.platform(),
+            'qpa': os.environ.get('QT_QPA_PLATFORM'),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': config,
+        'results': suite.results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,167 @@
 import sys
 import os
 import json
+import re
+import time
+import sqlite3
+import threading
+import functools
+import difflib
+from collections import Counter
+import codecs
+import tempfile
+import shutil
+import zipfile
+import inspect
+import traceback
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right
+from operator import methodcaller
+import argparse
+import hashlib
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QTextEdit, QVBoxLayout, QHBoxLayout, QPushButton,
+    QApplication, QWidget, QTextEdit, QPlainTextEdit, QVBoxLayout, QHBoxLayout, QPushButton,
     QTabWidget, QMainWindow, QToolButton, QSizePolicy, QLabel, QFileDialog,
     QMessageBox, QShortcut, QDialog, QLineEdit, QCheckBox, QGridLayout,
-    QAction, QInputDialog, QSystemTrayIcon, QMenu
+    QAction, QInputDialog, QSystemTrayIcon, QMenu, QListWidget, QListWidgetItem,
+    QProgressDialog, QComboBox
 )
 from PyQt5.QtGui import (
     QFont, QIcon, QKeySequence, QTextCursor, QTextDocument,
-    QPalette, QColor, QFontDatabase, QPainter, QPixmap
+    QPalette, QColor, QFontDatabase, QPainter, QPixmap, QTextCharFormat, QTextFormat, QTextOption
 )
-from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtCore import (
+    Qt, QSize, QObject, QTimer, QRunnable, QThreadPool, QRegularExpression, pyqtSignal, QPoint, QPointF, QMimeData
+)
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+
+# 可由 editor_data.json 中的 settings 覆寫的預設設定
+DEFAULT_SETTINGS = {
+    'lazy_restore': True,  # 啟動時僅建立分頁標題，分頁首次被切換到時才建立文字框
+    'stats_update_delay': 150,  # 字數標籤合併更新的間隔（毫秒）
+    'autosave_interval': 30000,  # 定期自動儲存的間隔，亦即未儲存修改的最長延遲（毫秒，0 為停用）
+    'autosave_idle_delay': 2000,  # 停止輸入多久後提前自動儲存（毫秒，0 為停用）
+    'instrumentation': False,  # 效能診斷模式，可由托盤選單切換
+    'stall_threshold': 100,  # 事件迴圈停頓超過此時間即記錄（毫秒）
+    'tab_memory_budget': 512,  # 已建立文字框的分頁估計記憶體上限，超過時休眠最久未使用的分頁（MB，0 為不限制）
+    'undo_pane_budget': 64,  # 單一文字框復原記錄的估計記憶體上限（MB，0 為不限制）
+    'undo_total_budget': 256,  # 所有文字框復原記錄的估計記憶體上限，超過時從最久未修改的文字框清除（MB，0 為不限制）
+    'large_document_size': 8,  # 載入的文字超過此大小即使用大型文件模式（MB，0 為停用）
+    'long_line_length': 10000,  # 載入的文字有一行超過此長度即使用大型文件模式，並可在任意字元處換行（字元，0 為停用）
+    'chunked_paste_size': 1,  # 貼上超過此大小的文字時分段插入並顯示進度（MB，0 為停用）
+    'snapshot_interval': 600000,  # 定期建立工作階段快照的間隔（毫秒，0 為停用）
+    'snapshot_budget': 64,  # 快照佔用的空間上限，超過時從最舊的快照開始刪除（MB，0 為不限制）
+}
+
+# 中日韓文字（含日文假名與韓文音節）
+CJK_PATTERN = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\U00020000-\U0002fa1f'
+CJK_RE = re.compile(f'[{CJK_PATTERN}]')
+# 中日韓文字每字算一個詞，其他以空白分隔
+WORD_RE = re.compile(f'[{CJK_PATTERN}]|[^\\s{CJK_PATTERN}]+')
+# 另存新檔與開啟檔案支援的編碼
+ENCODINGS = ['UTF-8', 'UTF-16', 'GBK', 'Shift-JIS', 'ISO-8859-1']
+SESSION_PATH = "editor_data.db"
+# 轉交給執行中的編輯器時，連線與等待確認的逾時（毫秒）
+INSTANCE_TIMEOUT = 2000
+FILE_CHUNK_SIZE = 1 << 16
+# 新檔案的權限與 open 建立的相同；os.umask 只能在設定時讀出，於載入時（尚無其他執行緒）讀取一次
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+NEW_FILE_MODE = 0o666 & ~UMASK
+# 匯出所有分頁時同時編碼與寫入的檔案數，一個檔案等待磁碟時可處理其他檔案
+EXPORT_THREADS = 4
+# 分段貼上時每次插入的字元數
+PASTE_CHUNK_SIZE = 1 << 17
+ENCODING_SAMPLE_SIZE = 1 << 16
+MAX_ENCODING_ERRORS = 1000
+# 比較模式中逐字比較的上限，過長的行或過大的區塊只標示整行
+MAX_REFINED_LINES = 500
+MAX_REFINED_LINE_LENGTH = 4000
+# 超過此行數才先以唯一的行對齊再分段比較
+DIRECT_DIFF_LINES = 2000
+# 估計文字框記憶體用量：每個字元（含排版）與每個段落的約略位元組數
+DOCUMENT_BYTES_PER_CHARACTER = 12
+DOCUMENT_BYTES_PER_BLOCK = 100
+
+# QTextDocument 以 UTF-16 計算位置，BMP 以外的字元佔兩個位置
+ASTRAL_RE = re.compile('[\U00010000-\U0010ffff]')
+PANE_NAMES = ('左框', '中框', '右框')
+PANE_DESCRIPTIONS = ('左側文字框', '中間文字框', '右側文字框')
+PANE_TOOLTIPS = ('此文字框內容的前幾個字元會用於更新分頁標題', '中間文字框', '右側文字框')
+PANE_ATTRIBUTES = ('leftTextEdit', 'middleTextEdit', 'rightTextEdit')
+# 預先建立並回收的文字框容器數量
+PANE_POOL_SIZE = 3
+
+# 主視窗樣式表，只需解析一次；文字框與按鈕依所在容器套用，不必各自設定
+# （QAbstractScrollArea 同時涵蓋一般的 QTextEdit 與大型文件模式的 QPlainTextEdit）
+WINDOW_STYLESHEET = """
+    * {
+        background-color: white;
+    }
+    QWidget#paneContainer QAbstractScrollArea {
+        border: 1px solid #d3d3d3;
+        background-color: white;
+        padding: 5px;
+    }
+    QWidget#paneContainer QPushButton {
+        border: none;
+        background-color: #f0f0f0;
+        padding: 8px;
+    }
+    QWidget#paneContainer QPushButton:hover {
+        background-color: #e0e0e0;
+    }
+    QWidget#paneContainer QPushButton:checked {
+        background-color: #d0d0d0;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar:vertical {
+        background: transparent;
+        width: 12px;
+        margin: 0px 0px 0px 0px;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::handle:vertical {
+        background: #e0e0e0;
+        min-height: 20px;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::add-line:vertical {
+        background: none;
+        height: 0px;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::sub-line:vertical {
+        background: none;
+        height: 0px;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::add-page:vertical,
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::sub-page:vertical {
+        background: none;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar:horizontal {
+        background: transparent;
+        height: 12px;
+        margin: 0px 0px 0px 0px;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::handle:horizontal {
+        background: #e0e0e0;
+        min-width: 20px;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::add-line:horizontal {
+        background: none;
+        width: 0px;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::sub-line:horizontal {
+        background: none;
+        width: 0px;
+    }
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::add-page:horizontal,
+    QWidget#paneContainer QAbstractScrollArea QScrollBar::sub-page:horizontal {
+        background: none;
+    }
+"""
+
+# 不計入字數的空白字元（段落內的換行為 U+2028，不斷行空格為 U+00A0）
+WHITESPACE_CHARS = (' ', '\t', '\u00a0', '\u2028')
 
 def resource_path(relative_path):
     """獲取資源的絕對路徑，適用於開發和 PyInstaller 打包後"""
@@ -21,6 +171,1979 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+class SessionStore:
+    """以 SQLite 保存分頁，可只讀取分頁標題，也可單獨更新某個文字框"""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS tabs (id INTEGER PRIMARY KEY, position INTEGER NOT NULL, title TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS panes (
+            tab_id INTEGER NOT NULL, pane INTEGER NOT NULL, content TEXT NOT NULL,
+            PRIMARY KEY (tab_id, pane)
+        );
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY, created REAL NOT NULL, label TEXT NOT NULL, tabs TEXT NOT NULL,
+            panes INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS snapshot_panes (
+            snapshot_id INTEGER NOT NULL, tab_id INTEGER NOT NULL, pane INTEGER NOT NULL,
+            delta INTEGER NOT NULL, data BLOB NOT NULL,
+            PRIMARY KEY (tab_id, pane, snapshot_id)
+        );
+        CREATE TABLE IF NOT EXISTS snapshot_changes (
+            tab_id INTEGER NOT NULL, pane INTEGER NOT NULL, PRIMARY KEY (tab_id, pane)
+        );
+    """
+    PANE_KEYS = ('left_content', 'middle_content', 'right_content')
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        created = not os.path.exists(path)
+        self.lock = threading.Lock()
+        # 寫入在背景執行緒進行；WAL 模式下讀取用的連線不會被寫入擋住
+        self.writer = sqlite3.connect(path, check_same_thread=False)
+        self.writer.execute('PRAGMA journal_mode=WAL')
+        self.writer.executescript(self.SCHEMA)
+        self.writer.commit()
+        self.reader = sqlite3.connect(path, check_same_thread=False)
+        # 已關閉的分頁仍可能留在快照中，編號不可重複使用，否則新分頁會接上舊分頁的快照記錄
+        self.next_tab_id = (self.reader.execute(
+            'SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM tabs UNION ALL SELECT MAX(tab_id) FROM snapshot_panes '
+            'UNION ALL SELECT MAX(tab_id) FROM snapshot_changes)').fetchone()[0] or 0) + 1
+        if created and legacy_path and os.path.exists(legacy_path):
+            self.migrate_json(legacy_path)
+
+    def allocate_tab_id(self):
+        tab_id = self.next_tab_id
+        self.next_tab_id += 1
+        return tab_id
+
+    def load_settings(self):
+        return {key: json.loads(value) for key, value in self.reader.execute('SELECT key, value FROM settings')}
+
+    def load_tab_list(self):
+        """依序回傳 (分頁編號, 標題)，不讀取文字內容"""
+        return self.reader.execute('SELECT id, title FROM tabs ORDER BY position').fetchall()
+
+    def load_tab_contents(self, tab_id):
+        contents = ['', '', '']
+        for pane, content in self.reader.execute(
+                'SELECT pane, content FROM panes WHERE tab_id = ?', (tab_id,)):
+            contents[pane] = content
+        return contents
+
+    def load_pane(self, tab_id, pane):
+        row = self.reader.execute(
+            'SELECT content FROM panes WHERE tab_id = ? AND pane = ?', (tab_id, pane)).fetchone()
+        return row[0] if row else ''
+
+    def write(self, tabs, panes, settings=None, worker=None):
+        """在單一交易中寫入變更，回傳耗時（毫秒）
+
+        tabs 為依序排列的 (分頁編號, 標題)，None 表示分頁順序與標題沒有變動；
+        panes 為要更新的 (分頁編號, 文字框, 內容)。
+        """
+        start = time.perf_counter()
+        with self.lock, self.writer:
+            if tabs is not None:
+                kept = {tab_id for tab_id, _ in tabs}
+                removed = [(tab_id,) for (tab_id,) in self.writer.execute('SELECT id FROM tabs')
+                           if tab_id not in kept]
+                self.writer.executemany('DELETE FROM tabs WHERE id = ?', removed)
+                self.writer.executemany('DELETE FROM panes WHERE tab_id = ?', removed)
+                self.writer.executemany(
+                    'INSERT OR REPLACE INTO tabs (id, position, title) VALUES (?, ?, ?)',
+                    [(tab_id, position, title) for position, (tab_id, title) in enumerate(tabs)])
+            self.writer.executemany(
+                'INSERT OR REPLACE INTO panes (tab_id, pane, content) VALUES (?, ?, ?)', panes)
+            # 記下上次快照後寫入過的文字框，建立快照時只需處理這些
+            self.writer.executemany(
+                'INSERT OR IGNORE INTO snapshot_changes (tab_id, pane) VALUES (?, ?)',
+                [(tab_id, pane) for tab_id, pane, _ in panes])
+            if settings is not None:
+                self.writer.executemany(
+                    'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                    [(key, json.dumps(value)) for key, value in settings.items()])
+        return (time.perf_counter() - start) * 1000
+
+    def take_snapshot(self, label, budget=0, tabs=None, panes=(), worker=None):
+        """以目前寫入的內容建立快照，回傳 (快照編號, 有變動的文字框數)，與上一個快照相同時回傳 None
+
+        tabs 與 panes 的格式與 write 相同，為尚未寫入的修改，快照以這些為準。
+        每個文字框只有最新的版本完整壓縮保存，較舊的版本改存為由新版本還原的逐行差異，
+        因此只需處理上次快照後有變動的文字框。超過 budget（位元組）時從最舊的快照開始刪除。
+        """
+        unsaved = {(tab_id, pane): content for tab_id, pane, content in panes}
+        with self.lock, self.writer:
+            if tabs is None:
+                tabs = self.writer.execute('SELECT id, title FROM tabs ORDER BY position').fetchall()
+            tabs = json.dumps(tabs, ensure_ascii=False)
+            previous = self.writer.execute('SELECT tabs FROM snapshots ORDER BY id DESC LIMIT 1').fetchone()
+            # 第一個快照包含所有文字框
+            keys = self.writer.execute(
+                'SELECT tab_id, pane FROM snapshot_changes' if previous else 'SELECT tab_id, pane FROM panes').fetchall()
+            keys = set(keys) | set(unsaved)
+            self.writer.execute('DELETE FROM snapshot_changes')
+            snapshot_id = self.writer.execute(
+                'INSERT INTO snapshots (created, label, tabs, panes) VALUES (?, ?, ?, 0)',
+                (time.time(), label, tabs)).lastrowid
+            changed = 0
+            for tab_id, pane in sorted(keys):
+                content = unsaved.get((tab_id, pane))
+                if content is None:
+                    row = self.writer.execute(
+                        'SELECT content FROM panes WHERE tab_id = ? AND pane = ?', (tab_id, pane)).fetchone()
+                    if row is None:
+                        continue  # 分頁已關閉
+                    content = row[0]
+                latest = self.writer.execute(
+                    'SELECT snapshot_id, data FROM snapshot_panes WHERE tab_id = ? AND pane = ? AND delta = 0',
+                    (tab_id, pane)).fetchone()
+                if latest is not None:
+                    old = zlib.decompress(latest[1]).decode('utf-8')
+                    if old == content:
+                        continue
+                    delta = json.dumps(text_delta(content, old), ensure_ascii=False)
+                    self.writer.execute(
+                        'UPDATE snapshot_panes SET delta = 1, data = ? WHERE tab_id = ? AND pane = ? AND snapshot_id = ?',
+                        (zlib.compress(delta.encode('utf-8')), tab_id, pane, latest[0]))
+                self.writer.execute(
+                    'INSERT INTO snapshot_panes (snapshot_id, tab_id, pane, delta, data) VALUES (?, ?, ?, 0, ?)',
+                    (snapshot_id, tab_id, pane, zlib.compress(content.encode('utf-8'))))
+                changed += 1
+            if not changed and previous is not None and previous[0] == tabs:
+                self.writer.execute('DELETE FROM snapshots WHERE id = ?', (snapshot_id,))
+                return None
+            self.writer.execute('UPDATE snapshots SET panes = ? WHERE id = ?', (changed, snapshot_id))
+            if budget > 0:
+                self.prune_snapshots(budget)
+        return snapshot_id, changed
+
+    def prune_snapshots(self, budget):
+        """從最舊的快照開始刪除直到不超過 budget（位元組），至少保留最新的快照；須在寫入交易中呼叫
+
+        最舊快照中的版本若在下一個快照仍然有效（文字框沒有變動），改歸入下一個快照。
+        """
+        total = self.writer.execute('SELECT COALESCE(SUM(length(data)), 0) FROM snapshot_panes').fetchone()[0]
+        ids = [snapshot_id for (snapshot_id,) in self.writer.execute('SELECT id FROM snapshots ORDER BY id')]
+        for oldest, following in zip(ids, ids[1:]):
+            if total <= budget:
+                break
+            kept_tabs = {tab_id for tab_id, _ in json.loads(self.writer.execute(
+                'SELECT tabs FROM snapshots WHERE id = ?', (following,)).fetchone()[0])}
+            newer = set(self.writer.execute(
+                'SELECT tab_id, pane FROM snapshot_panes WHERE snapshot_id = ?', (following,)))
+            for tab_id, pane, size in self.writer.execute(
+                    'SELECT tab_id, pane, length(data) FROM snapshot_panes WHERE snapshot_id = ?', (oldest,)).fetchall():
+                if (tab_id, pane) in newer or tab_id not in kept_tabs:
+                    self.writer.execute(
+                        'DELETE FROM snapshot_panes WHERE snapshot_id = ? AND tab_id = ? AND pane = ?',
+                        (oldest, tab_id, pane))
+                    total -= size
+                else:
+                    self.writer.execute(
+                        'UPDATE snapshot_panes SET snapshot_id = ? WHERE snapshot_id = ? AND tab_id = ? AND pane = ?',
+                        (following, oldest, tab_id, pane))
+            self.writer.execute('DELETE FROM snapshots WHERE id = ?', (oldest,))
+
+    def list_snapshots(self):
+        """由新到舊回傳 (快照編號, 建立時間, 說明, [(分頁編號, 標題), ...], 有變動的文字框數)"""
+        return [(snapshot_id, created, label, json.loads(tabs), panes) for snapshot_id, created, label, tabs, panes
+                in self.reader.execute('SELECT id, created, label, tabs, panes FROM snapshots ORDER BY id DESC')]
+
+    def migrate_json(self, json_path):
+        """匯入舊版的 editor_data.json，完成後將其改名保留"""
+        with open(json_path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        tabs = []
+        panes = []
+        for tab in data.get('tabs', []):
+            tab_id = self.allocate_tab_id()
+            tabs.append((tab_id, tab.get('title', 'New Tab')))
+            for pane, key in enumerate(self.PANE_KEYS):
+                content = tab.get(key, '')
+                panes.append((tab_id, pane, content if isinstance(content, str) else ''))
+        self.write(tabs, panes, data.get('settings', {}))
+        os.replace(json_path, json_path + '.migrated')
+
+    @staticmethod
+    def read_panes(path, keys):
+        """以獨立連線讀取多個 (分頁編號, 文字框) 的內容，可在任何執行緒呼叫"""
+        connection = sqlite3.connect(path)
+        try:
+            contents = {}
+            for tab_id, pane in keys:
+                row = connection.execute(
+                    'SELECT content FROM panes WHERE tab_id = ? AND pane = ?', (tab_id, pane)).fetchone()
+                contents[(tab_id, pane)] = row[0] if row else ''
+            return contents
+        finally:
+            connection.close()
+
+    @staticmethod
+    def read_pane_heads(path, keys, length):
+        """以獨立連線讀取多個 (分頁編號, 文字框) 內容的前 length 個字元，可在任何執行緒呼叫"""
+        connection = sqlite3.connect(path)
+        try:
+            heads = {}
+            for tab_id, pane in keys:
+                row = connection.execute(
+                    'SELECT substr(content, 1, ?) FROM panes WHERE tab_id = ? AND pane = ?',
+                    (length, tab_id, pane)).fetchone()
+                heads[(tab_id, pane)] = row[0] if row else ''
+            return heads
+        finally:
+            connection.close()
+
+    @staticmethod
+    def read_snapshot_tab(path, snapshot_id, tab_id, worker=None):
+        """以獨立連線取得分頁在某個快照時的三個文字框內容，可在任何執行緒呼叫
+
+        從文字框最新的完整版本開始，依序套用較新快照到該快照之間的差異。
+        """
+        connection = sqlite3.connect(path)
+        try:
+            contents = []
+            for pane in range(3):
+                text = ''
+                for delta, data in connection.execute(
+                        'SELECT delta, data FROM snapshot_panes WHERE tab_id = ? AND pane = ? AND snapshot_id >= '
+                        '(SELECT MAX(snapshot_id) FROM snapshot_panes WHERE tab_id = ? AND pane = ? AND snapshot_id <= ?) '
+                        'ORDER BY snapshot_id DESC', (tab_id, pane, tab_id, pane, snapshot_id)):
+                    data = zlib.decompress(data).decode('utf-8')
+                    text = apply_text_delta(text, json.loads(data)) if delta else data
+                contents.append(text)
+            return contents
+        finally:
+            connection.close()
+
+    def close(self):
+        with self.lock:
+            self.writer.close()
+        self.reader.close()
+
+class SearchIndex(QObject):
+    """全局搜尋用的索引，以每個文字框的三字元點陣圖排除不可能含有搜尋內容的文字框
+
+    索引只能排除文字框，不記錄位置；其餘的文字框仍須逐一搜尋原文才能找到符合的位置。
+    修改時只把插入的文字連同前後各兩個字元的三字元加入點陣圖；刪除的內容不會移除，
+    累積的修改量超過文字框大小的一半或點陣圖過滿時，才於閒置時重建該文字框的點陣圖。
+    """
+    COMPACT_MIN_CHURN = 4096
+
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.editor = editor
+        self.filters = {}  # (分頁編號, 文字框) -> TrigramFilter
+        self.state = 'empty'  # 'empty'、'building' 或 'ready'
+        self.changed_during_build = set()
+        self.compact_queue = set()
+        self.compact_timer = QTimer(self)
+        self.compact_timer.setSingleShot(True)
+        self.compact_timer.setInterval(1000)
+        self.compact_timer.timeout.connect(self.compact)
+
+    def ensure_built(self):
+        """首次使用時在背景建立索引"""
+        if self.state != 'empty':
+            return
+        self.state = 'building'
+        items = []
+        for tab in self.editor.iter_tabs():
+            for pane in range(3):
+                if tab.pending_contents is not None:
+                    # 尚未載入的內容由背景執行緒從資料庫讀取
+                    content = tab.pending_contents[pane]
+                else:
+                    content = self.editor.get_pane_content(tab, pane)
+                items.append(((tab.tab_id, pane), content))
+        worker = Worker(build_trigram_filters, items, self.editor.store.path)
+        worker.signals.result.connect(self.on_built)
+        QThreadPool.globalInstance().start(worker)
+
+    def on_built(self, filters):
+        self.filters = filters
+        self.state = 'ready'
+        # 建立期間新增的分頁不在 filters 中，也需要補上
+        existing = {tab.tab_id for tab in self.editor.iter_tabs()}
+        self.compact_queue.update(key for key in self.changed_during_build if key[0] in existing)
+        self.changed_during_build.clear()
+        if self.compact_queue:
+            self.compact_timer.start()
+
+    def on_contents_change(self, tab, pane, document, position, removed, added):
+        key = (tab.tab_id, pane)
+        if self.state != 'ready':
+            if self.state == 'building':
+                self.changed_during_build.add(key)
+            return
+        index_filter = self.filters.get(key)
+        if index_filter is None:
+            index_filter = self.filters[key] = TrigramFilter()
+        # 只讀取插入的文字與前後各兩個字元，長行上的每次按鍵不必重新讀取整行
+        cursor = QTextCursor(document)
+        cursor.setPosition(max(0, position - 2))
+        cursor.setPosition(min(position + added + 2, document.characterCount() - 1), QTextCursor.KeepAnchor)
+        index_filter.add(text_trigrams(cursor.selectedText().replace('\u2029', '\n')))
+        index_filter.churn += removed + added
+        if (index_filter.churn > max(self.COMPACT_MIN_CHURN, document.characterCount() // 2)
+                or index_filter.overloaded()):
+            self.compact_queue.add(key)
+            self.compact_timer.start()
+
+    def pane_replaced(self, tab, pane):
+        """文字框內容被整個取代（例如尚未建立的分頁執行全部取代）"""
+        key = (tab.tab_id, pane)
+        if self.state == 'building':
+            self.changed_during_build.add(key)
+        elif self.state == 'ready':
+            self.compact_queue.add(key)
+            self.compact_timer.start()
+
+    def remove_tab(self, tab):
+        for pane in range(3):
+            key = (tab.tab_id, pane)
+            self.filters.pop(key, None)
+            self.compact_queue.discard(key)
+            self.changed_during_build.discard(key)
+
+    def compact(self):
+        tabs = {tab.tab_id: tab for tab in self.editor.iter_tabs()}
+        for tab_id, pane in self.compact_queue:
+            tab = tabs.get(tab_id)
+            if tab is not None:
+                content = self.editor.get_pane_content(tab, pane)
+                self.filters[(tab_id, pane)] = TrigramFilter(text_trigrams(content))
+        self.compact_queue.clear()
+
+    def candidates(self, search_text):
+        """回傳可能含有搜尋內容的 (分頁編號, 文字框) 集合；無法判斷時回傳 None"""
+        if self.state != 'ready' or len(search_text) < 3:
+            return None
+        if self.compact_queue:
+            self.compact_timer.stop()
+            self.compact()
+        hashes = [hash(trigram) for trigram in text_trigrams(search_text)]
+        return {key for key, index_filter in self.filters.items() if index_filter.may_contain(hashes)}
+
+class QuickOpenIndex(QObject):
+    """快速切換分頁用的索引：每個分頁的標題與各文字框開頭幾行（另存小寫版本供比對）
+
+    標題隨 update_tab_title 更新；文字框被修改時只記下該文字框，開啟切換視窗時才重新讀取開頭。
+    首次使用時，尚未載入的文字框開頭由背景執行緒從資料庫讀取。
+    """
+    HEAD_LINES = 3
+    HEAD_LINE_LENGTH = 200
+    TITLE_BONUS = 50
+    built = pyqtSignal()
+
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.editor = editor
+        self.state = 'empty'  # 'empty'、'building' 或 'ready'
+        self.order = []  # 依分頁順序排列的分頁編號
+        self.titles = {}  # 分頁編號 -> (標題, 小寫標題)
+        self.heads = {}  # 分頁編號 -> [各文字框開頭各行]
+        self.lines = {}  # 分頁編號 -> [(非空白的行, 小寫)]
+        self.haystacks = {}  # 分頁編號 -> 小寫的開頭文字
+        self.stale = set()  # 開頭需要重新讀取的 (分頁編號, 文字框)
+
+    def set_title(self, tab, title):
+        if self.state != 'empty':
+            self.titles[tab.tab_id] = (title, title.lower())
+
+    def pane_changed(self, tab, pane):
+        if self.state != 'empty':
+            self.stale.add((tab.tab_id, pane))
+
+    def read_head(self, tab, pane):
+        if tab.pending_contents is None:
+            document = tab.pane_container.text_edits[pane].document()
+            return document_head_lines(document, self.HEAD_LINES, self.HEAD_LINE_LENGTH)
+        text = self.editor.get_pane_content(tab, pane)
+        return head_lines(text, self.HEAD_LINES, self.HEAD_LINE_LENGTH)
+
+    def set_head(self, tab_id, pane, lines):
+        heads = self.heads.setdefault(tab_id, [[], [], []])
+        heads[pane] = lines
+        self.lines[tab_id] = [(line, line.lower()) for pane_lines in heads for line in pane_lines if line.strip()]
+        self.haystacks[tab_id] = '\n'.join(lower for _, lower in self.lines[tab_id])
+
+    def refresh(self):
+        """開啟切換視窗時同步分頁的新增、關閉與順序，並重新讀取有修改的文字框開頭"""
+        tabs = {}
+        self.order = []
+        stored = []
+        for index, tab in enumerate(self.editor.iter_tabs()):
+            tabs[tab.tab_id] = tab
+            self.order.append(tab.tab_id)
+            if tab.tab_id in self.titles:
+                continue
+            title = self.editor.tabs.tabText(index)
+            self.titles[tab.tab_id] = (title, title.lower())
+            for pane in range(3):
+                if tab.pending_contents is not None and tab.pending_contents[pane] is None:
+                    stored.append((tab.tab_id, pane))
+                else:
+                    self.stale.add((tab.tab_id, pane))
+        for tab_id in set(self.titles) - set(tabs):
+            del self.titles[tab_id]
+            self.heads.pop(tab_id, None)
+            self.lines.pop(tab_id, None)
+            self.haystacks.pop(tab_id, None)
+        for tab_id, pane in self.stale:
+            if tab_id in tabs:
+                self.set_head(tab_id, pane, self.read_head(tabs[tab_id], pane))
+        self.stale.clear()
+        if self.state == 'empty':
+            self.state = 'building'
+            worker = Worker(load_head_lines, self.editor.store.path, stored, self.HEAD_LINES, self.HEAD_LINE_LENGTH)
+            worker.signals.result.connect(self.on_built)
+            QThreadPool.globalInstance().start(worker)
+        elif stored:
+            # 索引建立後才加入的延遲載入分頁（例如另一個編輯器轉交的工作階段）
+            for key, lines in load_head_lines(self.editor.store.path, stored,
+                                              self.HEAD_LINES, self.HEAD_LINE_LENGTH).items():
+                self.set_head(*key, lines)
+
+    def on_built(self, heads):
+        for (tab_id, pane), lines in heads.items():
+            if tab_id in self.titles and (tab_id, pane) not in self.stale:
+                self.set_head(tab_id, pane, lines)
+        self.state = 'ready'
+        self.built.emit()
+
+    def search(self, query, tab_ids=None):
+        """依分數由高到低回傳符合的分頁編號；tab_ids 為要比對的分頁，預設為全部"""
+        tab_ids = self.order if tab_ids is None else tab_ids
+        if not query:
+            return list(tab_ids)
+        results = []
+        for position, tab_id in enumerate(tab_ids):
+            score = fuzzy_score(query, self.titles[tab_id][1])
+            if score is not None:
+                score += self.TITLE_BONUS
+            else:
+                score = fuzzy_score(query, self.haystacks.get(tab_id, ''))
+                if score is None:
+                    continue
+            results.append((-score, position, tab_id))
+        results.sort()
+        return [tab_id for _, _, tab_id in results]
+
+    def display_line(self, tab_id, query):
+        """分頁開頭各行中最符合 query 的一行，都不符合時為第一行"""
+        lines = self.lines.get(tab_id, [])
+        best, best_score = (lines[0][0] if lines else ''), None
+        for line, lower in lines if query else ():
+            score = fuzzy_score(query, lower)
+            if score is not None and (best_score is None or score > best_score):
+                best, best_score = line, score
+        return best
+
+def contains_text(text, search_text, case_sensitive):
+    """在純文字中判斷是否包含搜尋內容，規則與 QTextDocument.find 一致"""
+    if case_sensitive:
+        return search_text in text
+    return search_text.lower() in text.lower()
+
+def plan_replacement(text, search_text, replace_text, case_sensitive, regex=None):
+    """一次掃描計算全部取代的結果
+
+    只回傳第一個到最後一個匹配之間的區段 (開始, 結束, 新內容, 取代數量)，
+    套用時只需一次編輯；沒有匹配時回傳 None。提供 regex 時以其取代 search_text 比對。
+    """
+    if case_sensitive and regex is None:
+        start = text.find(search_text)
+        if start == -1:
+            return None
+        end = text.rfind(search_text) + len(search_text)
+        return start, end, text[start:end].replace(search_text, replace_text), text.count(search_text, start, end)
+    matches = find_occurrences(text, search_text, case_sensitive, regex)
+    if not matches:
+        return None
+    start = matches[0][0]
+    end = matches[-1][1]
+    parts = []
+    previous = start
+    for match_start, match_end in matches:
+        parts.append(text[previous:match_start])
+        parts.append(replace_text)
+        previous = match_end
+    return start, end, ''.join(parts), len(matches)
+
+def plan_replacements(items, search_text, replace_text, case_sensitive, store_path=None, regex=None,
+                      worker=None):
+    """為多個 (鍵, 內容) 計算全部取代，內容為 None 時從資料庫讀取
+
+    回傳 {鍵: (原內容, 取代計畫)}，只包含有匹配的項目；取消時回傳 None。
+    """
+    plans = {}
+    for done, (key, text) in enumerate(items, 1):
+        if worker is not None:
+            if worker.cancelled:
+                return None
+            worker.signals.progress.emit(done, len(items))
+        if text is None:
+            text = SessionStore.read_panes(store_path, [key])[key]
+        plan = plan_replacement(text, search_text, replace_text, case_sensitive, regex)
+        if plan is not None:
+            plans[key] = (text, plan)
+    return plans
+
+def document_text(document):
+    """取得文件的純文字，段落分隔符號（U+2029）換成換行
+
+    長度與 toRawText 相同，位置仍與文件一致；搜尋與取代都以此比對，
+    規則運算式的 . 不會跨行，^ 與 $ 在每一行的頭尾都能匹配，與尚未載入的純文字內容一致。
+    """
+    return document.toRawText().replace('\u2029', '\n')
+
+def apply_replacement(document, text, plan):
+    """以單一編輯（單一復原步驟）套用 plan_replacement 的結果，text 須為 document_text(document)"""
+    start, end, segment, _ = plan
+    positions = PositionMap(text)
+    cursor = QTextCursor(document)
+    cursor.beginEditBlock()
+    cursor.setPosition(positions.to_document(start))
+    cursor.setPosition(positions.to_document(end), QTextCursor.KeepAnchor)
+    cursor.insertText(segment)
+    cursor.endEditBlock()
+
+@functools.lru_cache(maxsize=64)
+def compile_search_pattern(search_text, case_sensitive, use_regex, whole_word):
+    """將搜尋設定編譯為 QRegularExpression 並快取；規則運算式無效時拋出 ValueError
+
+    PCRE2 有比對次數上限，災難性的規則運算式會很快以「不匹配」結束，不會卡住程式。
+    """
+    pattern = search_text if use_regex else QRegularExpression.escape(search_text)
+    if whole_word:
+        pattern = rf'\b(?:{pattern})\b'
+    options = QRegularExpression.UseUnicodePropertiesOption | QRegularExpression.MultilineOption
+    if not case_sensitive:
+        options |= QRegularExpression.CaseInsensitiveOption
+    regex = QRegularExpression(pattern, options)
+    if not regex.isValid():
+        raise ValueError(regex.errorString())
+    regex.optimize()
+    return regex
+
+class PositionMap:
+    """在 Python 字串索引與 QTextDocument（UTF-16）位置之間轉換，BMP 以外的字元佔兩個位置"""
+    def __init__(self, text):
+        self.astral = [match.start() for match in ASTRAL_RE.finditer(text)]
+        # 第 k 個 BMP 以外字元之後的 UTF-16 位置
+        self.ends = [index + k + 2 for k, index in enumerate(self.astral)]
+
+    def to_document(self, index):
+        return index + bisect_left(self.astral, index)
+
+    def to_python(self, position):
+        return position - bisect_right(self.ends, position)
+
+def find_occurrences(text, search_text, case_sensitive, regex=None):
+    """回傳所有不重疊的匹配範圍 (開始, 結束)，以 Python 字串索引表示；提供 regex 時以其比對"""
+    if regex is not None:
+        positions = PositionMap(text)
+        matches = []
+        iterator = regex.globalMatch(text)
+        while iterator.hasNext():
+            match = iterator.next()
+            if match.capturedLength():
+                matches.append((positions.to_python(match.capturedStart()),
+                                positions.to_python(match.capturedEnd())))
+        return matches
+    if case_sensitive:
+        matches = []
+        length = len(search_text)
+        index = text.find(search_text)
+        while index != -1:
+            matches.append((index, index + length))
+            index = text.find(search_text, index + length)
+        return matches
+    return [match.span() for match in re.finditer(re.escape(search_text), text, re.IGNORECASE)]
+
+def detect_encoding(sample):
+    """依檔案開頭的位元組判斷編碼，回傳 (ENCODINGS 中的名稱, 解碼用的 codec)"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'UTF-8', 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'UTF-16', 'utf-16'
+    if sample:
+        # 沒有 BOM 的 UTF-16：ASCII 字元的另一半位元組為 0
+        even_zeros = sample[0::2].count(0)
+        odd_zeros = sample[1::2].count(0)
+        if odd_zeros > len(sample) // 8 and even_zeros < odd_zeros // 4:
+            return 'UTF-16', 'utf-16-le'
+        if even_zeros > len(sample) // 8 and odd_zeros < even_zeros // 4:
+            return 'UTF-16', 'utf-16-be'
+
+    def decodes(codec):
+        try:
+            return codecs.getincrementaldecoder(codec)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            return None
+
+    if decodes('utf-8') is not None:
+        return 'UTF-8', 'utf-8'
+    gbk = decodes('gbk')
+    shift_jis = decodes('shift_jis')
+    if gbk is not None and shift_jis is not None:
+        # 兩者都能解碼時，日文通常含有全形假名，GBK 誤解為 Shift-JIS 則多半變成半形片假名
+        def kana_score(text):
+            return (sum(text.count(chr(c)) for c in range(0x3041, 0x30ff))
+                    - sum(text.count(chr(c)) for c in range(0xff61, 0xffa0)))
+        if kana_score(shift_jis) > kana_score(gbk):
+            return 'Shift-JIS', 'shift_jis'
+        return 'GBK', 'gbk'
+    if gbk is not None:
+        return 'GBK', 'gbk'
+    if shift_jis is not None:
+        return 'Shift-JIS', 'shift_jis'
+    return 'ISO-8859-1', 'latin-1'
+
+# 解碼時累計目前執行緒中無法解碼的位元組數
+UNDECODABLE = threading.local()
+
+def count_undecodable(error):
+    """與 'replace' 相同的解碼錯誤處理，另外累計無法解碼的位元組數"""
+    UNDECODABLE.count += error.end - error.start
+    return '\ufffd', error.end
+
+codecs.register_error('count-replace', count_undecodable)
+
+def read_text_file(path, credits=None, worker=None):
+    """分段讀取並解碼文字檔，每段以 partial 訊號送回；回傳 (偵測到的編碼名稱, 無法解碼的位元組數)
+
+    編碼只依開頭的取樣判斷，之後無法解碼的位元組以 U+FFFD 取代並計入位元組數，由呼叫端提醒使用者。
+    credits 為 threading.Semaphore，每送出一段需取得一次，由接收端處理完畢後釋放，
+    以免讀取速度快於插入速度時大量文字堆積在事件佇列中。
+    """
+    size = os.path.getsize(path)
+    UNDECODABLE.count = 0
+    with open(path, 'rb') as file:
+        data = file.read(ENCODING_SAMPLE_SIZE)
+        encoding, codec = detect_encoding(data)
+        decoder = codecs.getincrementaldecoder(codec)(errors='count-replace')
+        done = len(data)
+        carry = ''
+        while True:
+            final = not data
+            text = carry + decoder.decode(data, final=final)
+            carry = ''
+            if text.endswith('\r') and not final:
+                # \r\n 可能被切在兩段之間
+                carry = '\r'
+                text = text[:-1]
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+            if text:
+                if credits is not None:
+                    while not credits.acquire(timeout=0.1):
+                        if worker.cancelled:
+                            return encoding, UNDECODABLE.count
+                worker.signals.partial.emit(text)
+            worker.signals.progress.emit(done >> 10, size >> 10)
+            if final or worker.cancelled:
+                return encoding, UNDECODABLE.count
+            data = file.read(FILE_CHUNK_SIZE)
+            done += len(data)
+
+def load_text_file(path, errors='replace'):
+    """一次讀取並解碼整個文字檔，換行統一為 \\n
+
+    編碼先依開頭的取樣判斷（與 read_text_file 相同），無法解碼整個檔案時改以完整內容重新判斷；
+    仍無法解碼時依 errors 處理，'strict' 時拋出 UnicodeDecodeError。
+    回傳 (內容, 編碼名稱, codec, 是否有 BOM, 換行)，後三者可交給 write_text_file 以原本的格式寫回：
+    codec 不含 BOM 與位元組順序的判斷，換行取檔案中第一個換行的形式（沒有換行時為 os.linesep）。
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    encoding, codec = detect_encoding(data[:ENCODING_SAMPLE_SIZE])
+    try:
+        text = data.decode(codec)
+    except UnicodeDecodeError:
+        encoding, codec = detect_encoding(data)
+        text = data.decode(codec, errors)
+    bom = codec in ('utf-8-sig', 'utf-16')
+    if codec == 'utf-8-sig':
+        codec = 'utf-8'
+    elif codec == 'utf-16':
+        codec = 'utf-16-le' if data.startswith(codecs.BOM_UTF16_LE) else 'utf-16-be'
+    del data
+    match = re.search('\r\n|\r|\n', text)
+    newline = match.group() if match else os.linesep
+    return text.replace('\r\n', '\n').replace('\r', '\n'), encoding, codec, bom, newline
+
+def unencodable_characters(text, encoding):
+    """回傳 text 中無法以 encoding 編碼的字元範圍 (開始, 結束)"""
+    ranges = []
+    position = 0
+    while position < len(text):
+        try:
+            text[position:].encode(encoding)
+            break
+        except UnicodeEncodeError as e:
+            ranges.append((position + e.start, position + e.end))
+            position += e.end
+    return ranges
+
+def write_text_file(path, text, encoding, errors='strict', worker=None, newline=os.linesep, bom=False):
+    """分段編碼並寫入同目錄的暫存檔，完整寫入後才以 os.replace 取代目標檔案
+
+    換行轉為 newline，bom 為 True 時在開頭寫入 BOM。取代既有檔案時保留其權限，新檔案依 umask 設定權限。
+    遇到無法編碼的字元時不寫入目標檔案，回傳 (字元位置, 行, 欄, 字元) 清單（最多 MAX_ENCODING_ERRORS 筆）；成功時回傳 None。
+    """
+    encoder = codecs.getincrementalencoder(encoding)(errors)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    failures = []
+    # 錯誤位置遞增，行號只需從上一處繼續往後數
+    scanned, line, line_start = 0, 1, 0
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            if bom:
+                file.write(encoder.encode('\ufeff'))
+            for start in range(0, max(len(text), 1), FILE_CHUNK_SIZE):
+                if worker is not None and worker.cancelled:
+                    break
+                chunk = text[start:start + FILE_CHUNK_SIZE]
+                if not failures:
+                    try:
+                        file.write(encoder.encode(chunk.replace('\n', newline)))
+                    except UnicodeEncodeError:
+                        pass
+                    else:
+                        chunk = None
+                if chunk is not None and len(failures) < MAX_ENCODING_ERRORS:
+                    for begin, end in unencodable_characters(chunk, encoding):
+                        offset = start + begin
+                        line += text.count('\n', scanned, offset)
+                        line_start = max(text.rfind('\n', scanned, offset) + 1, line_start)
+                        scanned = offset
+                        failures.append((offset, line, offset - line_start + 1, text[offset:start + end]))
+                        if len(failures) >= MAX_ENCODING_ERRORS:
+                            break
+                if worker is not None:
+                    worker.signals.progress.emit(min(start + FILE_CHUNK_SIZE, len(text)) >> 10, len(text) >> 10)
+            else:
+                if not failures:
+                    file.write(encoder.encode('', final=True))
+                    file.flush()
+                    os.fsync(file.fileno())
+        if failures or (worker is not None and worker.cancelled):
+            os.remove(temp_path)
+            return failures or None
+        # mkstemp 建立的暫存檔權限為 0600
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = NEW_FILE_MODE
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return None
+
+class ExportNames:
+    """產生不重複（不分大小寫）的匯出檔名，同名時加上序號"""
+    def __init__(self):
+        self.used = set()
+
+    def unique(self, name):
+        base, extension = os.path.splitext(name)
+        candidate, number = name, 1
+        while candidate.lower() in self.used:
+            number += 1
+            candidate = f"{base}_{number}{extension}"
+        self.used.add(candidate.lower())
+        return candidate
+
+    def tab_names(self, position, title):
+        """依分頁順序與標題回傳三個文字框的檔名"""
+        safe_title = re.sub(r'[\\/:*?"<>|\s]+', '_', title).strip('_') or 'tab'
+        return [self.unique(f"{position:03d}_{safe_title}_{pane_name}.txt") for pane_name in PANE_NAMES]
+
+def export_panes(items, target, encoding, errors='strict', store_path=None, worker=None):
+    """以執行緒池將多個文字框分別寫入資料夾，target 以 .zip 結尾時改為寫入單一 ZIP 壓縮檔
+
+    items 為 (檔名, (分頁編號, 文字框), 內容)，內容為 None 時從資料庫讀取；空白的文字框不匯出。
+    ZIP 壓縮檔先寫入同目錄的暫存檔，完成後才取代目標檔案；取消時不產生壓縮檔。
+    回傳 {'exported': [檔名, ...], 'skipped': 空白的文字框數, 'failures': [(檔名, 無法編碼的位置), ...]}。
+    """
+    archive_path = target if target.lower().endswith('.zip') else None
+    if archive_path is None:
+        os.makedirs(target, exist_ok=True)
+        directory = target
+    else:
+        directory = tempfile.mkdtemp(prefix='.export-', dir=os.path.dirname(os.path.abspath(archive_path)))
+
+    def export(item):
+        name, key, text = item
+        if text is None:
+            text = SessionStore.read_panes(store_path, [key])[key]
+        if not text:
+            return name, False, None
+        return name, True, write_text_file(os.path.join(directory, name), text, encoding, errors)
+
+    result = {'exported': [], 'skipped': 0, 'failures': []}
+    archive = temp_path = None
+    try:
+        if archive_path is not None:
+            fd, temp_path = tempfile.mkstemp(
+                prefix='.' + os.path.basename(archive_path) + '.', suffix='.tmp', dir=directory)
+            os.close(fd)
+            archive = zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED)
+        remaining = iter(items)
+        running = set()
+        done = 0
+        with ThreadPoolExecutor(EXPORT_THREADS) as executor:
+            while True:
+                # 同時排入的檔案數有限，內容讀出後不會全部留在記憶體中
+                while len(running) < EXPORT_THREADS * 2 and not (worker is not None and worker.cancelled):
+                    item = next(remaining, None)
+                    if item is None:
+                        break
+                    running.add(executor.submit(export, item))
+                if not running:
+                    break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, written, failures = future.result()
+                    done += 1
+                    if not written:
+                        result['skipped'] += 1
+                    elif failures:
+                        result['failures'].append((name, failures))
+                    else:
+                        if archive is not None:
+                            # 壓縮在此執行緒進行，其他檔案同時在執行緒池中編碼
+                            path = os.path.join(directory, name)
+                            archive.write(path, name)
+                            os.remove(path)
+                        result['exported'].append(name)
+                    if worker is not None:
+                        worker.signals.progress.emit(done, len(items))
+        if archive is not None:
+            archive.close()
+            archive = None
+            if not (worker is not None and worker.cancelled):
+                os.replace(temp_path, archive_path)
+    finally:
+        if archive is not None:
+            archive.close()
+        if archive_path is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+    return result
+
+def search_panes(items, regex, store_path=None, first_only=False, limit=None, worker=None):
+    """依序在 (鍵, 內容, 起始位置) 中搜尋，內容為 None 時從資料庫讀取
+
+    每個文字框的匹配以 partial 訊號分批送回 (鍵, 開始, 結束, 行號, 該行內容)，位置為 QTextDocument 位置；
+    每個匹配之間都會檢查是否已取消。回傳 (匹配數, 是否因 limit 而提前結束)。
+    """
+    count = 0
+    for done, (key, text, offset) in enumerate(items, 1):
+        if worker.cancelled:
+            return count, False
+        if text is None:
+            text = SessionStore.read_panes(store_path, [key])[key]
+        positions = PositionMap(text)
+        matches = []
+        line = 1
+        line_start = 0
+        previous = 0
+        iterator = regex.globalMatch(text, offset)
+        while iterator.hasNext():
+            if worker.cancelled:
+                return count, False
+            match = iterator.next()
+            if not match.capturedLength():
+                continue
+            start = positions.to_python(match.capturedStart())
+            newlines = text.count('\n', previous, start)
+            if newlines:
+                line += newlines
+                line_start = text.rfind('\n', 0, start) + 1
+            previous = start
+            line_end = text.find('\n', start)
+            line_text = text[line_start:line_end if line_end != -1 else len(text)]
+            matches.append((key, match.capturedStart(), match.capturedEnd(), line, line_text))
+            if first_only or (limit is not None and count + len(matches) >= limit):
+                break
+        if matches:
+            count += len(matches)
+            worker.signals.partial.emit(matches)
+            if first_only or (limit is not None and count >= limit):
+                return count, True
+        worker.signals.progress.emit(done, len(items))
+    return count, False
+
+def head_lines(text, count, length):
+    """取得文字開頭 count 行，每行最多 length 個字元"""
+    lines = []
+    start = 0
+    while len(lines) < count and start <= len(text):
+        end = text.find('\n', start)
+        if end == -1:
+            end = len(text)
+        lines.append(text[start:min(end, start + length)])
+        start = end + 1
+    return lines
+
+def document_head_lines(document, count, length):
+    """取得文件開頭 count 個段落，每段最多 length 個字元；很長的段落不會整段複製"""
+    lines = []
+    block = document.firstBlock()
+    while block.isValid() and len(lines) < count:
+        if block.length() - 1 <= length:
+            lines.append(block.text())
+        else:
+            cursor = QTextCursor(block)
+            cursor.setPosition(block.position() + length, QTextCursor.KeepAnchor)
+            lines.append(cursor.selectedText())
+        block = block.next()
+    return lines
+
+def load_head_lines(store_path, keys, count, length, worker=None):
+    """從資料庫讀取多個文字框的開頭幾行，回傳 {(分頁編號, 文字框): 開頭各行}"""
+    heads = SessionStore.read_pane_heads(store_path, keys, count * (length + 1))
+    return {key: head_lines(text, count, length) for key, text in heads.items()}
+
+def longest_line(text, tail=0):
+    """回傳 (最長一行的長度, 最後一行的長度)；tail 為前一段結尾尚未換行的長度，供分段讀取時延續"""
+    lines = text.split('\n')
+    first = tail + len(lines[0])
+    last = first if len(lines) == 1 else len(lines[-1])
+    return max(first, max(map(len, lines[1:]), default=0)), last
+
+def fuzzy_score(query, text):
+    """query 的字元依序出現在 text 中時回傳分數（越大越符合），否則回傳 None；兩者皆須為小寫
+
+    連續出現的字串分數最高，其次是字元相連或位於詞首的部分匹配。
+    """
+    index = text.find(query)
+    if index != -1:
+        return 100 + 4 * len(query) - min(index, 100) * 0.1
+    score = 0
+    position = 0
+    previous = -2
+    for character in query:
+        position = text.find(character, position)
+        if position == -1:
+            return None
+        if position == previous + 1:
+            score += 3
+        elif position == 0 or not text[position - 1].isalnum():
+            score += 2
+        previous = position
+        position += 1
+    return score
+
+def text_trigrams(text):
+    """取得文字（轉為小寫後）的所有三字元片段"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramFilter:
+    """單一文字框的三字元點陣圖，只會多報不會漏報，查詢結果須再以原文確認"""
+    __slots__ = ('bits', 'mask', 'inserted', 'churn')
+
+    def __init__(self, trigrams=()):
+        size = 1 << 13
+        while size < len(trigrams) * 8:
+            size <<= 1
+        self.bits = bytearray(size >> 3)
+        self.mask = size - 1
+        self.inserted = 0
+        self.churn = 0
+        self.add(trigrams)
+
+    def add(self, trigrams):
+        bits = self.bits
+        mask = self.mask
+        for trigram in trigrams:
+            h = hash(trigram) & mask
+            bits[h >> 3] |= 1 << (h & 7)
+        self.inserted += len(trigrams)
+
+    def may_contain(self, hashes):
+        bits = self.bits
+        mask = self.mask
+        for h in hashes:
+            h &= mask
+            if not bits[h >> 3] >> (h & 7) & 1:
+                return False
+        return True
+
+    def overloaded(self):
+        return self.inserted * 8 > self.mask + 1
+
+def build_trigram_filters(items, store_path=None, worker=None):
+    """為 (鍵, 內容) 建立三字元點陣圖；內容為 None 時從資料庫讀取"""
+    missing = [key for key, text in items if text is None]
+    stored = SessionStore.read_panes(store_path, missing) if missing else {}
+    filters = {}
+    for key, text in items:
+        if worker is not None and worker.cancelled:
+            return None
+        filters[key] = TrigramFilter(text_trigrams(stored.get(key, '') if text is None else text))
+    return filters
+
+def unique_line_anchors(a, b):
+    """兩側都只出現一次的相同行，取兩側行號同時遞增的最長序列作為對齊點"""
+    count_a = Counter(a)
+    count_b = Counter(b)
+    index_b = {line: j for j, line in enumerate(b) if count_b[line] == 1}
+    pairs = [(i, index_b[line]) for i, line in enumerate(a)
+             if count_a[line] == 1 and line in index_b]
+    # 最長遞增子序列（patience sorting）
+    tails = []
+    tail_indices = []
+    previous = [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        position = bisect_left(tails, j)
+        if position == len(tails):
+            tails.append(j)
+            tail_indices.append(index)
+        else:
+            tails[position] = j
+            tail_indices[position] = index
+        previous[index] = tail_indices[position - 1] if position else -1
+    anchors = []
+    index = tail_indices[-1] if tail_indices else -1
+    while index != -1:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+def diff_line_hunks(a, b):
+    """逐行比較，回傳相異區塊 [(a0, a1, b0, b1), ...]
+
+    先略過相同的開頭與結尾；範圍仍大時以兩側唯一的行切成小段，只在各段內以 SequenceMatcher 比較。
+    """
+    start = 0
+    limit = min(len(a), len(b))
+    while start < limit and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    if start == end_a or start == end_b:
+        return [] if end_a == end_b else [(start, end_a, start, end_b)]
+    a, b = a[start:end_a], b[start:end_b]
+    anchors = unique_line_anchors(a, b) if len(a) + len(b) > DIRECT_DIFF_LINES else []
+    if not anchors:
+        matcher = difflib.SequenceMatcher(None, a, b)
+        return [(start + i0, start + i1, start + j0, start + j1)
+                for tag, i0, i1, j0, j1 in matcher.get_opcodes() if tag != 'equal']
+    hunks = []
+    previous_i = previous_j = 0
+    for i, j in anchors + [(len(a), len(b))]:
+        if i > previous_i or j > previous_j:
+            offset_a, offset_b = start + previous_i, start + previous_j
+            hunks.extend((offset_a + a0, offset_a + a1, offset_b + b0, offset_b + b1)
+                         for a0, a1, b0, b1 in diff_line_hunks(a[previous_i:i], b[previous_j:j]))
+        previous_i, previous_j = i + 1, j + 1
+    return hunks
+
+def text_delta(text, target):
+    """回傳將 text 改為 target 的逐行差異 [[開始行, 結束行, [取代的行, ...]], ...]，行號以 text 計算"""
+    lines = text.split('\n')
+    target_lines = target.split('\n')
+    return [[a0, a1, target_lines[b0:b1]] for a0, a1, b0, b1 in diff_line_hunks(lines, target_lines)]
+
+def apply_text_delta(text, delta):
+    lines = text.split('\n')
+    result = []
+    previous = 0
+    for start, end, replacement in delta:
+        result.extend(lines[previous:start])
+        result.extend(replacement)
+        previous = end
+    result.extend(lines[previous:])
+    return '\n'.join(result)
+
+def refine_hunk(a_lines, b_lines):
+    """逐對比較相異區塊中的行，回傳兩側字元層級的差異 [(行偏移, 開始, 結束), ...]"""
+    a_ranges, b_ranges = [], []
+    for offset, (x, y) in enumerate(zip(a_lines[:MAX_REFINED_LINES], b_lines[:MAX_REFINED_LINES])):
+        if len(x) + len(y) > MAX_REFINED_LINE_LENGTH:
+            continue
+        matcher = difflib.SequenceMatcher(None, x, y, autojunk=False)
+        for tag, i0, i1, j0, j1 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            if i1 > i0:
+                a_ranges.append((offset, i0, i1))
+            if j1 > j0:
+                b_ranges.append((offset, j0, j1))
+    return a_ranges, b_ranges
+
+def rediff_window(hunks, a, b, dirty_a=None, dirty_b=None):
+    """只重新比較受修改影響的範圍
+
+    hunks 為修改前的區塊 (a0, a1, b0, b1, a 側字元差異, b 側字元差異)，None 表示全部重新比較；
+    dirty_a、dirty_b 為 (lo, hi, delta)：以目前行號表示被修改的範圍 [lo, hi) 與行數增減，None 表示該側未修改。
+    修改範圍前後各找一個兩側對齊的位置，只比較其間的內容，其餘區塊沿用並依行數增減平移。
+    """
+    if hunks is None:
+        start_index, end_index = 0, 0
+        sa = sb = 0
+        ea, eb = len(a), len(b)
+        delta_a = delta_b = 0
+        hunks = []
+    else:
+        lo_a, hi_a, delta_a = dirty_a if dirty_a is not None else (float('inf'), float('-inf'), 0)
+        lo_b, hi_b, delta_b = dirty_b if dirty_b is not None else (float('inf'), float('-inf'), 0)
+        # 修改前的行號
+        hi_a -= delta_a
+        hi_b -= delta_b
+        # 相同的段落：第 k 段位於第 k 個區塊之前，(開始, 結束, a 與 b 行號差)
+        runs = []
+        previous_a = previous_b = 0
+        for a0, a1, b0, b1, _, _ in hunks:
+            runs.append((previous_a, a0, previous_a - previous_b))
+            previous_a, previous_b = a1, b1
+        runs.append((previous_a, len(a) - delta_a, previous_a - previous_b))
+
+        start_index, sa, sb = 0, 0, 0
+        for index in range(len(runs) - 1, -1, -1):
+            run_start, run_end, offset = runs[index]
+            candidate = min(run_end, lo_a, lo_b + offset)
+            if candidate >= run_start:
+                start_index, sa, sb = index, candidate, candidate - offset
+                break
+        end_index, ea, eb = len(hunks), len(a) - delta_a, len(b) - delta_b
+        for index in range(start_index, len(runs)):
+            run_start, run_end, offset = runs[index]
+            candidate = max(run_start, hi_a, hi_b + offset)
+            if candidate <= run_end:
+                end_index, ea, eb = index, candidate, candidate - offset
+                break
+
+    window_a = a[sa:ea + delta_a]
+    window_b = b[sb:eb + delta_b]
+    changed = []
+    for a0, a1, b0, b1 in diff_line_hunks(window_a, window_b):
+        a_ranges, b_ranges = refine_hunk(window_a[a0:a1], window_b[b0:b1]) if a1 > a0 and b1 > b0 else ([], [])
+        changed.append((sa + a0, sa + a1, sb + b0, sb + b1, a_ranges, b_ranges))
+    after = [(a0 + delta_a, a1 + delta_a, b0 + delta_b, b1 + delta_b, a_ranges, b_ranges)
+             for a0, a1, b0, b1, a_ranges, b_ranges in hunks[end_index:]]
+    return hunks[:start_index] + changed + after
+
+def compare_panes(jobs, worker=None):
+    """背景比較多組文字框，jobs 為 {組別: (舊區塊, a 行, b 行, a 修改範圍, b 修改範圍)}"""
+    results = {}
+    for pair, (hunks, a, b, dirty_a, dirty_b) in jobs.items():
+        if worker is not None and worker.cancelled:
+            return None
+        results[pair] = rediff_window(hunks, a, b, dirty_a, dirty_b)
+    return results
+
+def set_selection_layer(text_edit, name, selections):
+    """各功能分別管理一層額外選取（例如比較差異），合併後套用到文字框"""
+    if selections:
+        text_edit.selection_layers[name] = selections
+    elif text_edit.selection_layers.pop(name, None) is None:
+        return
+    text_edit.setExtraSelections(
+        [selection for layer in text_edit.selection_layers.values() for selection in layer])
+
+def blocks_statistics(texts):
+    """計算各段落的 (字元數, 非空白字元數, 中日韓文字數, 詞數)；以 map 逐欄計算，減少大量段落時的直譯負擔"""
+    lengths = list(map(len, texts))
+    non_whitespace = lengths
+    for char in WHITESPACE_CHARS:
+        non_whitespace = list(map(int.__sub__, non_whitespace, map(methodcaller('count', char), texts)))
+    cjk = map(len, map(CJK_RE.findall, texts))
+    words = map(len, map(WORD_RE.findall, texts))
+    return list(zip(lengths, non_whitespace, cjk, words))
+
+def close_progress(progress):
+    """關閉進度對話框；close() 會發出 canceled，先斷開以免在工作完成後才被取消"""
+    try:
+        progress.canceled.disconnect()
+    except TypeError:
+        pass  # 已經斷開
+    progress.close()
+    progress.deleteLater()
+
+class WorkerSignals(QObject):
+    """背景工作回報用的訊號，跨執行緒時會自動排入主執行緒的事件佇列"""
+    progress = pyqtSignal(int, int)
+    partial = pyqtSignal(object)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+class Worker(QRunnable):
+    """在 QThreadPool 中執行函式；函式會收到關鍵字參數 worker，可用來回報進度或檢查是否已取消"""
+    # 執行中的工作，保留到主執行緒處理完 finished 訊號才釋放
+    running = set()
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancelled = False
+        # 不讓執行緒池在背景執行緒刪除物件，否則 signals 可能在尚有訊號待送達時被釋放
+        self.setAutoDelete(False)
+        Worker.running.add(self)
+        self.signals.finished.connect(self.release)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def release(self):
+        # 延到下一輪事件迴圈，避免在 signals 發送訊號的過程中將其刪除
+        QTimer.singleShot(0, functools.partial(Worker.running.discard, self))
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, worker=self, **self.kwargs)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+class TextStatistics(QObject):
+    """文件統計引擎，依 contentsChange 只重新計算被修改的段落，並合併通知"""
+    changed = pyqtSignal()
+
+    def __init__(self, document, delay=150):
+        super().__init__(document)
+        self.document = document
+        self.block_stats = []
+        self.totals = [0, 0, 0, 0]
+        self.held = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.changed)
+        self.rebuild()
+        document.contentsChange.connect(self.on_contents_change)
+
+    def rebuild(self):
+        # 原始文字中段落以 U+2029 分隔
+        self.block_stats = blocks_statistics(self.document.toRawText().split('\u2029'))
+        self.totals = [sum(column) for column in zip(*self.block_stats)]
+
+    def on_contents_change(self, position, removed, added):
+        if self.held:
+            return  # release 時重新統計
+        document = self.document
+        first = document.findBlock(position)
+        last = document.findBlock(position + added)
+        if not first.isValid():
+            first = document.lastBlock()
+        if not last.isValid():
+            last = document.lastBlock()
+
+        # 一次取出修改範圍內各段落的文字，段落之間以 U+2029 分隔
+        cursor = QTextCursor(document)
+        cursor.setPosition(first.position())
+        cursor.setPosition(last.position() + last.length() - 1, QTextCursor.KeepAnchor)
+        new_stats = blocks_statistics(cursor.selectedText().split('\u2029'))
+
+        # 修改範圍以外的段落不變，以段落數差推算被取代的舊段落
+        start = first.blockNumber()
+        end = start + len(new_stats) - (document.blockCount() - len(self.block_stats))
+        if end <= start or end > len(self.block_stats):
+            self.rebuild()
+        else:
+            totals = self.totals
+            for stats in self.block_stats[start:end]:
+                for i, value in enumerate(stats):
+                    totals[i] -= value
+            for stats in new_stats:
+                for i, value in enumerate(stats):
+                    totals[i] += value
+            self.block_stats[start:end] = new_stats
+
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def hold(self):
+        """暫停逐段統計與發出 changed，直到 release 時整份重新統計一次"""
+        self.held = True
+        self.timer.stop()
+
+    def release(self):
+        self.held = False
+        self.rebuild()
+        self.changed.emit()
+
+    @property
+    def characters(self):
+        """字元數（含換行）"""
+        return self.totals[0] + len(self.block_stats) - 1
+
+    @property
+    def non_whitespace(self):
+        return self.totals[1]
+
+    @property
+    def cjk(self):
+        return self.totals[2]
+
+    @property
+    def lines(self):
+        return len(self.block_stats)
+
+    @property
+    def words(self):
+        return self.totals[3]
+
+class UndoHistory(QObject):
+    """估計文字框復原記錄佔用的記憶體
+
+    QTextDocument 不提供復原記錄的大小，這裡依每次修改的字元數累計：新的修改與合併的輸入才計入，
+    復原與重做不計入，記錄被清除時歸零。新的修改捨棄重做記錄時不扣除，估計值只會偏高。
+    """
+    BYTES_PER_COMMAND = 64
+    grown = pyqtSignal()
+
+    def __init__(self, document):
+        super().__init__(document)
+        self.document = document
+        self.bytes = 0
+        self.last_edit = 0
+        self.undo_steps = 0
+        self.pending = 0
+        self.commands_added = 0
+        # 復原時 contentsChange 發出當下可重做步數尚未更新，事件處理完才判斷修改的種類
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.settle)
+        document.undoCommandAdded.connect(self.on_command_added)
+        document.contentsChange.connect(self.on_contents_change)
+
+    def on_command_added(self):
+        self.commands_added += 1
+
+    def on_contents_change(self, position, removed, added):
+        self.pending += (removed + added) * 2
+        self.timer.start()
+
+    def settle(self):
+        undo_steps = self.document.availableUndoSteps()
+        # availableRedoSteps 對合併的輸入不準確，是否可重做以 isRedoAvailable 判斷
+        redo_available = self.document.isRedoAvailable()
+        if not self.document.isUndoAvailable() and not redo_available:
+            self.bytes = 0  # 記錄已清除或停用
+        elif self.commands_added or (not redo_available and undo_steps == self.undo_steps):
+            # 復原與重做會改變可復原步數；步數不變且沒有可重做的步驟，表示輸入併入了上一步
+            self.bytes += self.pending + self.commands_added * self.BYTES_PER_COMMAND
+            self.last_edit = time.monotonic()
+            self.grown.emit()
+        self.pending = 0
+        self.commands_added = 0
+        self.undo_steps = undo_steps
+
+    def clear(self):
+        self.document.clearUndoRedoStacks()
+        self.timer.stop()
+        self.bytes = self.pending = self.commands_added = self.undo_steps = 0
+
+def positional_arity(fn):
+    """fn 可接受的位置參數數量；可接受任意數量或無法判斷時回傳 None"""
+    try:
+        parameters = inspect.signature(fn).parameters.values()
+    except (TypeError, ValueError):
+        return None
+    count = 0
+    for parameter in parameters:
+        if parameter.kind == parameter.VAR_POSITIONAL:
+            return None
+        if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD):
+            count += 1
+    return count
+
+class LatencyHistogram:
+    """以固定的對數間隔分組的延遲分佈（毫秒）"""
+    BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, milliseconds):
+        self.counts[bisect_left(self.BOUNDS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction):
+        """回傳該百分位數所在區間的上限（不超過最大值）"""
+        target = fraction * self.count
+        running = 0
+        for bound, count in zip(self.BOUNDS + (float('inf'),), self.counts):
+            running += count
+            if running >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        labels = [f'<={bound}' for bound in self.BOUNDS] + [f'>{self.BOUNDS[-1]}']
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max, 3),
+            'p50_ms': round(self.percentile(0.5), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+            'buckets': {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+class Instrumentation(QObject):
+    """選用的效能診斷：計時連接到訊號的函式、偵測事件迴圈停頓，並保存延遲分佈
+
+    停用時包裝過的函式只多一次判斷。啟用後主執行緒以計時器定時更新心跳，
+    監視執行緒發現心跳停止超過門檻時，記下當時正在執行的函式與呼叫堆疊。
+    """
+    HEARTBEAT_INTERVAL = 20
+    MAX_STALLS = 200
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.enabled = False
+        self.threshold = 100
+        self.histograms = {}
+        self.stalls = []
+        self.active = []  # 目前執行中的函式名稱，巢狀呼叫時依序排列
+        self.heartbeat = time.perf_counter()
+        self.captured_stall = None  # 監視執行緒在停頓期間擷取的資訊
+        self.lock = threading.Lock()
+        self.main_thread_id = threading.get_ident()
+        self.watchdog_stop = None
+        self.heartbeat_timer = QTimer(self)
+        self.heartbeat_timer.setInterval(self.HEARTBEAT_INTERVAL)
+        self.heartbeat_timer.timeout.connect(self.beat)
+
+    def set_enabled(self, enabled, threshold=100):
+        self.threshold = threshold
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        if enabled:
+            self.heartbeat = time.perf_counter()
+            self.heartbeat_timer.start()
+            self.watchdog_stop = threading.Event()
+            threading.Thread(target=self.watch, args=(self.watchdog_stop,),
+                             name='stall-watchdog', daemon=True).start()
+        else:
+            self.heartbeat_timer.stop()
+            self.watchdog_stop.set()
+
+    def record(self, name, milliseconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.add(milliseconds)
+
+    def slot(self, name, fn):
+        """包裝要連接到訊號的函式，只傳入 fn 可接受的參數數量"""
+        accepted = positional_arity(fn)
+
+        def timed_slot(*args):
+            if accepted is not None:
+                args = args[:accepted]
+            if not self.enabled:
+                return fn(*args)
+            self.active.append(name)
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.record(name, (time.perf_counter() - start) * 1000)
+                self.active.pop()
+        return timed_slot
+
+    @contextmanager
+    def measure(self, name):
+        if not self.enabled:
+            yield
+            return
+        self.active.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+            self.active.pop()
+
+    def beat(self):
+        now = time.perf_counter()
+        lag = (now - self.heartbeat) * 1000 - self.HEARTBEAT_INTERVAL
+        previous = self.heartbeat
+        self.heartbeat = now
+        self.record('event_loop.lag', max(lag, 0))
+        with self.lock:
+            captured, self.captured_stall = self.captured_stall, None
+        if lag < self.threshold:
+            return
+        stall = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': round(lag, 1),
+            'slots': [],
+            'stack': [],
+        }
+        if captured is not None and captured['heartbeat'] == previous:
+            stall['slots'] = captured['slots']
+            stall['stack'] = captured['stack']
+        self.record('event_loop.stall', lag)
+        self.stalls.append(stall)
+        del self.stalls[:-self.MAX_STALLS]
+
+    def watch(self, stop):
+        """在背景執行緒檢查心跳，停頓期間擷取一次主執行緒的呼叫堆疊"""
+        while not stop.wait(max(self.threshold / 4000, 0.005)):
+            heartbeat = self.heartbeat
+            if (time.perf_counter() - heartbeat) * 1000 < self.threshold + self.HEARTBEAT_INTERVAL:
+                continue
+            with self.lock:
+                if self.captured_stall is not None and self.captured_stall['heartbeat'] == heartbeat:
+                    continue
+            frame = sys._current_frames().get(self.main_thread_id)
+            stack = [line.rstrip() for line in traceback.format_stack(frame)[-12:]] if frame is not None else []
+            with self.lock:
+                self.captured_stall = {'heartbeat': heartbeat, 'slots': list(self.active), 'stack': stack}
+
+    def dump(self, path):
+        """將延遲分佈與停頓紀錄寫成 JSON 檔案"""
+        histograms = sorted(self.histograms.items(), key=lambda item: item[1].total, reverse=True)
+        data = {
+            'generated': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'enabled': self.enabled,
+            'stall_threshold_ms': self.threshold,
+            'histograms': {name: histogram.to_dict() for name, histogram in histograms},
+            'stalls': self.stalls,
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+
+class PaneComparison(QObject):
+    """比較模式：左框對中框、中框對右框逐行比較並標示差異，修改後只重新比較受影響的範圍"""
+    PAIRS = ((0, 1), (1, 2))
+    LINE_COLOR = '#fff3c4'
+    CHAR_COLOR = '#ffd36b'
+
+    def __init__(self, container, delay=300):
+        super().__init__(container)
+        self.text_edits = container.text_edits
+        self.documents = [text_edit.document() for text_edit in self.text_edits]
+        # 各文字框逐段落的文字，隨 contentsChange 局部更新
+        self.lines = [document.toRawText().split('\u2029') for document in self.documents]
+        self.dirty = [None, None, None]
+        self.hunks = [None, None]
+        self.worker = None
+        self.line_format = QTextCharFormat()
+        self.line_format.setBackground(QColor(self.LINE_COLOR))
+        self.line_format.setProperty(QTextFormat.FullWidthSelection, True)
+        self.char_format = QTextCharFormat()
+        self.char_format.setBackground(QColor(self.CHAR_COLOR))
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.start)
+        self.connections = []
+        for pane, document in enumerate(self.documents):
+            slot = functools.partial(self.on_contents_change, pane)
+            document.contentsChange.connect(slot)
+            self.connections.append((document.contentsChange, slot))
+        self.start()
+
+    def stop(self):
+        for signal, slot in self.connections:
+            signal.disconnect(slot)
+        self.connections = []
+        self.timer.stop()
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        for text_edit in self.text_edits:
+            set_selection_layer(text_edit, 'compare', [])
+        self.deleteLater()
+
+    def on_contents_change(self, pane, position, removed, added):
+        document = self.documents[pane]
+        lines = self.lines[pane]
+        first = document.findBlock(position)
+        last = document.findBlock(position + added)
+        if not first.isValid():
+            first = document.lastBlock()
+        if not last.isValid():
+            last = document.lastBlock()
+        texts = []
+        block = first
+        while True:
+            texts.append(block.text())
+            if block == last or not block.isValid():
+                break
+            block = block.next()
+        start = first.blockNumber()
+        replaced = len(texts) - (document.blockCount() - len(lines))
+        if replaced <= 0 or start + replaced > len(lines):
+            # 無法推算被取代的段落，整個文字框重新比較
+            self.lines[pane] = document.toRawText().split('\u2029')
+            self.hunks = [None if pane in pair else hunks for pair, hunks in zip(self.PAIRS, self.hunks)]
+        else:
+            lines[start:start + replaced] = texts
+            # 合併到尚未重新比較的修改範圍
+            lo, hi, delta = self.dirty[pane] or (start, start, 0)
+            change = len(texts) - replaced
+            self.dirty[pane] = (min(lo, start), max(hi, start + replaced) + change, delta + change)
+        self.timer.start()
+
+    def start(self):
+        if self.worker is not None:
+            return  # 完成後會再檢查是否有新的修改
+        jobs = {}
+        for index, (a, b) in enumerate(self.PAIRS):
+            if self.hunks[index] is None or self.dirty[a] is not None or self.dirty[b] is not None:
+                jobs[index] = (self.hunks[index], list(self.lines[a]), list(self.lines[b]),
+                               self.dirty[a], self.dirty[b])
+        if not jobs:
+            return
+        # 之後的修改以這次快照為基準
+        self.dirty = [None, None, None]
+        worker = Worker(compare_panes, jobs)
+        worker.signals.result.connect(self.on_result)
+        self.worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def on_result(self, results):
+        self.worker = None
+        if results is None or not self.connections:
+            return
+        panes = set()
+        for index, hunks in results.items():
+            self.hunks[index] = hunks
+            panes.update(self.PAIRS[index])
+        for pane in panes:
+            self.update_selections(pane)
+        if any(dirty is not None for dirty in self.dirty) or None in self.hunks:
+            self.timer.start()
+
+    def update_selections(self, pane):
+        document = self.documents[pane]
+        selections = []
+        for index, (a, b) in enumerate(self.PAIRS):
+            if pane not in (a, b) or self.hunks[index] is None:
+                continue
+            side = 0 if pane == a else 1
+            for hunk in self.hunks[index]:
+                first, last = hunk[2 * side], hunk[2 * side + 1]
+                if last > first:
+                    self.add_line_selections(selections, document, first, last)
+                for offset, start, end in hunk[4 + side]:
+                    block = document.findBlockByNumber(first + offset)
+                    if not block.isValid():
+                        continue
+                    positions = PositionMap(block.text())
+                    cursor = QTextCursor(document)
+                    cursor.setPosition(block.position() + positions.to_document(start))
+                    cursor.setPosition(block.position() + positions.to_document(end), QTextCursor.KeepAnchor)
+                    selection = QTextEdit.ExtraSelection()
+                    selection.format = self.char_format
+                    selection.cursor = cursor
+                    selections.append(selection)
+        set_selection_layer(self.text_edits[pane], 'compare', selections)
+
+    def add_line_selections(self, selections, document, first, last):
+        """整行標示 [first, last)；多行選取的最後一行不會整行標示，因此最後一行另外以游標標示"""
+        last_block = document.findBlockByNumber(last - 1)
+        if not last_block.isValid():
+            return
+        if last - 1 > first:
+            cursor = QTextCursor(document.findBlockByNumber(first))
+            cursor.setPosition(last_block.position(), QTextCursor.KeepAnchor)
+            selection = QTextEdit.ExtraSelection()
+            selection.format = self.line_format
+            selection.cursor = cursor
+            selections.append(selection)
+        selection = QTextEdit.ExtraSelection()
+        selection.format = self.line_format
+        selection.cursor = QTextCursor(last_block)
+        selections.append(selection)
+
+class ScrollSync(QObject):
+    """同步捲動：捲動任一文字框時，其他文字框捲到對應的行；比較模式下依差異區段對齊，否則依行號對齊"""
+    # 從一個文字框到另一個文字框經過的 (比較組, 起始側)，左右框之間經由中框轉換
+    ROUTES = {
+        (0, 1): ((0, 0),), (1, 0): ((0, 1),),
+        (1, 2): ((1, 0),), (2, 1): ((1, 1),),
+        (0, 2): ((0, 0), (1, 0)), (2, 0): ((1, 1), (0, 1)),
+    }
+
+    def __init__(self, container, slot):
+        super().__init__(container)
+        self.container = container
+        self.text_edits = container.text_edits
+        self.documents = [text_edit.document() for text_edit in self.text_edits]
+        self.block_counts = [document.blockCount() for document in self.documents]
+        # 每組比較的行對應表：[左側起點, 左側終點, 右側起點, 右側終點]，各為依差異區段排序的串列
+        self.maps = [None, None]
+        self.sources = [None, None]
+        self.syncing = False
+        self.connections = []
+        for pane, text_edit in enumerate(self.text_edits):
+            scroll = slot('sync_scroll', functools.partial(self.on_scroll, pane))
+            text_edit.verticalScrollBar().valueChanged.connect(scroll)
+            self.connections.append((text_edit.verticalScrollBar().valueChanged, scroll))
+            change = functools.partial(self.on_contents_change, pane)
+            self.documents[pane].contentsChange.connect(change)
+            self.connections.append((self.documents[pane].contentsChange, change))
+        self.on_scroll(0, self.text_edits[0].verticalScrollBar().value())
+
+    def stop(self):
+        for signal, slot in self.connections:
+            signal.disconnect(slot)
+        self.connections = []
+        self.deleteLater()
+
+    def refresh_maps(self):
+        """比較結果更新後才重建對應表，並補上比較開始後的修改造成的行號位移"""
+        comparison = self.container.comparison
+        for index, (a, b) in enumerate(PaneComparison.PAIRS):
+            hunks = comparison.hunks[index] if comparison is not None else None
+            if hunks is self.sources[index]:
+                continue
+            self.sources[index] = hunks
+            if hunks is None:
+                self.maps[index] = None
+                continue
+            self.maps[index] = [[hunk[field] for hunk in hunks] for field in range(4)]
+            for side, pane in enumerate((a, b)):
+                if comparison.dirty[pane] is not None:
+                    lo, hi, delta = comparison.dirty[pane]
+                    self.shift(index, side, lo, hi - delta, delta)
+
+    def shift(self, index, side, line, old_end, delta):
+        """原本的 [line, old_end) 行被修改、行數增減 delta 後，調整對應表中其後的差異區段"""
+        starts, ends = self.maps[index][2 * side], self.maps[index][2 * side + 1]
+        for i in range(bisect_right(ends, line), len(starts)):
+            if starts[i] >= old_end:
+                starts[i] += delta
+                ends[i] += delta
+            else:
+                ends[i] = max(starts[i], ends[i] + delta)
+
+    def on_contents_change(self, pane, position, removed, added):
+        document = self.documents[pane]
+        count = document.blockCount()
+        delta = count - self.block_counts[pane]
+        self.block_counts[pane] = count
+        if delta == 0:
+            return
+        block = document.findBlock(position)
+        line = block.blockNumber() if block.isValid() else count - 1
+        last = document.findBlock(position + added)
+        last = last.blockNumber() if last.isValid() else count - 1
+        for index, pair in enumerate(PaneComparison.PAIRS):
+            if pane in pair and self.maps[index] is not None:
+                self.shift(index, pair.index(pane), line, last - delta + 1, delta)
+
+    def map_line(self, source, target, line):
+        for index, side in self.ROUTES[(source, target)]:
+            if self.maps[index] is None:
+                continue  # 尚未比較完成，依行號對齊
+            starts, ends = self.maps[index][2 * side], self.maps[index][2 * side + 1]
+            other_starts, other_ends = self.maps[index][2 - 2 * side], self.maps[index][3 - 2 * side]
+            i = bisect_right(starts, line) - 1
+            if i < 0:
+                continue  # 第一個差異區段之前的行完全相同
+            if line < ends[i]:
+                line = other_starts[i] + min(line - starts[i], max(other_ends[i] - other_starts[i] - 1, 0))
+            else:
+                line = other_ends[i] + line - ends[i]
+        return line
+
+    def block_extent(self, pane, block):
+        """段落在捲軸上的 (起點, 高度)：QTextEdit 以像素計，大型文件模式的 QPlainTextEdit 以顯示的行計"""
+        if isinstance(self.text_edits[pane], LargeTextEdit):
+            return block.firstLineNumber(), block.lineCount()
+        rect = self.documents[pane].documentLayout().blockBoundingRect(block)
+        return rect.top(), rect.height()
+
+    def on_scroll(self, pane, value):
+        if self.syncing:
+            return
+        self.refresh_maps()
+        document = self.documents[pane]
+        if isinstance(self.text_edits[pane], LargeTextEdit):
+            block = document.findBlockByLineNumber(value)
+        else:
+            position = document.documentLayout().hitTest(QPointF(0, value), Qt.FuzzyHit)
+            block = document.findBlock(position) if position >= 0 else document.lastBlock()
+        if not block.isValid():
+            block = document.lastBlock()
+        top, height = self.block_extent(pane, block)
+        # 保留捲動位置在該行內的比例，行高不同時也能平順捲動
+        fraction = (value - top) / height if height else 0
+        self.syncing = True
+        try:
+            for target, text_edit in enumerate(self.text_edits):
+                if target == pane:
+                    continue
+                line = self.map_line(pane, target, block.blockNumber())
+                target_document = self.documents[target]
+                target_block = target_document.findBlockByNumber(min(line, target_document.blockCount() - 1))
+                target_top, target_height = self.block_extent(target, target_block)
+                text_edit.verticalScrollBar().setValue(round(target_top + fraction * target_height))
+        finally:
+            self.syncing = False
+
+class MatchHighlighter(QObject):
+    """標示文字框可見範圍內所有符合搜尋的位置
+
+    依段落號碼快取各段落的結果：修改時只重新掃描被修改的段落並位移其後的段落號碼，
+    捲動時只掃描新出現在可見範圍的段落，不會從頭搜尋整份文件。
+    """
+    LAYER = 'find'
+    MATCH_COLOR = '#c8e6ff'
+    # 可見範圍前後多掃描的段落數，小幅捲動不必重新掃描
+    MARGIN_BLOCKS = 20
+    # 單一段落（例如很長的一行）最多標示的數量
+    MAX_BLOCK_MATCHES = 2000
+
+    def __init__(self, text_edit, regex, slot, parent=None):
+        super().__init__(parent)
+        self.text_edit = text_edit
+        self.document = text_edit.document()
+        self.regex = regex
+        self.blocks = {}  # 段落號碼 -> [ExtraSelection]
+        self.block_count = self.document.blockCount()
+        self.format = QTextCharFormat()
+        self.format.setBackground(QColor(self.MATCH_COLOR))
+        # 同一輪事件中的多次捲動與修改合併為一次更新
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(slot('highlight_matches', self.refresh))
+        scrollbar = text_edit.verticalScrollBar()
+        self.connections = [
+            (scrollbar.valueChanged, self.schedule),
+            (scrollbar.rangeChanged, self.schedule),
+            (self.document.contentsChange, self.on_contents_change),
+            (text_edit.destroyed, self.on_destroyed),
+        ]
+        for signal, handler in self.connections:
+            signal.connect(handler)
+        self.refresh()
+
+    def stop(self):
+        if self.text_edit is not None:
+            for signal, handler in self.connections:
+                signal.disconnect(handler)
+            set_selection_layer(self.text_edit, self.LAYER, [])
+            self.text_edit = None
+        self.timer.stop()
+        self.deleteLater()
+
+    def schedule(self, *args):
+        self.timer.start()
+
+    def on_destroyed(self, *args):
+        self.text_edit = None
+        self.timer.stop()
+
+    def set_regex(self, regex):
+        if regex is not self.regex:
+            self.regex = regex
+            self.blocks = {}
+            self.refresh()
+
+    def on_contents_change(self, position, removed, added):
+        count = self.document.blockCount()
+        delta = count - self.block_count
+        self.block_count = count
+        first = self.document.findBlock(position)
+        first = first.blockNumber() if first.isValid() else count - 1
+        last = self.document.findBlock(position + added)
+        last = last.blockNumber() if last.isValid() else count - 1
+        # 修改前的第 first 到 last - delta 段被修改，其後的段落號碼位移 delta
+        self.blocks = {number if number < first else number + delta: selections
+                       for number, selections in self.blocks.items()
+                       if number < first or number > last - delta}
+        self.timer.start()
+
+    def scan_block(self, block):
+        selections = []
+        start = block.position()
+        matches = self.regex.globalMatch(block.text())
+        while matches.hasNext() and len(selections) < self.MAX_BLOCK_MATCHES:
+            match = matches.next()
+            if match.capturedLength() == 0:
+                continue  # 空字串匹配（例如 ^）不標示
+            cursor = QTextCursor(self.document)
+            cursor.setPosition(start + match.capturedStart())
+            cursor.setPosition(start + match.capturedEnd(), QTextCursor.KeepAnchor)
+            selection = QTextEdit.ExtraSelection()
+            selection.cursor = cursor
+            selection.format = self.format
+            selections.append(selection)
+        return selections
+
+    def refresh(self):
+        """掃描可見範圍內尚未掃描的段落並更新標示，捨棄已離開可見範圍的段落"""
+        if self.text_edit is None:
+            return
+        viewport = self.text_edit.viewport()
+        top = self.text_edit.cursorForPosition(QPoint(0, 0)).blockNumber()
+        bottom = self.text_edit.cursorForPosition(QPoint(viewport.width() - 1, viewport.height() - 1)).blockNumber()
+        # 大文件仍在背景排版時頂端的位置可能不準，以較前面的一端為準
+        first = min(top, bottom) - self.MARGIN_BLOCKS
+        last = bottom + self.MARGIN_BLOCKS
+        blocks = {}
+        block = self.document.findBlockByNumber(max(first, 0))
+        while block.isValid() and block.blockNumber() <= last:
+            number = block.blockNumber()
+            selections = self.blocks.get(number)
+            blocks[number] = self.scan_block(block) if selections is None else selections
+            block = block.next()
+        self.blocks = blocks
+        set_selection_layer(self.text_edit, self.LAYER,
+                            [selection for selections in blocks.values() for selection in selections])
+
+class PaneTextEdit(QTextEdit):
+    """一般模式的文字框；超過門檻的貼上由 paste_handler 分段插入"""
+    def insertFromMimeData(self, source):
+        if not self.paste_handler(self, source):
+            super().insertFromMimeData(source)
+
+class LargeTextEdit(QPlainTextEdit):
+    """大型文件模式的文字框：只排版可見的段落，右鍵選單可切換自動換行；貼上的處理與 PaneTextEdit 相同"""
+    def insertFromMimeData(self, source):
+        if not self.paste_handler(self, source):
+            super().insertFromMimeData(source)
+
+    def contextMenuEvent(self, event):
+        menu = self.createStandardContextMenu()
+        menu.addSeparator()
+        wrap_action = menu.addAction('自動換行')
+        wrap_action.setCheckable(True)
+        wrap_action.setChecked(self.lineWrapMode() != QPlainTextEdit.NoWrap)
+        wrap_action.toggled.connect(
+            lambda checked: self.setLineWrapMode(QPlainTextEdit.WidgetWidth if checked else QPlainTextEdit.NoWrap))
+        menu.exec_(event.globalPos())
+        menu.deleteLater()
+
 class ArrowButton(QToolButton):
     """自定義箭頭按鈕"""
     def __init__(self, arrow_type, parent=None):
@@ -47,6 +2170,8 @@ class ArrowButton(QToolButton):
 
 class FindReplaceDialog(QDialog):
     """查找和替換對話框，支持全局搜索"""
+    MAX_LISTED_RESULTS = 5000
+
     def __init__(self, parent, text_edit):
         super().__init__(parent=parent)
         self.parent = parent
@@ -55,6 +2180,10 @@ class FindReplaceDialog(QDialog):
         self.current_text_edit_index = 0 if text_edit == parent.tabs.widget(self.current_tab_index).leftTextEdit else (
             1 if text_edit == parent.tabs.widget(self.current_tab_index).middleTextEdit else 2)
         self.last_cursor_position = 0
+        self.search_worker = None
+        self.replace_worker = None
+        self.search_tabs = {}
+        self.highlighter = None
         self.initUI()
 
     def initUI(self):
@@ -74,22 +2203,51 @@ class FindReplaceDialog(QDialog):
         layout.addWidget(self.replace_input, 1, 1)
 
         self.case_checkbox = QCheckBox('區分大小寫')
-        layout.addWidget(self.case_checkbox, 2, 0, 1, 2)
+        layout.addWidget(self.case_checkbox, 2, 0)
+
+        self.whole_word_checkbox = QCheckBox('全字匹配')
+        layout.addWidget(self.whole_word_checkbox, 2, 1)
+
+        self.regex_checkbox = QCheckBox('規則運算式')
+        layout.addWidget(self.regex_checkbox, 3, 1)
 
         self.global_checkbox = QCheckBox('全局搜尋')
-        layout.addWidget(self.global_checkbox, 3, 0, 1, 2)
+        layout.addWidget(self.global_checkbox, 3, 0)
+
+        self.highlight_checkbox = QCheckBox('標示所有結果')
+        self.highlight_checkbox.setToolTip('在目前的文字框中標示所有符合的位置，輸入時隨之更新')
+        layout.addWidget(self.highlight_checkbox, 4, 0)
+
+        slot = self.parent.instrumentation.slot
+        # 搜尋條件一改變就取消進行中的背景搜尋
+        self.find_input.textChanged.connect(slot('cancel_search', self.cancel_search))
+        for checkbox in (self.case_checkbox, self.whole_word_checkbox, self.regex_checkbox, self.global_checkbox):
+            checkbox.toggled.connect(slot('cancel_search', self.cancel_search))
+        self.find_input.textChanged.connect(slot('update_highlights', self.update_highlights))
+        for checkbox in (self.case_checkbox, self.whole_word_checkbox, self.regex_checkbox, self.highlight_checkbox):
+            checkbox.toggled.connect(slot('update_highlights', self.update_highlights))
 
         self.find_next_button = QPushButton('搜尋下一個')
-        self.find_next_button.clicked.connect(self.find_next)
-        layout.addWidget(self.find_next_button, 4, 0)
+        self.find_next_button.clicked.connect(slot('find_next', self.find_next))
+        layout.addWidget(self.find_next_button, 5, 0)
 
         self.replace_button = QPushButton('取代')
-        self.replace_button.clicked.connect(self.replace_one)
-        layout.addWidget(self.replace_button, 4, 1)
+        self.replace_button.clicked.connect(slot('replace_one', self.replace_one))
+        layout.addWidget(self.replace_button, 5, 1)
 
         self.replace_all_button = QPushButton('全部取代')
-        self.replace_all_button.clicked.connect(self.replace_all)
-        layout.addWidget(self.replace_all_button, 5, 0, 1, 2)
+        self.replace_all_button.clicked.connect(slot('replace_all', self.replace_all))
+        layout.addWidget(self.replace_all_button, 6, 0, 1, 2)
+
+        self.find_all_button = QPushButton('列出所有結果')
+        self.find_all_button.clicked.connect(slot('find_all', self.find_all))
+        layout.addWidget(self.find_all_button, 7, 0, 1, 2)
+
+        self.results_list = QListWidget()
+        self.results_list.itemActivated.connect(slot('jump_to_result', self.jump_to_result))
+        self.results_list.itemClicked.connect(slot('jump_to_result', self.jump_to_result))
+        self.results_list.hide()
+        layout.addWidget(self.results_list, 8, 0, 1, 2)
 
         button_style = """
             QPushButton {
@@ -104,6 +2262,7 @@ class FindReplaceDialog(QDialog):
         self.find_next_button.setStyleSheet(button_style)
         self.replace_button.setStyleSheet(button_style)
         self.replace_all_button.setStyleSheet(button_style)
+        self.find_all_button.setStyleSheet(button_style)
 
         self.setLayout(layout)
 
@@ -111,6 +2270,9 @@ class FindReplaceDialog(QDialog):
         search_text = self.find_input.text()
         if not search_text:
             return
+        if self.uses_pattern():
+            self.find_next_async()
+            return
 
         options = QTextDocument.FindFlags()
         if self.case_checkbox.isChecked():
@@ -121,13 +2283,27 @@ class FindReplaceDialog(QDialog):
             tab_count = self.parent.tabs.count()
             initial_tab_index = self.current_tab_index
             initial_text_edit_index = self.current_text_edit_index
+            candidates = self.parent.search_index.candidates(search_text)
             while True:
                 tab = self.parent.tabs.widget(self.current_tab_index)
-                text_edits = [tab.leftTextEdit, tab.middleTextEdit, tab.rightTextEdit]
-                text_edit = text_edits[self.current_text_edit_index]
-                cursor = QTextCursor(text_edit.document())
-                cursor.setPosition(self.last_cursor_position)
-                cursor = text_edit.document().find(search_text, cursor, options)
+                if candidates is not None and (tab.tab_id, self.current_text_edit_index) not in candidates:
+                    # 索引顯示此文字框不含搜尋內容
+                    skip = True
+                else:
+                    if tab.pending_contents is not None:
+                        # 尚未建立的分頁先在純文字中搜尋，命中時才建立文字框
+                        content = self.parent.get_pane_content(tab, self.current_text_edit_index)
+                        if contains_text(content, search_text, self.case_checkbox.isChecked()):
+                            self.parent.materialize_tab(tab)
+                    skip = tab.pending_contents is not None
+                if skip:
+                    cursor = QTextCursor()
+                else:
+                    text_edits = [tab.leftTextEdit, tab.middleTextEdit, tab.rightTextEdit]
+                    text_edit = text_edits[self.current_text_edit_index]
+                    cursor = QTextCursor(text_edit.document())
+                    cursor.setPosition(self.last_cursor_position)
+                    cursor = text_edit.document().find(search_text, cursor, options)
                 if not cursor.isNull():
                     # 找到匹配項，更新狀態
                     text_edit.setFocus()
@@ -139,6 +2315,7 @@ class FindReplaceDialog(QDialog):
                         0 if text_edit == tab.leftTextEdit else
                         1 if text_edit == tab.middleTextEdit else 2
                     )
+                    self.update_highlights()
                     return
                 else:
                     # 在當前文本框未找到，切換到下一個文本框
@@ -184,52 +2361,537 @@ class FindReplaceDialog(QDialog):
                 cursor.insertText(self.replace_input.text())
                 self.find_next()
 
-    def replace_all(self):
-        search_text = self.find_input.text()
-        replace_text = self.replace_input.text()
-        if not search_text:
+    def replace_all(self):
+        search_text = self.find_input.text()
+        replace_text = self.replace_input.text()
+        if not search_text:
+            return
+        case_sensitive = self.case_checkbox.isChecked()
+        regex = None
+        if self.uses_pattern():
+            regex = self.compile_pattern()
+            if regex is None:
+                return
+
+        if self.global_checkbox.isChecked():
+            # 全局替換：在背景計算每個文字框的取代結果，完成後一次套用
+            self.start_global_replace(search_text, replace_text, case_sensitive, regex)
+        else:
+            # 當前文本框替換
+            document = self.text_edit.document()
+            text = document_text(document)
+            plan = plan_replacement(text, search_text, replace_text, case_sensitive, regex)
+            count = 0
+            if plan is not None:
+                apply_replacement(document, text, plan)
+                count = plan[3]
+            QMessageBox.information(self, "取代", f"已取代 {count} 個匹配項目")
+
+    def start_global_replace(self, search_text, replace_text, case_sensitive, regex=None):
+        self.parent.take_snapshot('全部取代前')
+        candidates = None if self.regex_checkbox.isChecked() else self.parent.search_index.candidates(search_text)
+        items = []
+        revisions = {}
+        for tab in self.parent.iter_tabs():
+            for pane in range(3):
+                key = (tab.tab_id, pane)
+                if candidates is not None and key not in candidates:
+                    continue
+                if tab.pending_contents is not None:
+                    items.append((key, tab.pending_contents[pane]))
+                else:
+                    document = (tab.leftTextEdit, tab.middleTextEdit, tab.rightTextEdit)[pane].document()
+                    items.append((key, document_text(document)))
+                    revisions[key] = document.revision()
+
+        progress = QProgressDialog("正在計算全部取代……", "取消", 0, len(items), self)
+        progress.setWindowTitle("全部取代")
+        progress.setWindowModality(Qt.ApplicationModal)
+        progress.setMinimumDuration(300)
+        worker = Worker(plan_replacements, items, search_text, replace_text, case_sensitive,
+                        self.parent.store.path, regex)
+        worker.signals.progress.connect(lambda done, total: progress.setValue(done))
+        worker.signals.result.connect(self.parent.instrumentation.slot(
+            'finish_global_replace',
+            lambda plans: self.finish_global_replace(plans, revisions, search_text, replace_text,
+                                                     case_sensitive, regex)))
+        worker.signals.error.connect(lambda message: QMessageBox.warning(self, "取代", f"全部取代失敗：{message}"))
+        worker.signals.finished.connect(lambda: close_progress(progress))
+        progress.canceled.connect(worker.cancel)
+        self.replace_worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def finish_global_replace(self, plans, revisions, search_text, replace_text, case_sensitive, regex=None):
+        self.replace_worker = None
+        if plans is None:
+            return  # 已取消，未做任何修改
+        count = 0
+        for tab in self.parent.iter_tabs():
+            for pane in range(3):
+                entry = plans.get((tab.tab_id, pane))
+                if entry is None:
+                    continue
+                text, plan = entry
+                if tab.pending_contents is not None:
+                    # 尚未建立的分頁直接在純文字上取代
+                    start, end, segment, _ = plan
+                    tab.pending_contents[pane] = text[:start] + segment + text[end:]
+                    self.parent.mark_pane_dirty(tab, pane)
+                    self.parent.search_index.pane_replaced(tab, pane)
+                else:
+                    document = (tab.leftTextEdit, tab.middleTextEdit, tab.rightTextEdit)[pane].document()
+                    if revisions.get((tab.tab_id, pane)) != document.revision():
+                        # 計算期間分頁被建立或內容有變，以目前內容重新計算
+                        text = document_text(document)
+                        plan = plan_replacement(text, search_text, replace_text, case_sensitive, regex)
+                        if plan is None:
+                            continue
+                    apply_replacement(document, text, plan)
+                count += plan[3]
+        QMessageBox.information(self, "取代", f"已全局取代 {count} 個匹配項目")
+        self.reset_search_state()
+
+    def uses_pattern(self):
+        return self.regex_checkbox.isChecked() or self.whole_word_checkbox.isChecked()
+
+    def update_highlights(self):
+        """依目前的搜尋條件與文字框更新「標示所有結果」"""
+        regex = None
+        if self.highlight_checkbox.isChecked() and self.find_input.text():
+            try:
+                regex = compile_search_pattern(
+                    self.find_input.text(), self.case_checkbox.isChecked(),
+                    self.regex_checkbox.isChecked(), self.whole_word_checkbox.isChecked())
+            except ValueError:
+                pass  # 規則運算式尚未輸入完成，暫不標示
+        if self.highlighter is not None and (regex is None or self.highlighter.text_edit is not self.text_edit):
+            self.highlighter.stop()
+            self.highlighter = None
+        if regex is None:
+            return
+        if self.highlighter is None:
+            self.highlighter = MatchHighlighter(self.text_edit, regex, self.parent.instrumentation.slot, self)
+        else:
+            self.highlighter.set_regex(regex)
+
+    def compile_pattern(self):
+        """依目前設定取得（快取的）規則運算式；無效時顯示錯誤並回傳 None"""
+        try:
+            return compile_search_pattern(
+                self.find_input.text(), self.case_checkbox.isChecked(),
+                self.regex_checkbox.isChecked(), self.whole_word_checkbox.isChecked())
+        except ValueError as e:
+            QMessageBox.warning(self, "搜尋", f"規則運算式無效：{e}")
+            return None
+
+    def snapshot_pane(self, tab, pane):
+        """取得文字框內容的快照，尚未載入的內容回傳 None 由背景執行緒讀取"""
+        if tab.pending_contents is not None:
+            return tab.pending_contents[pane]
+        return document_text((tab.leftTextEdit, tab.middleTextEdit, tab.rightTextEdit)[pane].document())
+
+    def start_search(self, items, regex, on_matches, on_finished, first_only=False):
+        self.cancel_search()
+        self.search_tabs = {tab.tab_id: tab for tab in self.parent.iter_tabs()}
+        worker = Worker(search_panes, items, regex, self.parent.store.path,
+                        first_only=first_only, limit=self.MAX_LISTED_RESULTS)
+        # 取消後仍可能收到已排入佇列的訊號，只處理目前這次搜尋的結果
+        slot = self.parent.instrumentation.slot
+        worker.signals.partial.connect(slot(
+            on_matches.__name__, lambda matches: worker is self.search_worker and on_matches(matches)))
+        worker.signals.result.connect(slot(
+            on_finished.__name__, lambda result: worker is self.search_worker and on_finished(*result)))
+        worker.signals.error.connect(
+            lambda message: worker is self.search_worker and QMessageBox.warning(self, "搜尋", message))
+        self.search_worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def cancel_search(self):
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+            self.search_worker = None
+
+    def find_all(self):
+        search_text = self.find_input.text()
+        if not search_text:
+            return
+        regex = self.compile_pattern()
+        if regex is None:
+            return
+        if self.global_checkbox.isChecked():
+            candidates = None if self.regex_checkbox.isChecked() else self.parent.search_index.candidates(search_text)
+            items = [
+                ((tab.tab_id, pane), self.snapshot_pane(tab, pane), 0)
+                for tab in self.parent.iter_tabs() for pane in range(3)
+                if candidates is None or (tab.tab_id, pane) in candidates
+            ]
+        else:
+            tab = self.parent.tabs.widget(self.current_tab_index)
+            pane = self.current_text_edit_index
+            items = [((tab.tab_id, pane), self.snapshot_pane(tab, pane), 0)]
+
+        self.results_list.clear()
+        self.results_list.addItem("搜尋中……")
+        self.results_list.show()
+        self.start_search(items, regex, self.add_results, self.on_find_all_finished)
+
+    def add_results(self, matches):
+        if self.results_list.count() and self.results_list.item(0).data(Qt.UserRole) is None:
+            self.results_list.takeItem(0)  # 移除「搜尋中」
+        for (tab_id, pane), start, end, line, line_text in matches:
+            tab = self.search_tabs.get(tab_id)
+            if tab is None:
+                continue
+            title = self.parent.tabs.tabText(self.parent.tabs.indexOf(tab))
+            item = QListWidgetItem(f"{title}／{PANE_NAMES[pane]}　第 {line} 行：{line_text.strip()[:80]}")
+            item.setData(Qt.UserRole, (tab, pane, start, end))
+            self.results_list.addItem(item)
+
+    def on_find_all_finished(self, count, truncated):
+        self.search_worker = None
+        if truncated:
+            self.results_list.addItem(f"……結果過多，僅列出前 {self.MAX_LISTED_RESULTS} 個")
+        elif not count:
+            self.results_list.clear()
+            self.results_list.addItem("找不到搜尋內容")
+
+    def find_next_async(self):
+        """規則運算式與全字匹配的搜尋下一個，在背景從目前位置往後搜尋"""
+        regex = self.compile_pattern()
+        if regex is None:
+            return
+        tab = self.parent.tabs.widget(self.current_tab_index)
+        pane = self.current_text_edit_index
+        position = self.text_edit.textCursor().position()
+        if self.global_checkbox.isChecked():
+            position = self.last_cursor_position
+        current = self.snapshot_pane(tab, pane)
+        items = [((tab.tab_id, pane), current, position)]
+        if self.global_checkbox.isChecked():
+            candidates = None if self.regex_checkbox.isChecked() else self.parent.search_index.candidates(
+                self.find_input.text())
+            tabs = list(self.parent.iter_tabs())
+            order = [(tabs[(self.current_tab_index + (pane + i) // 3) % len(tabs)], (pane + i) % 3)
+                     for i in range(1, len(tabs) * 3)]
+            items.extend(
+                ((other.tab_id, other_pane), self.snapshot_pane(other, other_pane), 0)
+                for other, other_pane in order
+                if candidates is None or (other.tab_id, other_pane) in candidates
+            )
+        # 最後從目前文字框的開頭重新搜尋
+        items.append(((tab.tab_id, pane), current, 0))
+        self.start_search(items, regex, self.on_next_match, self.on_find_next_finished, first_only=True)
+
+    def on_next_match(self, matches):
+        (tab_id, pane), start, end, _, _ = matches[0]
+        tab = self.search_tabs.get(tab_id)
+        if tab is not None:
+            self.select_match(tab, pane, start, end)
+
+    def on_find_next_finished(self, count, truncated):
+        self.search_worker = None
+        if not count:
+            message = "在所有分頁中找不到搜尋內容" if self.global_checkbox.isChecked() else "找不到搜尋內容"
+            QMessageBox.information(self, "搜尋", message)
+
+    def jump_to_result(self, item):
+        result = item.data(Qt.UserRole)
+        if result is None:
             return
+        self.select_match(*result)
 
-        options = QTextDocument.FindFlags()
-        if self.case_checkbox.isChecked():
-            options |= QTextDocument.FindCaseSensitively
+    def select_match(self, tab, pane, start, end):
+        index = self.parent.tabs.indexOf(tab)
+        if index == -1:
+            return  # 分頁已關閉
+        self.parent.tabs.setCurrentIndex(index)
+        text_edit = (tab.leftTextEdit, tab.middleTextEdit, tab.rightTextEdit)[pane]
+        cursor = QTextCursor(text_edit.document())
+        last = text_edit.document().characterCount() - 1
+        cursor.setPosition(min(start, last))
+        cursor.setPosition(min(end, last), QTextCursor.KeepAnchor)
+        text_edit.setFocus()
+        text_edit.setTextCursor(cursor)
+        self.text_edit = text_edit
+        self.current_tab_index = index
+        self.current_text_edit_index = pane
+        self.last_cursor_position = cursor.position()
+        self.update_highlights()
 
-        count = 0
-        if self.global_checkbox.isChecked():
-            # 全局替換
-            for tab_index in range(self.parent.tabs.count()):
-                tab = self.parent.tabs.widget(tab_index)
-                for text_edit in [tab.leftTextEdit, tab.middleTextEdit, tab.rightTextEdit]:
-                    cursor = QTextCursor(text_edit.document())
-                    while True:
-                        cursor = text_edit.document().find(search_text, cursor, options)
-                        if cursor.isNull():
-                            break
-                        cursor.beginEditBlock()
-                        cursor.insertText(replace_text)
-                        cursor.endEditBlock()
-                        count += 1
-            QMessageBox.information(self, "取代", f"已全局取代 {count} 個匹配項目")
-            self.reset_search_state()
-        else:
-            # 當前文本框替換
-            text_edit = self.text_edit
-            cursor = QTextCursor(text_edit.document())
-            while True:
-                cursor = text_edit.document().find(search_text, cursor, options)
-                if cursor.isNull():
-                    break
-                cursor.beginEditBlock()
-                cursor.insertText(replace_text)
-                cursor.endEditBlock()
-                count += 1
-            QMessageBox.information(self, "取代", f"已取代 {count} 個匹配項目")
+    def closeEvent(self, event):
+        self.cancel_search()
+        if self.highlighter is not None:
+            self.highlighter.stop()
+            self.highlighter = None
+        super().closeEvent(event)
 
     def reset_search_state(self):
         self.current_tab_index = self.parent.tabs.currentIndex()
         self.text_edit = self.parent.tabs.widget(self.current_tab_index).leftTextEdit
         self.current_text_edit_index = 0
         self.last_cursor_position = 0
+        self.update_highlights()
+
+class QuickOpenDialog(QDialog):
+    """快速切換分頁（Ctrl+P）：模糊比對分頁標題與各文字框的開頭幾行"""
+    MAX_LISTED_RESULTS = 50
+
+    def __init__(self, parent):
+        super().__init__(parent=parent)
+        self.parent = parent
+        self.index = parent.quick_open_index
+        self.query = None
+        self.matches = None  # 上一次查詢匹配的分頁編號；查詢內容延長時只需在其中比對
+        self.initUI()
+        self.index.refresh()
+        self.index.built.connect(self.on_index_built)
+        self.update_results()
+
+    def initUI(self):
+        self.setWindowTitle('快速切換分頁')
+        self.resize(600, 400)
+        layout = QVBoxLayout()
+        self.query_input = QLineEdit()
+        self.query_input.setPlaceholderText('輸入分頁標題或文字框開頭的文字')
+        self.result_list = QListWidget()
+        layout.addWidget(self.query_input)
+        layout.addWidget(self.result_list)
+        self.setLayout(layout)
+        self.query_input.textChanged.connect(self.parent.instrumentation.slot('quick_open', self.update_results))
+        self.result_list.itemActivated.connect(self.activate)
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown):
+            # 輸入框不處理上下鍵，轉給結果清單以選擇分頁
+            QApplication.sendEvent(self.result_list, event)
+        elif event.key() in (Qt.Key_Return, Qt.Key_Enter):
+            item = self.result_list.currentItem()
+            if item is not None:
+                self.activate(item)
+        else:
+            super().keyPressEvent(event)
+
+    def on_index_built(self):
+        self.query = None
+        self.update_results()
+
+    def update_results(self):
+        query = self.query_input.text().strip().lower()
+        narrowing = self.query is not None and query.startswith(self.query)
+        results = self.index.search(query, self.matches if narrowing else None)
+        self.query = query
+        self.matches = results
+        self.result_list.clear()
+        for tab_id in results[:self.MAX_LISTED_RESULTS]:
+            line = self.index.display_line(tab_id, query)
+            item = QListWidgetItem(f"{self.index.titles[tab_id][0]}　　{line.strip()}")
+            item.setData(Qt.UserRole, tab_id)
+            self.result_list.addItem(item)
+        if self.result_list.count():
+            self.result_list.setCurrentRow(0)
+
+    def activate(self, item):
+        tab_id = item.data(Qt.UserRole)
+        for index, tab in enumerate(self.parent.iter_tabs()):
+            if tab.tab_id == tab_id:
+                self.parent.tabs.setCurrentIndex(index)
+                tab.leftTextEdit.setFocus()
+                break
+        self.accept()
+
+class SnapshotDialog(QDialog):
+    """瀏覽工作階段快照，可將快照中的分頁還原為新分頁，或將單一文字框還原到原分頁"""
+    def __init__(self, parent):
+        super().__init__(parent=parent)
+        self.parent = parent
+        self.snapshots = parent.store.list_snapshots()
+        self.worker = None
+        self.tab_id = None
+        self.title = None
+        self.contents = None  # 預覽中分頁的三個文字框內容，讀取完成前為 None
+        self.initUI()
+        for snapshot_id, created, label, tabs, panes in self.snapshots:
+            self.snapshot_list.addItem(
+                f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))}　{label}"
+                f"（{len(tabs)} 個分頁，{panes} 個文字框有變動）")
+        if self.snapshots:
+            self.snapshot_list.setCurrentRow(0)
+
+    def initUI(self):
+        self.setWindowTitle('快照記錄')
+        self.resize(1200, 700)
+        layout = QVBoxLayout()
+        list_layout = QHBoxLayout()
+        self.snapshot_list = QListWidget()
+        self.snapshot_list.setToolTip('定期與清除、全部取代、還原之前自動建立的快照')
+        self.tab_list = QListWidget()
+        self.tab_list.setToolTip('快照當時的分頁')
+        list_layout.addWidget(self.snapshot_list, 3)
+        list_layout.addWidget(self.tab_list, 2)
+        preview_layout = QHBoxLayout()
+        self.previews = []
+        self.restore_pane_buttons = []
+        for pane, name in enumerate(PANE_NAMES):
+            preview = QPlainTextEdit()
+            preview.setReadOnly(True)
+            preview.setFont(self.parent.text_font)
+            button = QPushButton(f'還原{name}')
+            button.setEnabled(False)
+            button.setToolTip(f'以快照中的內容取代原分頁的{PANE_DESCRIPTIONS[pane]}（原分頁已關閉時為目前分頁），可以復原')
+            button.clicked.connect(lambda checked=False, pane=pane: self.restore_pane(pane))
+            pane_layout = QVBoxLayout()
+            pane_layout.addWidget(preview)
+            pane_layout.addWidget(button)
+            preview_layout.addLayout(pane_layout)
+            self.previews.append(preview)
+            self.restore_pane_buttons.append(button)
+        self.restore_tab_button = QPushButton('還原為新分頁')
+        self.restore_tab_button.setEnabled(False)
+        self.restore_tab_button.setToolTip('將快照中的分頁加入為新分頁，不影響現有分頁')
+        self.restore_tab_button.clicked.connect(self.restore_tab)
+        layout.addLayout(list_layout, 1)
+        layout.addLayout(preview_layout, 2)
+        layout.addWidget(self.restore_tab_button)
+        self.setLayout(layout)
+        self.snapshot_list.currentRowChanged.connect(self.show_snapshot)
+        self.tab_list.currentRowChanged.connect(self.show_tab)
+
+    def show_snapshot(self, row):
+        self.tab_list.clear()
+        if row < 0:
+            return
+        for tab_id, title in self.snapshots[row][3]:
+            self.tab_list.addItem(title)
+        if self.tab_list.count():
+            self.tab_list.setCurrentRow(0)
+
+    def show_tab(self, row):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        self.contents = None
+        self.set_restore_enabled(False)
+        for preview in self.previews:
+            preview.setPlainText('')
+        if row < 0:
+            return
+        snapshot_id, _, _, tabs, _ = self.snapshots[self.snapshot_list.currentRow()]
+        self.tab_id, self.title = tabs[row]
+        self.previews[0].setPlainText('讀取中……')
+        self.worker = Worker(SessionStore.read_snapshot_tab, self.parent.store.path, snapshot_id, self.tab_id)
+        self.worker.signals.result.connect(self.on_tab_loaded)
+        self.worker.signals.error.connect(self.on_tab_failed)
+        QThreadPool.globalInstance().start(self.worker)
+
+    def on_tab_loaded(self, contents):
+        if self.worker is None or self.sender() is not self.worker.signals:
+            return  # 已改選其他分頁
+        self.contents = contents
+        for preview, content in zip(self.previews, contents):
+            preview.setPlainText(content)
+        self.set_restore_enabled(True)
+
+    def on_tab_failed(self, message):
+        if self.worker is not None and self.sender() is self.worker.signals:
+            self.previews[0].setPlainText(f'讀取快照時發生錯誤：{message}')
+
+    def set_restore_enabled(self, enabled):
+        self.restore_tab_button.setEnabled(enabled)
+        for button in self.restore_pane_buttons:
+            button.setEnabled(enabled)
+
+    def restore_tab(self):
+        self.parent.restore_snapshot_tab(self.title, self.contents)
+
+    def restore_pane(self, pane):
+        self.parent.restore_snapshot_pane(self.tab_id, pane, self.contents[pane])
+
+    def done(self, result):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        super().done(result)
+
+class ExportDialog(QDialog):
+    """選擇要匯出的分頁、文字框與編碼，再選擇匯出到資料夾或 ZIP 壓縮檔"""
+    def __init__(self, parent):
+        super().__init__(parent=parent)
+        self.parent = parent
+        self.target = None  # 選擇的資料夾或 ZIP 壓縮檔路徑
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle('匯出所有分頁')
+        self.resize(500, 500)
+        layout = QVBoxLayout()
+        self.tab_list = QListWidget()
+        self.tab_list.setToolTip('取消勾選的分頁不會匯出')
+        for index in range(self.parent.tabs.count()):
+            item = QListWidgetItem(self.parent.tabs.tabText(index))
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            self.tab_list.addItem(item)
+        self.select_all_checkbox = QCheckBox('全選')
+        self.select_all_checkbox.setChecked(True)
+        self.select_all_checkbox.toggled.connect(self.set_all_checked)
+        pane_layout = QHBoxLayout()
+        self.pane_checkboxes = []
+        for pane, name in enumerate(PANE_NAMES):
+            checkbox = QCheckBox(name)
+            checkbox.setChecked(True)
+            pane_layout.addWidget(checkbox)
+            self.pane_checkboxes.append(checkbox)
+        pane_layout.addStretch()
+        option_layout = QHBoxLayout()
+        option_layout.addWidget(QLabel('編碼:'))
+        self.encoding_combo = QComboBox()
+        self.encoding_combo.addItems(ENCODINGS)
+        option_layout.addWidget(self.encoding_combo)
+        self.replace_checkbox = QCheckBox('以「?」取代無法編碼的字元')
+        self.replace_checkbox.setToolTip('未勾選時，含有無法編碼字元的文字框不會匯出')
+        option_layout.addWidget(self.replace_checkbox)
+        option_layout.addStretch()
+        button_layout = QHBoxLayout()
+        directory_button = QPushButton('匯出到資料夾……')
+        directory_button.clicked.connect(self.choose_directory)
+        archive_button = QPushButton('匯出為 ZIP……')
+        archive_button.clicked.connect(self.choose_archive)
+        cancel_button = QPushButton('取消')
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addStretch()
+        button_layout.addWidget(directory_button)
+        button_layout.addWidget(archive_button)
+        button_layout.addWidget(cancel_button)
+        layout.addWidget(self.select_all_checkbox)
+        layout.addWidget(self.tab_list)
+        layout.addLayout(pane_layout)
+        layout.addLayout(option_layout)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def set_all_checked(self, checked):
+        state = Qt.Checked if checked else Qt.Unchecked
+        for row in range(self.tab_list.count()):
+            self.tab_list.item(row).setCheckState(state)
+
+    def choose_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "選擇匯出的資料夾")
+        if directory:
+            self.target = directory
+            self.accept()
+
+    def choose_archive(self):
+        fileName, _ = QFileDialog.getSaveFileName(
+            self, "匯出為 ZIP", "tabs.zip", "ZIP Files (*.zip);;All Files (*)")
+        if fileName:
+            self.target = fileName if fileName.lower().endswith('.zip') else fileName + '.zip'
+            self.accept()
+
+    def selected_tabs(self):
+        return [row for row in range(self.tab_list.count()) if self.tab_list.item(row).checkState() == Qt.Checked]
+
+    def selected_panes(self):
+        return [pane for pane, checkbox in enumerate(self.pane_checkboxes) if checkbox.isChecked()]
 
 class PlainTextEditor(QMainWindow):
     """主窗口類，包含所有功能實現"""
@@ -254,7 +2916,27 @@ class PlainTextEditor(QMainWindow):
         except Exception as e:
             print(f"Error loading font: {str(e)}")
             self.font_family = "Microsoft JhengHei"
-        self.saved_data = "editor_data.json"
+        self.saved_data = "editor_data.json"  # 舊版格式，首次啟動時會匯入資料庫
+        self.session_path = SESSION_PATH
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.instrumentation = Instrumentation(self)
+        # 所有分頁共用的字體
+        self.text_font = QFont(self.font_family, 11)
+        self.label_font = QFont(self.font_family, 10)
+        self.button_font = QFont(self.font_family, 10)
+        self.pane_pool = []
+        self.pane_pool_timer = QTimer(self)
+        self.pane_pool_timer.setSingleShot(True)
+        self.pane_pool_timer.setInterval(100)
+        self.pane_pool_timer.timeout.connect(self.refill_pane_pool)
+        self.hibernate_timer = QTimer(self)
+        self.hibernate_timer.setSingleShot(True)
+        self.hibernate_timer.setInterval(2000)
+        self.hibernate_timer.timeout.connect(self.instrumentation.slot('enforce_tab_memory_budget', self.enforce_tab_memory_budget))
+        self.undo_budget_timer = QTimer(self)
+        self.undo_budget_timer.setSingleShot(True)
+        self.undo_budget_timer.setInterval(1000)
+        self.undo_budget_timer.timeout.connect(self.instrumentation.slot('enforce_undo_budget', self.enforce_undo_budget))
         
         # 創建全局調色盤
         self.custom_palette = QPalette()
@@ -271,30 +2953,60 @@ class PlainTextEditor(QMainWindow):
         # 創建托盤菜單
         self.tray_menu = QMenu()
         show_action = self.tray_menu.addAction("顯示")
+        self.instrumentation_action = self.tray_menu.addAction("效能診斷模式")
+        self.instrumentation_action.setCheckable(True)
+        self.instrumentation_action.setToolTip('記錄各項操作的耗時與介面停頓')
+        self.export_diagnostics_action = self.tray_menu.addAction("匯出效能統計……")
+        self.undo_memory_action = self.tray_menu.addAction("復原記錄")
+        self.undo_memory_action.setEnabled(False)
+        self.undo_memory_action.setToolTip('所有已開啟分頁的復原記錄估計佔用的記憶體')
+        export_action = self.tray_menu.addAction("匯出所有分頁……")
+        export_action.setToolTip('將所有分頁的文字框匯出到資料夾或 ZIP 壓縮檔')
+        snapshot_action = self.tray_menu.addAction("快照記錄……")
+        snapshot_action.setToolTip('瀏覽工作階段快照，還原分頁或文字框')
         quit_action = self.tray_menu.addAction("關閉")
         
         show_action.triggered.connect(self.show)
+        self.instrumentation_action.toggled.connect(self.toggle_instrumentation)
+        self.export_diagnostics_action.triggered.connect(self.export_diagnostics)
+        snapshot_action.triggered.connect(self.open_snapshots)
+        export_action.triggered.connect(self.export_all_tabs)
         quit_action.triggered.connect(self.quit_application)
+        self.tray_menu.aboutToShow.connect(self.update_undo_memory_action)
         
         self.tray_icon.setContextMenu(self.tray_menu)
         self.tray_icon.activated.connect(self.tray_icon_activated)
         self.tray_icon.show()
+        self.init_autosave()
+        self.search_index = SearchIndex(self)
+        self.quick_open_index = QuickOpenIndex(self)
         self.load_tabs()
+        self.apply_autosave_settings()
+        self.instrumentation_action.setChecked(self.settings['instrumentation'])
+        self.export_diagnostics_action.setEnabled(self.settings['instrumentation'])
+        self.instrumentation.set_enabled(self.settings['instrumentation'], self.settings['stall_threshold'])
 
     def initUI(self):
         self.setWindowTitle('純白文本編輯器')
         self.setWindowIcon(QIcon(resource_path('note.ico')))
         self.resize(1400, 750)
         self.center()
-        self.setStyleSheet("background-color: white;")
+        self.setStyleSheet(WINDOW_STYLESHEET)
 
         self.tabs = QTabWidget()
         self.setCentralWidget(self.tabs)
         self.tabs.setTabsClosable(True)
-        self.tabs.tabCloseRequested.connect(self.close_tab)
+        slot = self.instrumentation.slot
+        self.tabs.tabCloseRequested.connect(slot('close_tab', self.close_tab))
+        self.tabs.currentChanged.connect(slot('on_current_tab_changed', self.on_current_tab_changed))
         self.tabs.setMovable(True)
+        self.tabs.tabBar().tabMoved.connect(lambda from_index, to_index: self.mark_session_dirty(structure=True))
         self.tabs.tabBar().setElideMode(Qt.ElideRight)
-        self.tabs.setToolTip('可以拖曳分頁標籤來調整順序')
+        self.tabs.setToolTip('可以拖曳分頁標籤來調整順序，或按 Ctrl+P 搜尋分頁、Ctrl+Shift+S 匯出所有分頁')
+        quick_open_shortcut = QShortcut(QKeySequence("Ctrl+P"), self)
+        quick_open_shortcut.activated.connect(slot('open_quick_open', self.open_quick_open))
+        export_shortcut = QShortcut(QKeySequence("Ctrl+Shift+S"), self)
+        export_shortcut.activated.connect(slot('export_all_tabs', self.export_all_tabs))
 
         self.tabs.tabBar().setStyleSheet("""
             QTabBar::scroller {
@@ -341,7 +3053,7 @@ class PlainTextEditor(QMainWindow):
                 background-color: #e0e0e0;
             }
         """)
-        add_tab_button.clicked.connect(self.add_new_tab)
+        add_tab_button.clicked.connect(slot('add_new_tab', self.add_new_tab))
         add_tab_button.setToolTip('點擊以新增一個新分頁')
         self.tabs.setCornerWidget(add_tab_button, Qt.TopLeftCorner)
 
@@ -371,220 +3083,561 @@ class PlainTextEditor(QMainWindow):
             self.always_on_top_button.setText("取消視窗顯示最上層")
         self.show()
 
-    def add_new_tab(self, left_content="", middle_content="", right_content="", title="New Tab"):
+    def add_new_tab(self, left_content="", middle_content="", right_content="", title="New Tab", tab_id=None):
         new_tab = QWidget()
-        tab_layout = QVBoxLayout()
-        left_layout = QVBoxLayout()
-        middle_layout = QVBoxLayout()
-        right_layout = QVBoxLayout()
-
-        leftTextEdit = QTextEdit()
-        middleTextEdit = QTextEdit()
-        rightTextEdit = QTextEdit()
-        leftTextEdit.setAcceptRichText(False)
-        middleTextEdit.setAcceptRichText(False)
-        rightTextEdit.setAcceptRichText(False)
-
-        font = QFont()
-        font.setFamily(self.font_family)
-        font.setPointSize(11)
-        leftTextEdit.setFont(font)
-        middleTextEdit.setFont(font)
-        rightTextEdit.setFont(font)
-
-        leftTextEdit.setText(left_content if isinstance(left_content, str) else "")
-        middleTextEdit.setText(middle_content if isinstance(middle_content, str) else "")
-        rightTextEdit.setText(right_content if isinstance(right_content, str) else "")
-
-        leftTextEdit.setToolTip('此文字框內容的前幾個字元會用於更新分頁標題')
-        middleTextEdit.setToolTip('中間文字框')
-        rightTextEdit.setToolTip('右側文字框')
-
-        scrollbar_style = """
-        QScrollBar:vertical {
-            background: transparent;
-            width: 12px;
-            margin: 0px 0px 0px 0px;
-        }
-        QScrollBar::handle:vertical {
-            background: #e0e0e0;
-            min-height: 20px;
-        }
-        QScrollBar::add-line:vertical {
-            background: none;
-            height: 0px;
-        }
-        QScrollBar::sub-line:vertical {
-            background: none;
-            height: 0px;
-        }
-        QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {
-            background: none;
-        }
-        QScrollBar:horizontal {
-            background: transparent;
-            height: 12px;
-            margin: 0px 0px 0px 0px;
-        }
-        QScrollBar::handle:horizontal {
-            background: #e0e0e0;
-            min-width: 20px;
-        }
-        QScrollBar::add-line:horizontal {
-            background: none;
-            width: 0px;
-        }
-        QScrollBar::sub-line:horizontal {
-            background: none;
-            width: 0px;
-        }
-        QScrollBar::add-page:horizontal, QScrollBar::sub-page:horizontal {
-            background: none;
-        }
-        """
+        new_tab.pending_contents = None
+        new_tab.dirty_panes = set()
+        if tab_id is None:
+            # 新分頁尚未存在於資料庫，三個文字框都需要寫入
+            tab_id = self.store.allocate_tab_id()
+            new_tab.dirty_panes.update(range(3))
+        new_tab.tab_id = tab_id
+        self.build_tab_panes(new_tab, left_content, middle_content, right_content)
+        self.tabs.addTab(new_tab, title)
+        # 填入內容時分頁尚未就緒，文字框的修改不會經過索引，需另外通知
+        for pane in range(3):
+            self.search_index.pane_replaced(new_tab, pane)
+        self.mark_session_dirty(structure=True)
 
-        text_edit_style = """
-            QTextEdit {
-                border: 1px solid #d3d3d3;
-                background-color: white;
-                padding: 5px;
-            }
-        """ + scrollbar_style
-
-        leftTextEdit.setStyleSheet(text_edit_style)
-        middleTextEdit.setStyleSheet(text_edit_style)
-        rightTextEdit.setStyleSheet(text_edit_style)
-
-        left_word_count_label = QLabel("字數: 0")
-        middle_word_count_label = QLabel("字數: 0")
-        right_word_count_label = QLabel("字數: 0")
-        word_count_font = QFont()
-        word_count_font.setFamily(self.font_family)
-        word_count_font.setPointSize(10)
-        left_word_count_label.setFont(word_count_font)
-        middle_word_count_label.setFont(word_count_font)
-        right_word_count_label.setFont(word_count_font)
-
-        leftTextEdit.textChanged.connect(lambda: self.update_word_count(leftTextEdit, left_word_count_label))
-        middleTextEdit.textChanged.connect(lambda: self.update_word_count(middleTextEdit, middle_word_count_label))
-        rightTextEdit.textChanged.connect(lambda: self.update_word_count(rightTextEdit, right_word_count_label))
+    def add_lazy_tab(self, tab_id, title="New Tab"):
+        """只加入分頁標題，文字內容留待需要時才從資料庫讀取，文字框留待分頁首次被切換到時才建立"""
+        new_tab = QWidget()
+        new_tab.tab_id = tab_id
+        # None 表示內容仍在資料庫中
+        new_tab.pending_contents = [None, None, None]
+        new_tab.dirty_panes = set()
+        self.tabs.addTab(new_tab, title)
 
-        button_style = """
-            QPushButton {
-                border: none;
-                background-color: #f0f0f0;
-                padding: 8px;
-            }
-            QPushButton:hover {
-                background-color: #e0e0e0;
-            }
+    def materialize_tab(self, tab):
+        """為延遲載入的分頁建立文字框並填入內容"""
+        if tab.pending_contents is None:
+            return
+        left_content, middle_content, right_content = self.get_tab_contents(tab)
+        tab.pending_contents = None
+        self.build_tab_panes(tab, left_content, middle_content, right_content)
+
+    def on_current_tab_changed(self, index):
+        if index >= 0:
+            tab = self.tabs.widget(index)
+            self.materialize_tab(tab)
+            tab.last_used = time.monotonic()
+            self.hibernate_timer.start()
+
+    def estimate_tab_memory(self, tab):
+        """以字元數與段落數估計分頁三個文字框佔用的記憶體（位元組），不需掃描內容"""
+        return sum(document.characterCount() * DOCUMENT_BYTES_PER_CHARACTER
+                   + document.blockCount() * DOCUMENT_BYTES_PER_BLOCK
+                   for document in (text_edit.document() for text_edit in tab.pane_container.text_edits))
+
+    def can_hibernate(self, tab):
+        if tab.pending_contents is not None or tab is self.tabs.currentWidget():
+            return False
+        text_edits = tab.pane_container.text_edits
+        if any(not text_edit.document().isUndoRedoEnabled() for text_edit in text_edits):
+            return False  # 正在分段載入檔案
+        return not any(dialog.isVisible() and dialog.text_edit in text_edits
+                       for dialog in self.findChildren(FindReplaceDialog))
+
+    def enforce_tab_memory_budget(self):
+        """已建立文字框的分頁超過記憶體預算時，從最久未使用的分頁開始休眠"""
+        budget = self.settings['tab_memory_budget'] * 1024 * 1024
+        if budget <= 0:
+            return
+        tabs = [tab for tab in self.iter_tabs() if tab.pending_contents is None]
+        usage = {tab: self.estimate_tab_memory(tab) for tab in tabs}
+        total = sum(usage.values())
+        for tab in sorted(tabs, key=lambda tab: tab.last_used):
+            if total <= budget:
+                break
+            if self.can_hibernate(tab):
+                self.hibernate_tab(tab)
+                total -= usage[tab]
+
+    def hibernate_tab(self, tab):
+        """將分頁收回為延遲載入的形式並釋放文字框，切換回來時再重新建立（復原記錄不保留）
+
+        有未寫入修改的文字框保留純文字，自動儲存寫入後即釋放；其餘文字框的內容留在資料庫中。
         """
+        writing = {pane for written, pane in self.autosave_pending[3] if written is tab} if self.autosave_pending else set()
+        contents = [self.get_pane_content(tab, pane) if pane in tab.dirty_panes or pane in writing else None
+                    for pane in range(3)]
+        self.release_tab_panes(tab)
+        del tab.leftTextEdit, tab.middleTextEdit, tab.rightTextEdit
+        tab.pending_contents = contents
 
-        left_save_button = QPushButton("將左框文字另存新檔")
-        middle_save_button = QPushButton("將中框文字另存新檔")
-        right_save_button = QPushButton("將右框文字另存新檔")
-        left_save_button.setMinimumWidth(200)
-        middle_save_button.setMinimumWidth(200)
-        right_save_button.setMinimumWidth(200)
-        left_save_button.setMaximumWidth(300)
-        middle_save_button.setMaximumWidth(300)
-        right_save_button.setMaximumWidth(300)
-        
-        button_font = QFont()
-        button_font.setFamily(self.font_family)
-        button_font.setPointSize(10)
-        left_save_button.setFont(button_font)
-        middle_save_button.setFont(button_font)
-        right_save_button.setFont(button_font)
-        
-        left_save_button.setStyleSheet(button_style)
-        middle_save_button.setStyleSheet(button_style)
-        right_save_button.setStyleSheet(button_style)
-        
-        left_save_button.clicked.connect(lambda: self.save_file(leftTextEdit))
-        middle_save_button.clicked.connect(lambda: self.save_file(middleTextEdit))
-        right_save_button.clicked.connect(lambda: self.save_file(rightTextEdit))
-        
-        left_save_button.setToolTip('將左側文字框的內容另存為檔案')
-        middle_save_button.setToolTip('將中間文字框的內容另存為檔案')
-        right_save_button.setToolTip('將右側文字框的內容另存為檔案')
+    def iter_tabs(self):
+        for index in range(self.tabs.count()):
+            yield self.tabs.widget(index)
 
-        left_layout.addWidget(leftTextEdit)
-        left_layout.addWidget(left_word_count_label)
-        left_layout.addWidget(left_save_button, alignment=Qt.AlignCenter)
+    def get_tab_contents(self, tab):
+        """取得分頁三個文字框的內容，不會因此建立延遲載入的分頁"""
+        if tab.pending_contents is not None and None in tab.pending_contents:
+            stored = self.store.load_tab_contents(tab.tab_id)
+            return [stored[pane] if content is None else content
+                    for pane, content in enumerate(tab.pending_contents)]
+        return [self.get_pane_content(tab, pane) for pane in range(3)]
 
-        middle_layout.addWidget(middleTextEdit)
-        middle_layout.addWidget(middle_word_count_label)
-        middle_layout.addWidget(middle_save_button, alignment=Qt.AlignCenter)
+    def get_pane_content(self, tab, pane):
+        if tab.pending_contents is not None:
+            content = tab.pending_contents[pane]
+            return self.store.load_pane(tab.tab_id, pane) if content is None else content
+        return (tab.leftTextEdit, tab.middleTextEdit, tab.rightTextEdit)[pane].toPlainText()
 
-        right_layout.addWidget(rightTextEdit)
-        right_layout.addWidget(right_word_count_label)
-        right_layout.addWidget(right_save_button, alignment=Qt.AlignCenter)
+    def create_pane_container(self):
+        """建立一組三框文字區與按鈕；容器可在分頁關閉後回收，供下一個分頁重複使用"""
+        container = QWidget()
+        container.setObjectName('paneContainer')
+        container.tab = None
+        slot = self.instrumentation.slot
 
+        tab_layout = QVBoxLayout()
         text_layout = QHBoxLayout()
-        text_layout.addLayout(left_layout)
-        text_layout.addLayout(middle_layout)
-        text_layout.addLayout(right_layout)
+        text_edits = []
+        labels = []
+        pane_layouts = []
+        for pane, name in enumerate(PANE_NAMES):
+            text_edit = self.create_pane_text_edit(container, pane)
+
+            label = QLabel("字數: 0")
+            label.setFont(self.label_font)
+
+            open_button = QPushButton(f"開啟檔案至{name}")
+            open_button.setMinimumWidth(150)
+            open_button.setMaximumWidth(300)
+            open_button.setFont(self.button_font)
+            # 文字框可能因切換大型文件模式而更換，一律透過 container.text_edits 取得
+            open_button.clicked.connect(slot('open_file', lambda checked=False, pane=pane: self.open_file(text_edits[pane])))
+            open_button.setToolTip(f'開啟文字檔並取代{PANE_DESCRIPTIONS[pane]}的內容')
+
+            save_button = QPushButton(f"將{name}文字另存新檔")
+            save_button.setMinimumWidth(200)
+            save_button.setMaximumWidth(300)
+            save_button.setFont(self.button_font)
+            save_button.clicked.connect(slot('save_file', lambda checked=False, pane=pane: self.save_file(text_edits[pane])))
+            save_button.setToolTip(f'將{PANE_DESCRIPTIONS[pane]}的內容另存為檔案')
+
+            button_layout = QHBoxLayout()
+            button_layout.addWidget(open_button)
+            button_layout.addWidget(save_button)
+
+            pane_layout = QVBoxLayout()
+            pane_layout.addWidget(text_edit)
+            pane_layout.addWidget(label)
+            pane_layout.addLayout(button_layout)
+            text_layout.addLayout(pane_layout)
+
+            text_edits.append(text_edit)
+            labels.append(label)
+            pane_layouts.append(pane_layout)
 
         clear_button = QPushButton('清除當前分頁中所有文本')
         clear_button.setMinimumWidth(250)
-        clear_button.setFont(button_font)
-        clear_button.setStyleSheet(button_style)
-        clear_button.clicked.connect(lambda: self.clear_text([leftTextEdit, middleTextEdit, rightTextEdit]))
+        clear_button.setFont(self.button_font)
+        clear_button.clicked.connect(slot('clear_text', lambda: self.clear_text(text_edits)))
         clear_button.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
         clear_button.setToolTip('點擊以清除當前分頁的三個文字框內容，不影響其他分頁')
 
+        compare_button = QPushButton('比較三框差異')
+        compare_button.setCheckable(True)
+        compare_button.setMinimumWidth(150)
+        compare_button.setFont(self.button_font)
+        compare_button.toggled.connect(slot('set_compare_mode', lambda checked: self.set_compare_mode(container, checked)))
+        compare_button.setToolTip('標示左框與中框、中框與右框之間不同的行與字元')
+
+        sync_button = QPushButton('同步捲動')
+        sync_button.setCheckable(True)
+        sync_button.setMinimumWidth(150)
+        sync_button.setFont(self.button_font)
+        sync_button.toggled.connect(slot('set_scroll_sync', lambda checked: self.set_scroll_sync(container, checked)))
+        sync_button.setToolTip('捲動任一文字框時，其他文字框跟著捲到對應的行；比較模式下依差異對齊')
+
+        bottom_layout = QHBoxLayout()
+        bottom_layout.addStretch()
+        bottom_layout.addWidget(clear_button)
+        bottom_layout.addWidget(compare_button)
+        bottom_layout.addWidget(sync_button)
+        bottom_layout.addStretch()
+
         tab_layout.addLayout(text_layout)
-        tab_layout.addWidget(clear_button, alignment=Qt.AlignCenter)
+        tab_layout.addLayout(bottom_layout)
+        container.setLayout(tab_layout)
 
-        new_tab.setLayout(tab_layout)
-        self.tabs.addTab(new_tab, title)
+        container.leftTextEdit, container.middleTextEdit, container.rightTextEdit = text_edits
+        container.text_edits = text_edits
+        container.labels = labels
+        container.pane_layouts = pane_layouts
+        container.compare_button = compare_button
+        container.comparison = None
+        container.sync_button = sync_button
+        container.scroll_sync = None
+        return container
 
-        new_tab.leftTextEdit = leftTextEdit
-        new_tab.middleTextEdit = middleTextEdit
-        new_tab.rightTextEdit = rightTextEdit
+    def create_pane_text_edit(self, container, pane, large=False):
+        """建立容器中第 pane 個文字框並連接統計、修改通知與快捷鍵；large 為大型文件模式"""
+        slot = self.instrumentation.slot
+        if large:
+            text_edit = LargeTextEdit()
+        else:
+            text_edit = PaneTextEdit()
+            text_edit.setAcceptRichText(False)
+        text_edit.pane_container = container
+        text_edit.pane = pane
+        text_edit.paste_handler = self.paste_in_chunks
+        text_edit.selection_layers = {}
+        text_edit.setFont(self.text_font)
+        text_edit.setToolTip(PANE_TOOLTIPS[pane])
+
+        text_edit.stats = TextStatistics(text_edit.document(), self.settings['stats_update_delay'])
+        text_edit.undo_history = UndoHistory(text_edit.document())
+        text_edit.undo_history.grown.connect(self.undo_budget_timer.start)
+        text_edit.stats.changed.connect(slot(
+            'update_word_count', lambda: self.update_word_count(text_edit, container.labels[pane])))
 
-        leftTextEdit.textChanged.connect(lambda: self.update_tab_title(leftTextEdit))
+        # 分頁會更換，處理函式一律透過 container.tab 取得目前所屬的分頁；
+        # 分段貼上期間暫停（bulk_editing），貼上結束後才對整段修改處理一次
+        text_edit.bulk_editing = False
+        text_edit.document().contentsChange.connect(slot(
+            'on_pane_contents_change',
+            lambda position, removed, added, document=text_edit.document():
+                text_edit.bulk_editing or
+                self.on_pane_contents_change(container.tab, pane, document, position, removed, added)))
+        if pane == 0:
+            text_edit.document().contentsChange.connect(slot(
+                'update_tab_title',
+                lambda position, removed, added:
+                    text_edit.bulk_editing or self.update_tab_title(container.tab, position)))
 
         # 為所有文字框添加搜尋和替換快捷鍵
-        for text_edit in [leftTextEdit, middleTextEdit, rightTextEdit]:
-            search_shortcut = QShortcut(QKeySequence("Ctrl+F"), text_edit, context=Qt.WidgetShortcut)
-            search_shortcut.activated.connect(lambda te=text_edit: self.open_find_dialog(te))
-            
-            replace_shortcut = QShortcut(QKeySequence("Ctrl+H"), text_edit, context=Qt.WidgetShortcut)
-            replace_shortcut.activated.connect(lambda te=text_edit: self.open_find_dialog(te))
+        search_shortcut = QShortcut(QKeySequence("Ctrl+F"), text_edit, context=Qt.WidgetShortcut)
+        search_shortcut.activated.connect(slot('open_find_dialog', lambda: self.open_find_dialog(text_edit)))
+
+        replace_shortcut = QShortcut(QKeySequence("Ctrl+H"), text_edit, context=Qt.WidgetShortcut)
+        replace_shortcut.activated.connect(slot('open_find_dialog', lambda: self.open_find_dialog(text_edit)))
+
+        open_shortcut = QShortcut(QKeySequence("Ctrl+O"), text_edit, context=Qt.WidgetShortcut)
+        open_shortcut.activated.connect(slot('open_file', lambda: self.open_file(text_edit)))
+        return text_edit
+
+    def document_mode(self, length, longest):
+        """依文字長度與最長一行的長度決定文字框模式，回傳 (是否為大型文件模式, 是否有過長的行)"""
+        long_lines = 0 < self.settings['long_line_length'] < longest
+        return long_lines or 0 < self.settings['large_document_size'] * 1024 * 1024 < length, long_lines
+
+    def set_pane_mode(self, container, pane, large, long_lines=False):
+        """切換文字框為一般或大型文件模式，回傳目前的文字框
+
+        QTextEdit 會排版整份文件，大型文件改用只排版可見段落的 LargeTextEdit。
+        兩者無法共用文件，切換時以新的空白文字框取代，內容由呼叫端重新填入。
+        有過長的行時改為在任意字元處換行：沒有空白的長行依字詞邊界換行極慢，不換行則每次重繪都要排版整行。
+        """
+        text_edit = container.text_edits[pane]
+        if isinstance(text_edit, LargeTextEdit) != large:
+            text_edit = self.replace_pane_text_edit(container, pane, large)
+        if large:
+            text_edit.setLineWrapMode(QPlainTextEdit.WidgetWidth)
+            text_edit.setWordWrapMode(QTextOption.WrapAnywhere if long_lines else QTextOption.WrapAtWordBoundaryOrAnywhere)
+        return text_edit
+
+    def replace_pane_text_edit(self, container, pane, large):
+        old = container.text_edits[pane]
+        text_edit = self.create_pane_text_edit(container, pane, large)
+        container.pane_layouts[pane].replaceWidget(old, text_edit)
+        container.text_edits[pane] = text_edit
+        setattr(container, PANE_ATTRIBUTES[pane], text_edit)
+        tab = container.tab
+        if tab is not None:
+            setattr(tab, PANE_ATTRIBUTES[pane], text_edit)
+            self.mark_pane_dirty(tab, pane)
+            self.search_index.pane_replaced(tab, pane)
+        for dialog in self.findChildren(FindReplaceDialog):
+            if dialog.text_edit is old:
+                dialog.text_edit = text_edit
+                dialog.update_highlights()
+        # 比較與同步捲動綁定在原本的文件上，重新開始
+        for button in (container.compare_button, container.sync_button):
+            if button.isChecked():
+                button.setChecked(False)
+                button.setChecked(True)
+        if old.hasFocus():
+            text_edit.setFocus()
+        old.deleteLater()
+        self.update_word_count(text_edit, container.labels[pane])
+        return text_edit
+
+    def set_pane_text(self, container, pane, content):
+        """依內容的大小與最長一行選擇文字框模式後填入內容，回傳文字框"""
+        line_limit = self.settings['long_line_length']
+        longest = longest_line(content)[0] if 0 < line_limit < len(content) else 0
+        text_edit = self.set_pane_mode(container, pane, *self.document_mode(len(content), longest))
+        text_edit.setPlainText(content)
+        self.update_word_count(text_edit, container.labels[pane])
+        return text_edit
+
+    def paste_in_chunks(self, text_edit, source):
+        """超過門檻的貼上改由事件迴圈分段插入並顯示進度，回傳是否已接手處理
+
+        整段貼上是一個復原步驟，取消時復原。只保留一份剪貼簿文字，每次複製一段插入；
+        字數統計、分頁標題、修改記錄與搜尋索引在結束時才對整段修改更新一次。貼上後超過大型文件門檻時，先將文字框切換為大型文件模式。
+        """
+        limit = self.settings['chunked_paste_size'] * 1024 * 1024
+        if limit <= 0 or not source.hasText():
+            return False
+        text = source.text()
+        if len(text) <= limit:
+            return False
+        container, pane = text_edit.pane_container, text_edit.pane
+        longest = tail = 0
+        for start in range(0, len(text), PASTE_CHUNK_SIZE):
+            chunk_longest, tail = longest_line(text[start:start + PASTE_CHUNK_SIZE], tail)
+            longest = max(longest, chunk_longest)
+        large, long_lines = self.document_mode(text_edit.document().characterCount() + len(text), longest)
+        cursor = text_edit.textCursor()
+        if large and not isinstance(text_edit, LargeTextEdit):
+            # 換成新的文字框，保留原有內容與選取範圍（原本的復原記錄無法保留）
+            anchor, position = cursor.anchor(), cursor.position()
+            existing = text_edit.toPlainText()
+            text_edit = self.set_pane_mode(container, pane, large, long_lines)
+            text_edit.setPlainText(existing)
+            del existing
+            cursor = text_edit.textCursor()
+            cursor.setPosition(anchor)
+            cursor.setPosition(position, QTextCursor.KeepAnchor)
+        elif long_lines:
+            self.set_pane_mode(container, pane, large, long_lines)
+
+        replaced = cursor.selection().toPlainText()
+        start = cursor.selectionStart()
+        text_edit.setReadOnly(True)
+        text_edit.stats.hold()
+        text_edit.bulk_editing = True
+        progress = QProgressDialog("正在貼上……", "取消", 0, len(text), self)
+        progress.setWindowTitle("貼上")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(300)
+        timer = QTimer(progress)
+        timer.setInterval(0)
+        done = 0
+
+        def finish(cancelled):
+            nonlocal text
+            timer.stop()
+            text = None
+            close_progress(progress)
+            if container.text_edits[pane] is not text_edit:
+                return  # 文字框已被取代
+            if cancelled and done:
+                # 移除已插入的部分並放回被取代的選取內容，與已插入的部分同屬一個復原步驟
+                cursor.joinPreviousEditBlock()
+                cursor.setPosition(start, QTextCursor.KeepAnchor)
+                cursor.insertText(replaced)
+                cursor.endEditBlock()
+            text_edit.setReadOnly(False)
+            text_edit.bulk_editing = False
+            text_edit.stats.release()
+            if done:
+                added = cursor.position() - start
+                self.on_pane_contents_change(container.tab, pane, text_edit.document(), start, len(replaced), added)
+                if pane == 0:
+                    self.update_tab_title(container.tab, start)
+            text_edit.setTextCursor(cursor)
+            text_edit.ensureCursorVisible()
+
+        def insert_chunk():
+            nonlocal done
+            if container.text_edits[pane] is not text_edit:
+                finish(True)
+                return
+            end = done + PASTE_CHUNK_SIZE
+            if text[end - 1:end] == '\r':
+                end += 1  # 不拆開 \r\n
+            # 第一段連同取代選取範圍自成一個復原步驟，其後各段併入同一步
+            if done:
+                cursor.joinPreviousEditBlock()
+            else:
+                cursor.beginEditBlock()
+                cursor.removeSelectedText()
+            cursor.insertText(text[done:end])
+            cursor.endEditBlock()
+            done = min(end, len(text))
+            if done >= len(text):
+                finish(False)
+                return
+            # 顯示後的強制回應進度對話框在 setValue 中會處理事件，可能再次進入本函式
+            progress.setValue(done)
+
+        timer.timeout.connect(self.instrumentation.slot('paste_chunk', insert_chunk))
+        progress.canceled.connect(lambda: finish(True))
+        timer.start()
+        return True
+
+    def build_tab_panes(self, new_tab, left_content, middle_content, right_content):
+        container = self.pane_pool.pop() if self.pane_pool else self.create_pane_container()
+        for pane, content in enumerate((left_content, middle_content, right_content)):
+            self.set_pane_text(container, pane, content if isinstance(content, str) else "")
+        # 填入內容後才綁定分頁，載入不會被當成修改
+        container.tab = new_tab
+
+        tab_layout = new_tab.layout()
+        if tab_layout is None:
+            tab_layout = QVBoxLayout(new_tab)
+            tab_layout.setContentsMargins(0, 0, 0, 0)
+        tab_layout.addWidget(container)
+
+        new_tab.pane_container = container
+        new_tab.leftTextEdit = container.leftTextEdit
+        new_tab.middleTextEdit = container.middleTextEdit
+        new_tab.rightTextEdit = container.rightTextEdit
+        new_tab.last_used = time.monotonic()
+        self.pane_pool_timer.start()
+        self.hibernate_timer.start()
+
+    def release_tab_panes(self, tab):
+        """將分頁的文字框容器清空後放回池中"""
+        container = getattr(tab, 'pane_container', None)
+        if container is None:
+            return
+        container.tab = None
+        tab.pane_container = None
+        container.compare_button.setChecked(False)
+        container.sync_button.setChecked(False)
+        tab.layout().removeWidget(container)
+        container.setParent(None)
+        if len(self.pane_pool) >= PANE_POOL_SIZE:
+            container.deleteLater()
+            return
+        for text_edit, label, tooltip in zip(container.text_edits, container.labels, PANE_TOOLTIPS):
+            text_edit.setPlainText("")  # 同時清除復原記錄
+            text_edit.document().setUndoRedoEnabled(True)
+            text_edit.setToolTip(tooltip)
+            self.update_word_count(text_edit, label)
+        self.pane_pool.append(container)
+
+    def set_compare_mode(self, container, enabled):
+        if enabled and container.comparison is None:
+            container.comparison = PaneComparison(container)
+        elif not enabled and container.comparison is not None:
+            container.comparison.stop()
+            container.comparison = None
+
+    def set_scroll_sync(self, container, enabled):
+        if enabled and container.scroll_sync is None:
+            container.scroll_sync = ScrollSync(container, self.instrumentation.slot)
+        elif not enabled and container.scroll_sync is not None:
+            container.scroll_sync.stop()
+            container.scroll_sync = None
+
+    def refill_pane_pool(self):
+        """閒置時預先建立文字框容器，每次只建立一個以免阻塞介面"""
+        if len(self.pane_pool) < PANE_POOL_SIZE:
+            self.pane_pool.append(self.create_pane_container())
+            self.pane_pool_timer.start()
+
+    def on_pane_contents_change(self, tab, pane, document, position, removed, added):
+        if tab is None:
+            return  # 池中待用的文字框
+        self.mark_pane_dirty(tab, pane)
+        self.search_index.on_contents_change(tab, pane, document, position, removed, added)
+
+    def open_quick_open(self):
+        QuickOpenDialog(self).exec_()
+
+    def open_snapshots(self):
+        dialog = SnapshotDialog(self)
+        dialog.exec_()
+        dialog.deleteLater()
+
+    def restore_snapshot_tab(self, title, contents):
+        self.add_new_tab(*contents, title=title)
+        self.tabs.setCurrentIndex(self.tabs.count() - 1)
+
+    def restore_snapshot_pane(self, tab_id, pane, content):
+        """以快照內容取代原分頁（已關閉時為目前分頁）的文字框；經由貼上的流程插入，可以復原"""
+        tab = next((tab for tab in self.iter_tabs() if tab.tab_id == tab_id), self.tabs.currentWidget())
+        self.take_snapshot('還原前')
+        self.tabs.setCurrentWidget(tab)
+        self.materialize_tab(tab)
+        text_edit = tab.pane_container.text_edits[pane]
+        text_edit.selectAll()
+        if content:
+            source = QMimeData()
+            source.setText(content)
+            text_edit.insertFromMimeData(source)
+        else:
+            text_edit.textCursor().removeSelectedText()
 
     def open_find_dialog(self, text_edit):
+        self.search_index.ensure_built()
         dialog = FindReplaceDialog(self, text_edit)
         dialog.show()
         dialog.raise_()
         dialog.activateWindow()
 
     def update_word_count(self, text_edit, label):
-        text = text_edit.toPlainText()
-        words = len(text.replace('\n', '').replace(' ', '').replace('\t', ''))
-        label.setText(f"字數: {words}")
-
-    def update_tab_title(self, text_edit):
-        tab_widget = text_edit.parent()
-        index = self.tabs.indexOf(tab_widget)
-        text = text_edit.toPlainText()
-        first_line = text.split('\n', 1)[0]
+        stats = text_edit.stats
+        large = isinstance(text_edit, LargeTextEdit)
+        label.setText(f"字數: {stats.non_whitespace}" + ("（大型文件模式）" if large else ""))
+        label.setToolTip(
+            f"字元: {stats.characters}\n非空白字元: {stats.non_whitespace}\n"
+            f"中日韓文字: {stats.cjk}\n行數: {stats.lines}\n詞數: {stats.words}\n"
+            f"復原記錄: {text_edit.undo_history.bytes / 1024 / 1024:.1f} MB"
+            + ("\n大型文件模式：只排版可見的段落，右鍵選單可切換自動換行" if large else "")
+        )
+
+    def iter_pane_widgets(self):
+        """所有已建立文字框的分頁中的 (文字框, 字數標籤)"""
+        for tab in self.iter_tabs():
+            if tab.pending_contents is None:
+                yield from zip(tab.pane_container.text_edits, tab.pane_container.labels)
+
+    def enforce_undo_budget(self):
+        """復原記錄超過單一文字框或全部文字框的預算時，從最久未修改的文字框開始清除
+
+        QTextDocument 只能整個清除復原記錄，無法只捨棄最舊的步驟。
+        """
+        pane_budget = self.settings['undo_pane_budget'] * 1024 * 1024
+        total_budget = self.settings['undo_total_budget'] * 1024 * 1024
+        panes = [(text_edit, label) for text_edit, label in self.iter_pane_widgets() if text_edit.undo_history.bytes]
+        total = sum(text_edit.undo_history.bytes for text_edit, _ in panes)
+        for text_edit, label in sorted(panes, key=lambda pane: pane[0].undo_history.last_edit):
+            history = text_edit.undo_history
+            if 0 < pane_budget < history.bytes or 0 < total_budget < total:
+                total -= history.bytes
+                history.clear()
+                self.update_word_count(text_edit, label)
+
+    def update_undo_memory_action(self):
+        total = sum(text_edit.undo_history.bytes for text_edit, _ in self.iter_pane_widgets())
+        self.undo_memory_action.setText(f"復原記錄：{total / 1024 / 1024:.1f} MB")
+
+    def update_tab_title(self, tab, position=0):
+        if tab is None:
+            return
+        first_block = tab.leftTextEdit.document().firstBlock()
+        if position >= first_block.length():
+            return  # 修改未觸及第一段，標題不變
+        index = self.tabs.indexOf(tab)
+        first_line = first_block.text().split('\u2028', 1)[0]
         tab_title = first_line.strip()[:10] if first_line.strip() else "New Tab"
-        self.tabs.setTabText(index, tab_title)
+        if self.tabs.tabText(index) != tab_title:
+            self.tabs.setTabText(index, tab_title)
+            self.quick_open_index.set_title(tab, tab_title)
+            self.mark_session_dirty(structure=True)
 
     def close_tab(self, index):
         if self.tabs.count() <= 1:
             return  # 如果只剩一個分頁，不允許關閉
             
         tab = self.tabs.widget(index)
-        left_text = tab.leftTextEdit.toPlainText().strip()
-        middle_text = tab.middleTextEdit.toPlainText().strip()
-        right_text = tab.rightTextEdit.toPlainText().strip()
+        left_text, middle_text, right_text = (
+            content.strip() for content in self.get_tab_contents(tab))
         
         if left_text == "" and middle_text == "" and right_text == "":
             # 如果三個文本框都為空，直接關閉
             self.tabs.removeTab(index)
+            self.search_index.remove_tab(tab)
+            self.release_tab_panes(tab)
+            tab.deleteLater()
+            self.mark_session_dirty(structure=True)
         else:
             reply = QMessageBox.question(
                 self, '關閉分頁', '確定要關閉這個分頁嗎？未保存的更改將會遺失。',
@@ -592,8 +3645,13 @@ class PlainTextEditor(QMainWindow):
             )
             if reply == QMessageBox.Yes:
                 self.tabs.removeTab(index)
+                self.search_index.remove_tab(tab)
+                self.release_tab_panes(tab)
+                tab.deleteLater()
+                self.mark_session_dirty(structure=True)
 
     def clear_text(self, text_edits):
+        self.take_snapshot('清除分頁前')
         for text_edit in text_edits:
             text_edit.clear()
 
@@ -603,14 +3661,255 @@ class PlainTextEditor(QMainWindow):
             self, "另存新檔", "", "Text Files (*.txt);;All Files (*)", options=options
         )
         if fileName:
-            encodings = ['UTF-8', 'UTF-16', 'GBK', 'Shift-JIS', 'ISO-8859-1']
-            encoding, ok = QInputDialog.getItem(self, "選擇編碼", "請選擇檔案編碼:", encodings, 0, False)
+            encoding, ok = QInputDialog.getItem(self, "選擇編碼", "請選擇檔案編碼:", ENCODINGS, 0, False)
             if ok and encoding:
-                try:
-                    with open(fileName, 'w', encoding=encoding) as file:
-                        file.write(text_edit.toPlainText())
-                except Exception as e:
-                    QMessageBox.warning(self, "保存失敗", f"保存文件時發生錯誤：{e}")
+                self.start_save_file(text_edit, fileName, encoding, text_edit.toPlainText())
+
+    def start_save_file(self, text_edit, fileName, encoding, text, errors='strict'):
+        """在背景編碼並寫入檔案；text 為儲存當下的內容快照，之後的編輯不影響寫入結果"""
+        progress = QProgressDialog(f"正在儲存 {os.path.basename(fileName)}……", "取消", 0, 0, self)
+        progress.setWindowTitle("另存新檔")
+        progress.setMinimumDuration(300)
+        worker = Worker(write_text_file, fileName, text, encoding, errors)
+
+        def update_progress(done, total):
+            progress.setMaximum(max(total, 1))
+            progress.setValue(min(done, total))
+
+        def finish(failures):
+            close_progress(progress)
+            if worker.cancelled:
+                return
+            if failures:
+                self.report_encoding_errors(text_edit, fileName, encoding, text, failures)
+            else:
+                self.tray_icon.showMessage(
+                    "已儲存", f"{os.path.basename(fileName)}（{encoding}）", QSystemTrayIcon.Information, 2000)
+
+        def fail(message):
+            close_progress(progress)
+            QMessageBox.warning(self, "保存失敗", f"保存文件時發生錯誤：{message}")
+
+        worker.signals.progress.connect(update_progress)
+        worker.signals.result.connect(finish)
+        worker.signals.error.connect(fail)
+        progress.canceled.connect(worker.cancel)
+        QThreadPool.globalInstance().start(worker)
+
+    def export_all_tabs(self):
+        """選擇分頁與文字框後，擷取當下的內容在背景匯出"""
+        dialog = ExportDialog(self)
+        accepted = dialog.exec_() == QDialog.Accepted
+        dialog.deleteLater()
+        if not accepted:
+            return
+        rows = set(dialog.selected_tabs())
+        panes = dialog.selected_panes()
+        names = ExportNames()
+        items = []
+        for index, tab in enumerate(self.iter_tabs()):
+            # 檔名依分頁在全部分頁中的順序編號，只匯出部分分頁時編號與全部匯出時相同
+            tab_names = names.tab_names(index + 1, self.tabs.tabText(index))
+            if index not in rows:
+                continue
+            for pane in panes:
+                # 休眠或尚未建立的分頁，內容仍在資料庫中的文字框在背景讀取
+                content = tab.pending_contents[pane] if tab.pending_contents is not None else self.get_pane_content(tab, pane)
+                items.append((tab_names[pane], (tab.tab_id, pane), content))
+        if items:
+            errors = 'replace' if dialog.replace_checkbox.isChecked() else 'strict'
+            self.start_export(items, dialog.target, dialog.encoding_combo.currentText(), errors)
+
+    def start_export(self, items, target, encoding, errors='strict'):
+        progress = QProgressDialog(f"正在匯出到 {os.path.basename(target)}……", "取消", 0, len(items), self)
+        progress.setWindowTitle("匯出所有分頁")
+        progress.setMinimumDuration(300)
+        worker = Worker(export_panes, items, target, encoding, errors, self.store.path)
+
+        def finish(result):
+            close_progress(progress)
+            exported = len(result['exported'])
+            if worker.cancelled:
+                self.tray_icon.showMessage(
+                    "已取消匯出", f"已寫入 {exported} 個檔案" if os.path.isdir(target) else "未產生壓縮檔",
+                    QSystemTrayIcon.Information, 2000)
+            elif result['failures']:
+                listed = '\n'.join(
+                    f"{name}：{len(failures)}{'+' if len(failures) >= MAX_ENCODING_ERRORS else ''} 處，"
+                    f"第一處在第 {failures[0][1]} 行第 {failures[0][2]} 欄（{failures[0][3]!r}）"
+                    for name, failures in result['failures'][:20])
+                more = f"\n……共 {len(result['failures'])} 個檔案" if len(result['failures']) > 20 else ''
+                QMessageBox.warning(
+                    self, "部分檔案未匯出",
+                    f"已匯出 {exported} 個檔案到 {target}。\n以下文字框有無法以 {encoding} 編碼的字元，未寫入：\n{listed}{more}")
+            else:
+                self.tray_icon.showMessage(
+                    "已匯出", f"{exported} 個檔案（{encoding}）到 {os.path.basename(target)}",
+                    QSystemTrayIcon.Information, 2000)
+
+        def fail(message):
+            close_progress(progress)
+            QMessageBox.warning(self, "匯出失敗", f"匯出時發生錯誤：{message}")
+
+        worker.signals.progress.connect(lambda done, total: progress.setValue(done))
+        worker.signals.result.connect(finish)
+        worker.signals.error.connect(fail)
+        progress.canceled.connect(worker.cancel)
+        QThreadPool.globalInstance().start(worker)
+
+    def report_encoding_errors(self, text_edit, fileName, encoding, text, failures):
+        """列出無法編碼的字元位置，可改以「?」取代後儲存，或跳到第一個字元"""
+        listed = '\n'.join(
+            f'第 {line} 行第 {column} 欄（位置 {offset}）：{char!r}'
+            for offset, line, column, char in failures[:20]
+        )
+        more = f'\n……共 {len(failures)}{"+" if len(failures) >= MAX_ENCODING_ERRORS else ""} 處' if len(failures) > 20 else ''
+        box = QMessageBox(QMessageBox.Warning, "無法編碼",
+                          f"以下字元無法以 {encoding} 編碼，檔案未寫入：\n{listed}{more}", parent=self)
+        replace_button = box.addButton("以「?」取代後儲存", QMessageBox.AcceptRole)
+        jump_button = box.addButton("跳到第一處", QMessageBox.ActionRole)
+        box.addButton("取消", QMessageBox.RejectRole)
+        box.exec_()
+        if box.clickedButton() == replace_button:
+            self.start_save_file(text_edit, fileName, encoding, text, errors='replace')
+        elif box.clickedButton() == jump_button and text_edit.toPlainText() == text:
+            offset, _, _, char = failures[0]
+            positions = PositionMap(text)
+            cursor = QTextCursor(text_edit.document())
+            cursor.setPosition(positions.to_document(offset))
+            cursor.setPosition(positions.to_document(offset + len(char)), QTextCursor.KeepAnchor)
+            text_edit.setFocus()
+            text_edit.setTextCursor(cursor)
+
+    def open_file(self, text_edit):
+        fileName, _ = QFileDialog.getOpenFileName(
+            self, "開啟檔案", "", "Text Files (*.txt);;All Files (*)"
+        )
+        if not fileName:
+            return
+        if text_edit.document().characterCount() > 1:
+            reply = QMessageBox.question(
+                self, '開啟檔案', '開啟檔案會取代此文字框目前的內容，確定要繼續嗎？',
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+        self.load_file(text_edit, fileName)
+
+    def load_file(self, text_edit, fileName):
+        """在背景讀取檔案，分段取代文字框的內容
+
+        依檔案大小決定是否使用大型文件模式；讀到超過長度上限的一行時，改用大型文件模式並在任意字元處換行。
+        """
+        container, pane = text_edit.pane_container, text_edit.pane
+        try:
+            size = os.path.getsize(fileName)
+        except OSError:
+            size = 0  # 由背景讀取回報錯誤
+        text_edit = self.set_pane_mode(container, pane, self.document_mode(size, 0)[0])
+        document = text_edit.document()
+        text_edit.clear()
+        # 分段插入不需要復原記錄，完成後重新啟用
+        document.setUndoRedoEnabled(False)
+        credits = threading.Semaphore(4)
+        progress = QProgressDialog(f"正在開啟 {os.path.basename(fileName)}……", "取消", 0, 0, self)
+        progress.setWindowTitle("開啟檔案")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(300)
+
+        tail = 0
+
+        def append_chunk(text):
+            nonlocal text_edit, document, tail
+            longest, tail = longest_line(text, tail)
+            large, long_lines = self.document_mode(0, longest)
+            if long_lines and not (isinstance(text_edit, LargeTextEdit) and text_edit.wordWrapMode() == QTextOption.WrapAnywhere):
+                loaded = document.toPlainText()
+                text_edit = self.set_pane_mode(container, pane, large, long_lines)
+                if text_edit.document() is not document:
+                    document = text_edit.document()
+                    document.setUndoRedoEnabled(False)
+                    text_edit.setPlainText(loaded)
+            cursor = QTextCursor(document)
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text)
+            credits.release()
+
+        def update_progress(done, total):
+            progress.setMaximum(max(total, 1))
+            progress.setValue(min(done, total))
+
+        def finish(result):
+            encoding, undecodable = result
+            document.setUndoRedoEnabled(True)
+            close_progress(progress)
+            text_edit.setToolTip(f'{os.path.basename(fileName)}（{encoding}）')
+            if undecodable:
+                QMessageBox.warning(
+                    self, "開啟檔案",
+                    f"檔案中有 {undecodable} 個位元組無法以 {encoding} 解碼，已顯示為 \ufffd；"
+                    "儲存時這些位元組無法還原。")
+
+        def fail(message):
+            document.setUndoRedoEnabled(True)
+            close_progress(progress)
+            QMessageBox.warning(self, "開啟失敗", f"開啟文件時發生錯誤：{message}")
+
+        worker = Worker(read_text_file, fileName, credits)
+        worker.signals.partial.connect(append_chunk)
+        worker.signals.progress.connect(update_progress)
+        worker.signals.result.connect(finish)
+        worker.signals.error.connect(fail)
+        progress.canceled.connect(worker.cancel)
+        QThreadPool.globalInstance().start(worker)
+
+    def start_instance_server(self, server):
+        """接收之後啟動的程式轉交的請求；server 為建立視窗前以 claim_instance_server 佔用名稱的 QLocalServer"""
+        self.instance_server = server
+        server.setParent(self)
+        server.newConnection.connect(self.accept_instance_connection)
+        # 建立視窗期間連入的請求已在等待
+        self.accept_instance_connection()
+
+    def accept_instance_connection(self):
+        while self.instance_server.hasPendingConnections():
+            socket = self.instance_server.nextPendingConnection()
+            socket.request = b''
+            socket.readyRead.connect(self.instrumentation.slot(
+                'read_instance_request', lambda socket=socket: self.read_instance_request(socket)))
+            socket.disconnected.connect(socket.deleteLater)
+
+    def read_instance_request(self, socket):
+        socket.request += bytes(socket.readAll())
+        if not socket.request.endswith(b'\n'):
+            return  # 請求以換行結束，尚未收完
+        socket.write(b'ok\n')
+        socket.flush()
+        try:
+            request = json.loads(socket.request)
+        except ValueError:
+            return
+        self.handle_instance_request(request)
+
+    def handle_instance_request(self, request):
+        """在新分頁中開啟轉交的檔案或貼上文字，並將視窗帶到最前面"""
+        for path in request.get('files', []):
+            self.load_file(self.take_blank_tab().leftTextEdit, path)
+        if request.get('paste'):
+            self.set_pane_text(self.take_blank_tab().pane_container, 0, request['paste'])
+        self.show()
+        self.setWindowState(self.windowState() & ~Qt.WindowMinimized)
+        self.raise_()
+        self.activateWindow()
+
+    def take_blank_tab(self):
+        """目前的分頁完全空白時直接使用，否則新增一個分頁；切換到該分頁後回傳"""
+        tab = self.tabs.currentWidget()
+        if tab is None or tab.pending_contents is not None or any(self.get_tab_contents(tab)):
+            self.add_new_tab()
+            tab = self.tabs.widget(self.tabs.count() - 1)
+        self.tabs.setCurrentWidget(tab)
+        return tab
 
     def center(self):
         screen = QApplication.primaryScreen()
@@ -620,44 +3919,157 @@ class PlainTextEditor(QMainWindow):
         self.move(x, y)
 
     def load_tabs(self):
-        if os.path.exists(self.saved_data):
-            with open(self.saved_data, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                for tab in data.get('tabs', []):
-                    left_content = tab.get('left_content', '')
-                    middle_content = tab.get('middle_content', '')
-                    right_content = tab.get('right_content', '')
-                    title = tab.get('title', 'New Tab')
-                    self.add_new_tab(left_content, middle_content, right_content, title)
-            if self.tabs.count() == 0:
-                self.add_new_tab()
-        else:
+        self.store = SessionStore(self.session_path, legacy_path=self.saved_data)
+        self.settings.update(self.store.load_settings())
+        for tab_id, title in self.store.load_tab_list():
+            if self.settings['lazy_restore']:
+                self.add_lazy_tab(tab_id, title)
+            else:
+                left_content, middle_content, right_content = self.store.load_tab_contents(tab_id)
+                self.add_new_tab(left_content, middle_content, right_content, title, tab_id=tab_id)
+        if self.tabs.count() == 0:
             self.add_new_tab()
+        else:
+            # 載入本身不算修改
+            self.dirty_since = None
+            self.structure_dirty = False
 
-    def save_tabs(self):
-        data = {
-            'tabs': []
-        }
+    def init_autosave(self):
+        self.dirty_since = None  # 最早一筆尚未寫入的修改時間
+        self.structure_dirty = False  # 分頁的新增、關閉、順序或標題是否有變動
+        self.autosave_pending = None  # 正在背景寫入的 (修改時間, 擷取耗時, 是否包含分頁結構, 已擷取的修改)
+        self.autosave_stats = {}
+        # 單一執行緒，確保寫入與快照依序完成
+        self.autosave_pool = QThreadPool(self)
+        self.autosave_pool.setMaxThreadCount(1)
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.instrumentation.slot('autosave', self.autosave))
+        self.autosave_idle_timer = QTimer(self)
+        self.autosave_idle_timer.setSingleShot(True)
+        self.autosave_idle_timer.timeout.connect(self.instrumentation.slot('autosave', self.autosave))
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.timeout.connect(self.instrumentation.slot('take_snapshot', lambda: self.take_snapshot('定期快照')))
+
+    def apply_autosave_settings(self):
+        self.autosave_timer.stop()
+        if self.settings['autosave_interval'] > 0:
+            self.autosave_timer.start(self.settings['autosave_interval'])
+        self.autosave_idle_timer.setInterval(self.settings['autosave_idle_delay'])
+        self.snapshot_timer.stop()
+        if self.settings['snapshot_interval'] > 0:
+            self.snapshot_timer.start(self.settings['snapshot_interval'])
+
+    def mark_pane_dirty(self, tab, pane):
+        tab.dirty_panes.add(pane)
+        self.quick_open_index.pane_changed(tab, pane)
+        self.mark_session_dirty()
+
+    def mark_session_dirty(self, structure=False):
+        if structure:
+            self.structure_dirty = True
+        if self.dirty_since is None:
+            self.dirty_since = time.perf_counter()
+        if self.settings['autosave_idle_delay'] > 0:
+            self.autosave_idle_timer.start()
+
+    def snapshot_session(self):
+        """只讀取有修改的文字框；分頁結構有變動時才附上分頁順序與標題
+
+        回傳 (分頁清單或 None, 文字框更新, 已擷取的修改)，已擷取的修改在寫入失敗時用來重新標記。
+        """
+        tabs = [] if self.structure_dirty else None
+        panes = []
+        taken = []
         for index in range(self.tabs.count()):
             tab = self.tabs.widget(index)
-            left_text_edit = tab.leftTextEdit
-            middle_text_edit = tab.middleTextEdit
-            right_text_edit = tab.rightTextEdit
-            data['tabs'].append({
-                'left_content': left_text_edit.toPlainText(),
-                'middle_content': middle_text_edit.toPlainText(),
-                'right_content': right_text_edit.toPlainText(),
-                'title': self.tabs.tabText(index)
-            })
-        with open(self.saved_data, 'w', encoding='utf-8') as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
+            if tabs is not None:
+                tabs.append((tab.tab_id, self.tabs.tabText(index)))
+            for pane in tab.dirty_panes:
+                panes.append((tab.tab_id, pane, self.get_pane_content(tab, pane)))
+                taken.append((tab, pane))
+            tab.dirty_panes.clear()
+        self.structure_dirty = False
+        return tabs, panes, taken
+
+    def autosave(self):
+        if self.dirty_since is None or self.autosave_pending is not None:
+            return  # 沒有修改，或上一次寫入尚未完成（完成後會再檢查）
+        start = time.perf_counter()
+        tabs, panes, taken = self.snapshot_session()
+        snapshot_ms = (time.perf_counter() - start) * 1000
+        self.autosave_pending = (self.dirty_since, snapshot_ms, tabs is not None, taken)
+        self.dirty_since = None
+        worker = Worker(self.store.write, tabs, panes, dict(self.settings))
+        worker.signals.result.connect(self.instrumentation.slot('on_autosave_finished', self.on_autosave_finished))
+        worker.signals.error.connect(self.on_autosave_failed)
+        self.autosave_pool.start(worker)
+
+    def take_snapshot(self, label):
+        """在背景建立快照；尚未寫入的修改在此擷取並附上，不必等自動儲存"""
+        tabs = None
+        if self.structure_dirty:
+            tabs = [(tab.tab_id, self.tabs.tabText(index)) for index, tab in enumerate(self.iter_tabs())]
+        panes = [(tab.tab_id, pane, self.get_pane_content(tab, pane))
+                 for tab in self.iter_tabs() for pane in tab.dirty_panes]
+        # 與自動儲存使用同一個單執行緒的執行緒池，快照一定在寫入中的修改完成之後建立
+        worker = Worker(self.store.take_snapshot, label, self.settings['snapshot_budget'] * 1024 * 1024, tabs, panes)
+        worker.signals.error.connect(self.on_snapshot_failed)
+        self.autosave_pool.start(worker)
+
+    def on_snapshot_failed(self, message):
+        self.tray_icon.setToolTip(f"建立快照失敗：{message}")
+
+    def on_autosave_finished(self, write_ms):
+        dirty_since, snapshot_ms, _, taken = self.autosave_pending
+        snapshotted = len(taken)
+        self.autosave_pending = None
+        for tab, pane in taken:
+            if tab.pending_contents is not None and pane not in tab.dirty_panes:
+                # 休眠或尚未建立的分頁，內容已寫入資料庫，不必再留在記憶體中
+                tab.pending_contents[pane] = None
+        self.autosave_stats = {
+            'panes': snapshotted,
+            'snapshot_ms': snapshot_ms,
+            'write_ms': write_ms,
+            'latency_ms': (time.perf_counter() - dirty_since) * 1000,
+            'saved_at': time.time(),
+        }
+        self.tray_icon.setToolTip(
+            f"上次自動儲存：{time.strftime('%H:%M:%S')}"
+            f"（{snapshotted} 個文字框，擷取 {snapshot_ms:.1f} ms，寫入 {write_ms:.1f} ms）"
+        )
+        if self.dirty_since is not None and not self.autosave_idle_timer.isActive():
+            self.autosave()
+
+    def on_autosave_failed(self, message):
+        # 交易已回滾，重新標記這次擷取的修改，下次再寫入
+        dirty_since, _, structure, taken = self.autosave_pending
+        self.autosave_pending = None
+        for tab, pane in taken:
+            tab.dirty_panes.add(pane)
+        if structure:
+            self.structure_dirty = True
+        if self.dirty_since is None or dirty_since < self.dirty_since:
+            self.dirty_since = dirty_since
+        self.tray_icon.setToolTip(f"自動儲存失敗：{message}")
+
+    def save_tabs(self):
+        self.autosave_timer.stop()
+        self.autosave_idle_timer.stop()
+        self.autosave_pool.waitForDone()
+        if self.autosave_pending is not None:
+            # 背景寫入的結果訊號尚未處理，視同失敗以便一併重寫
+            self.on_autosave_failed('')
+        tabs, panes, _ = self.snapshot_session()
+        self.store.write(tabs, panes, dict(self.settings))
+        self.dirty_since = None
 
     def closeEvent(self, event):
         if self.tray_icon.isVisible():
             self.hide()
             event.ignore()
         else:
-            self.save_tabs()
+            self.save_tabs_on_exit()
             event.accept()
 
     def tray_icon_activated(self, reason):
@@ -667,13 +4079,306 @@ class PlainTextEditor(QMainWindow):
 
     def quit_application(self):
         self.tray_icon.hide()
-        self.save_tabs()
+        self.save_tabs_on_exit()
         QApplication.quit()
 
+    def save_tabs_on_exit(self):
+        with self.instrumentation.measure('save_tabs'):
+            self.save_tabs()
+        try:
+            # 只處理上次快照後有變動的文字框
+            self.store.take_snapshot('結束時', self.settings['snapshot_budget'] * 1024 * 1024)
+        except sqlite3.Error as e:
+            print(f"Error taking snapshot: {e}")
+        if self.instrumentation.enabled:
+            # 結束時的儲存也是常見的停頓來源，自動匯出一份
+            try:
+                self.instrumentation.dump('editor_diagnostics.json')
+            except OSError as e:
+                print(f"Error writing diagnostics: {e}")
+
+    def toggle_instrumentation(self, enabled):
+        self.settings['instrumentation'] = enabled
+        self.instrumentation.set_enabled(enabled, self.settings['stall_threshold'])
+        self.export_diagnostics_action.setEnabled(enabled)
+        self.mark_session_dirty()
+
+    def export_diagnostics(self):
+        fileName, _ = QFileDialog.getSaveFileName(
+            self, "匯出效能統計", "editor_diagnostics.json", "JSON Files (*.json);;All Files (*)"
+        )
+        if fileName:
+            try:
+                self.instrumentation.dump(fileName)
+            except OSError as e:
+                QMessageBox.warning(self, "匯出失敗", f"匯出效能統計時發生錯誤：{e}")
+
+def batch_process(unit, options):
+    """批次模式的工作單位，在子行程中處理一個檔案或一個分頁：搜尋或全部取代，並可匯出
+
+    unit 為 (名稱, 路徑, 分頁編號, 內容, 匯出檔名)。分頁編號為 None 時路徑是文字檔，取代結果直接寫回；
+    否則路徑是工作階段資料庫，內容為三個文字框的文字（None 時從資料庫讀取），取代結果交由主行程寫回。
+    """
+    name, path, tab_id, contents, export_names = unit
+    result = {'name': name, 'matches': [], 'replaced': {}, 'count': 0, 'characters': 0,
+              'exported': [], 'failures': [], 'error': None}
+    try:
+        if tab_id is None:
+            # 取代結果會寫回檔案，無法完整解碼時不處理，以免無法解碼的位元組被改寫為 U+FFFD
+            errors = 'strict' if options['find'] and options['replace'] is not None else 'replace'
+            text, encoding, codec, bom, newline = load_text_file(path, errors)
+            texts = [text]
+        else:
+            if None in contents:
+                stored = SessionStore.read_panes(path, [(tab_id, pane) for pane in range(3)])
+                contents = [stored[(tab_id, pane)] if content is None else content
+                            for pane, content in enumerate(contents)]
+            texts = contents
+        find = options['find']
+        regex = None
+        if find and (options['regex'] or options['whole_word']):
+            regex = compile_search_pattern(find, options['case_sensitive'], options['regex'], options['whole_word'])
+        for pane, text in enumerate(texts):
+            result['characters'] += len(text)
+            if find and options['replace'] is None:
+                line, line_start, previous = 1, 0, 0
+                for start, _ in find_occurrences(text, find, options['case_sensitive'], regex):
+                    newlines = text.count('\n', previous, start)
+                    if newlines:
+                        line += newlines
+                        line_start = text.rfind('\n', 0, start) + 1
+                    previous = start
+                    line_end = text.find('\n', start)
+                    result['matches'].append(
+                        (pane, line, start - line_start + 1, text[line_start:line_end if line_end != -1 else len(text)]))
+            elif find:
+                plan = plan_replacement(text, find, options['replace'], options['case_sensitive'], regex)
+                if plan is not None:
+                    start, end, segment, count = plan
+                    text = text[:start] + segment + text[end:]
+                    result['replaced'][pane] = text
+                    result['count'] += count
+            if options['export'] and export_names[pane] and text:
+                target = os.path.join(options['export'], export_names[pane])
+                failures = write_text_file(target, text, options['encoding'], options['errors'])
+                if failures:
+                    result['failures'].append((pane, target, options['encoding'], failures))
+                else:
+                    result['exported'].append((pane, target))
+        if find and options['replace'] is None:
+            result['count'] = len(result['matches'])
+        if tab_id is None and result['replaced']:
+            failures = write_text_file(path, result['replaced'][0], codec, newline=newline, bom=bom)
+            if failures:
+                result['failures'].append((0, path, encoding, failures))
+            result['replaced'] = {}
+    except UnicodeDecodeError as e:
+        result['error'] = f"無法以 {e.encoding} 完整解碼，未寫回"
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+def collect_batch_units(args):
+    """依命令列參數列出批次處理的工作單位；舊版 JSON 工作階段以分頁的順序代替分頁編號"""
+    units = []
+    # 不同資料夾中的同名檔案匯出時加上序號區分
+    names = ExportNames()
+    for path in args.files:
+        units.append((path, path, None, None, [names.unique(os.path.basename(path))]))
+    if args.session:
+        if args.session.endswith('.json'):
+            # 舊版格式，內容直接隨工作單位送出
+            with open(args.session, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            tabs = []
+            for position, tab in enumerate(data.get('tabs', [])):
+                contents = [tab.get(key, '') for key in SessionStore.PANE_KEYS]
+                tabs.append((position, tab.get('title', 'New Tab'), [c if isinstance(c, str) else '' for c in contents]))
+        else:
+            if not os.path.exists(args.session):
+                raise FileNotFoundError(args.session)
+            connection = sqlite3.connect(args.session)
+            try:
+                tabs = [(tab_id, title, [None, None, None]) for tab_id, title in
+                        connection.execute('SELECT id, title FROM tabs ORDER BY position')]
+            finally:
+                connection.close()
+        for position, (tab_id, title, contents) in enumerate(tabs, 1):
+            units.append((f"[{position}] {title}", args.session, tab_id, contents, names.tab_names(position, title)))
+    return units
+
+def write_back_session(path, replaced):
+    """將批次取代的結果寫回工作階段；replaced 為 {(分頁編號, 文字框): 內容}"""
+    if not path.endswith('.json'):
+        store = SessionStore(path)
+        try:
+            store.write(None, [(tab_id, pane, text) for (tab_id, pane), text in replaced.items()])
+        finally:
+            store.close()
+        return
+    with open(path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    for (position, pane), text in replaced.items():
+        data['tabs'][position][SessionStore.PANE_KEYS[pane]] = text
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=4)
+    os.replace(temp_path, path)
+
+def run_batch(argv):
+    """不需顯示器的批次模式：在文字檔或工作階段的分頁上搜尋、全部取代或匯出，以多個行程平行處理"""
+    parser = argparse.ArgumentParser(
+        prog='純白文本編輯器三框版.py batch',
+        description='批次搜尋、取代與匯出，不開啟視窗。編輯器執行中時請勿取代工作階段的內容。')
+    parser.add_argument('files', nargs='*', help='要處理的文字檔')
+    parser.add_argument('--session', help='工作階段檔案（editor_data.db 或舊版的 editor_data.json），每個分頁為一個工作單位')
+    parser.add_argument('--find', help='搜尋內容；未指定 --replace 時列出所有匹配')
+    parser.add_argument('--replace', help='將所有匹配取代為此內容並寫回')
+    parser.add_argument('--case-sensitive', action='store_true', help='區分大小寫')
+    parser.add_argument('--regex', action='store_true', help='搜尋內容為規則運算式')
+    parser.add_argument('--whole-word', action='store_true', help='全字匹配')
+    parser.add_argument('--export', metavar='DIR', help='將（取代後的）內容另存到此資料夾')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='UTF-8', help='匯出的編碼')
+    parser.add_argument('--errors', choices=('strict', 'replace'), default='strict',
+                        help='遇到無法編碼的字元時略過該檔案（strict）或以替代字元寫入（replace）')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='平行處理的行程數')
+    args = parser.parse_args(argv)
+    if not args.files and not args.session:
+        parser.error('請指定文字檔或 --session')
+    if args.replace is not None and not args.find:
+        parser.error('--replace 需要搭配 --find')
+    if not args.find and not args.export:
+        parser.error('請指定 --find 或 --export')
+    if args.find and (args.regex or args.whole_word):
+        try:
+            compile_search_pattern(args.find, args.case_sensitive, args.regex, args.whole_word)
+        except ValueError as e:
+            parser.error(f'規則運算式無效：{e}')
+    if args.export:
+        os.makedirs(args.export, exist_ok=True)
+
+    options = {
+        'find': args.find, 'replace': args.replace, 'case_sensitive': args.case_sensitive,
+        'regex': args.regex, 'whole_word': args.whole_word,
+        'export': args.export, 'encoding': args.encoding, 'errors': args.errors,
+    }
+    units = collect_batch_units(args)
+    start = time.perf_counter()
+    characters = matches = 0
+    status = 0
+    replaced = {}
+    process = functools.partial(batch_process, options=options)
+    workers = max(1, min(args.jobs, len(units)))
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        if executor is not None:
+            results = executor.map(process, units, chunksize=max(1, len(units) // (workers * 4)))
+        else:
+            results = map(process, units)
+        # 依輸入順序逐一輸出，先完成的工作單位不必等全部處理完
+        for unit, result in zip(units, results):
+            name, _, tab_id, _, _ = unit
+            label = (lambda pane: name) if tab_id is None else (lambda pane: f"{name}/{PANE_NAMES[pane]}")
+            if result['error']:
+                print(f"{name}: 錯誤：{result['error']}", file=sys.stderr)
+                status = 1
+                continue
+            characters += result['characters']
+            matches += result['count']
+            for pane, line, column, line_text in result['matches']:
+                print(f"{label(pane)}:{line}:{column}: {line_text}")
+            if args.replace is not None and result['count']:
+                print(f"{name}: 取代 {result['count']} 處")
+            for pane, text in result['replaced'].items():
+                replaced[(tab_id, pane)] = text
+            for pane, target in result['exported']:
+                print(f"{label(pane)} -> {target}")
+            for pane, target, encoding, failures in result['failures']:
+                status = 1
+                offset, line, column, character = failures[0]
+                print(f"{label(pane)}: 無法以 {encoding} 寫入 {target}，"
+                      f"共 {len(failures)} 處，第一處在第 {line} 行第 {column} 欄（{character!r}）", file=sys.stderr)
+            sys.stdout.flush()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if replaced:
+        write_back_session(args.session, replaced)
+    elapsed = time.perf_counter() - start
+    unit_name = '個工作單位' if args.files and args.session else ('個檔案' if args.files else '個分頁')
+    print(f"處理 {len(units)} {unit_name}，{characters / 1e6:.2f} M 字元，"
+          f"{'取代' if args.replace is not None else '匹配'} {matches} 處，耗時 {elapsed:.2f} 秒"
+          f"（{characters / 1e6 / max(elapsed, 1e-9):.1f} M 字元/秒，{len(units) / max(elapsed, 1e-9):.1f} 個/秒，"
+          f"{workers} 個行程）", file=sys.stderr)
+    return status
+
+def instance_server_name(session_path):
+    """依工作階段檔案的絕對路徑與使用者決定本機 socket 名稱，同一個工作階段只會有一個編輯器"""
+    key = os.path.abspath(session_path) + '\0' + os.path.expanduser('~')
+    return 'plain-text-editor-' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def send_to_running_instance(name, request):
+    """將請求轉交給執行中的編輯器；沒有執行中的編輯器時回傳 False"""
+    socket = QLocalSocket()
+    socket.connectToServer(name)
+    if not socket.waitForConnected(INSTANCE_TIMEOUT):
+        return False
+    socket.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+    while socket.bytesToWrite() and socket.waitForBytesWritten(INSTANCE_TIMEOUT):
+        pass
+    # 等到編輯器確認收到才結束，以免請求遺失
+    while not socket.canReadLine() and socket.waitForReadyRead(INSTANCE_TIMEOUT):
+        pass
+    if not socket.canReadLine():
+        print('執行中的編輯器沒有回應', file=sys.stderr)
+    socket.disconnectFromServer()
+    return True
+
+def claim_instance_server(name):
+    """在載入工作階段與建立視窗前佔用本機 socket 名稱，之後啟動的程式才能在載入期間連入
+
+    名稱已有編輯器在使用時回傳 None。只有確認連不上時，才將名稱視為先前異常結束留下的 socket 檔移除。
+    """
+    server = QLocalServer()
+    if server.listen(name):
+        return server
+    socket = QLocalSocket()
+    socket.connectToServer(name)
+    if socket.waitForConnected(INSTANCE_TIMEOUT):
+        socket.disconnectFromServer()
+        return None
+    QLocalServer.removeServer(name)
+    return server if server.listen(name) else None
+
 def main():
-    app = QApplication(sys.argv)
+    if sys.argv[1:2] == ['batch']:
+        sys.exit(run_batch(sys.argv[2:]))
+    parser = argparse.ArgumentParser(description='純白文本編輯器。已有編輯器在執行時，檔案與文字會轉交給它，本程式隨即結束。')
+    parser.add_argument('files', nargs='*', help='要在新分頁中開啟的文字檔')
+    parser.add_argument('--paste', metavar='TEXT', help='要貼到新分頁的文字，- 表示從標準輸入讀取')
+    parser.add_argument('--new-instance', action='store_true',
+                        help='不轉交給執行中的編輯器，另外啟動一個（兩者會寫入同一個工作階段）')
+    args, qt_arguments = parser.parse_known_args()
+    request = {
+        'files': [os.path.abspath(path) for path in args.files],
+        'paste': sys.stdin.read() if args.paste == '-' else args.paste,
+    }
+    server_name = instance_server_name(SESSION_PATH)
+    if not args.new_instance and send_to_running_instance(server_name, request):
+        return
+    app = QApplication(sys.argv[:1] + qt_arguments)
+    server = None
+    if not args.new_instance:
+        server = claim_instance_server(server_name)
+        # 另一個同時啟動的編輯器先取得了名稱
+        if server is None and send_to_running_instance(server_name, request):
+            return
     editor = PlainTextEditor()
+    if server is not None:
+        editor.start_instance_server(server)
     editor.show()
+    editor.handle_instance_request(request)
     sys.exit(app.exec_())
 
 if __name__ == '__main__':